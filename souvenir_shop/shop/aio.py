@@ -0,0 +1,23 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+def _call_and_release(func):
+    try:
+        return func()
+    finally:
+        # Each worker thread has its own connection; give it back like a request would.
+        close_old_connections()
+
+
+async def gather_in_threads(*funcs):
+    """
+    Runs blocking zero-argument callables (ORM queries) concurrently, each in a
+    worker thread with its own database connection, and returns their results
+    in order. The await takes as long as the slowest call rather than the sum.
+    """
+    return await asyncio.gather(*[
+        sync_to_async(_call_and_release, thread_sensitive=False)(func) for func in funcs
+    ])
@@ -0,0 +1,162 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import kpis, ledger, settlements
+from .models import (
+    ArchivedPurchase, ArchivedPurchaseItem, ArchivedSale, ArchivedSaleItem, ArchivedTransaction,
+    ArchivePeriod, Balance, Purchase, PurchaseItem, Sale, SaleItem, Transaction,
+)
+
+SUMMARY_FIELDS = ('sale_count', 'sales_total', 'purchase_count', 'purchases_total', 'transaction_count', 'transactions_total')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def archivable(cutoff):
+    """
+    The sales, purchases and transactions dated before ``cutoff`` that can move
+    to the archive together. A sale or purchase with a transaction on or after
+    the cutoff stays hot, and so do transactions linked to one that stays, so
+    every archived transaction is dated before the cutoff and every link
+    between archived rows points into the archive.
+    """
+    start = ledger.day_start(cutoff)
+    sales = Sale.objects.filter(sale_date__lt=start).exclude(transactions__transaction_date__gte=start)
+    purchases = Purchase.objects.filter(purchase_date__lt=start).exclude(transactions__transaction_date__gte=start)
+    transactions = (Transaction.objects.filter(transaction_date__lt=start)
+                    .exclude(related_sale__sale_date__gte=start)
+                    .exclude(related_sale__transactions__transaction_date__gte=start)
+                    .exclude(related_purchase__purchase_date__gte=start)
+                    .exclude(related_purchase__transactions__transaction_date__gte=start))
+    return sales, purchases, transactions
+
+
+def _summaries(sales, purchases, transactions):
+    summaries = defaultdict(lambda: dict.fromkeys(SUMMARY_FIELDS, 0))
+    for queryset, date_field, amount_field, count_name, total_name in (
+        (sales, 'sale_date', 'total_amount', 'sale_count', 'sales_total'),
+        (purchases, 'purchase_date', 'total_amount', 'purchase_count', 'purchases_total'),
+        (transactions, 'transaction_date', 'amount', 'transaction_count', 'transactions_total'),
+    ):
+        for row in (queryset.annotate(month=TruncMonth(date_field)).values('month')
+                    .annotate(count=Count('pk'), total=Sum(amount_field)).order_by()):
+            month = row['month'].date() if isinstance(row['month'], datetime.datetime) else row['month']
+            summaries[month][count_name] += row['count']
+            summaries[month][total_name] += row['total'] or Decimal('0')
+    return summaries
+
+
+def _move_sales(ids, batch_size):
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        ArchivedSale.objects.bulk_create([
+            ArchivedSale(**row) for row in
+            Sale.objects.filter(pk__in=chunk).values('id', 'sale_date', 'total_amount', 'notes', 'client_key')
+        ])
+        ArchivedSaleItem.objects.bulk_create([
+            ArchivedSaleItem(id=pk, sale_id=sale_id, product_id=product_id, product_name=name, quantity=quantity, unit_price=unit_price)
+            for pk, sale_id, product_id, name, quantity, unit_price in
+            SaleItem.objects.filter(sale__in=chunk).values_list('pk', 'sale_id', 'product_id', 'product__name', 'quantity', 'unit_price')
+        ])
+
+
+def _move_purchases(ids, batch_size):
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        ArchivedPurchase.objects.bulk_create([
+            ArchivedPurchase(id=pk, purchase_date=date, artist_id=artist_id, artist_name=artist_name, total_amount=total, notes=notes)
+            for pk, date, artist_id, artist_name, total, notes in
+            Purchase.objects.filter(pk__in=chunk).values_list('pk', 'purchase_date', 'artist_id', 'artist__name', 'total_amount', 'notes')
+        ])
+        ArchivedPurchaseItem.objects.bulk_create([
+            ArchivedPurchaseItem(id=pk, purchase_id=purchase_id, product_id=product_id, product_name=name, quantity=quantity, unit_price=unit_price)
+            for pk, purchase_id, product_id, name, quantity, unit_price in
+            PurchaseItem.objects.filter(purchase__in=chunk).values_list('pk', 'purchase_id', 'product_id', 'product__name', 'quantity', 'unit_price')
+        ])
+
+
+def _move_transactions(ids, batch_size):
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        ArchivedTransaction.objects.bulk_create([
+            ArchivedTransaction(**row) for row in
+            Transaction.objects.filter(pk__in=chunk).values(
+                'id', 'transaction_date', 'transaction_type', 'description', 'amount',
+                'related_purchase_id', 'related_sale_id', 'notes',
+            )
+        ])
+
+
+def _delete(model, field, ids):
+    # An explicit DELETE rather than QuerySet.delete(): the rows were copied to
+    # the archive, so the per-row delete signals (balance deltas, cache
+    # invalidation) must not fire, and archivable() already keeps every row
+    # that still points at them hot, so nothing needs collecting.
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} IN ({', '.join(['%s'] * len(ids))})", ids)
+        return cursor.rowcount
+
+
+def _delete_chunked(model, field, ids, batch_size):
+    for start in range(0, len(ids), batch_size):
+        _delete(model, field, ids[start:start + batch_size])
+
+
+def archive_before(cutoff, batch_size=1000):
+    """
+    Moves the sales, purchases and transactions dated before ``cutoff`` (the
+    first day of a month) into the archive tables in one database transaction,
+    month by month, and adds their counts and totals to the ArchivePeriod
+    summaries. A Balance snapshot is written for the day before the cutoff so
+    balances never need the archived rows. Returns the summaries added.
+    """
+    with transaction.atomic():
+        snapshot_day = cutoff - datetime.timedelta(days=1)
+        Balance.objects.update_or_create(balance_date=snapshot_day, defaults={'amount': ledger.opening_balance(cutoff)})
+
+        sales, purchases, transactions = archivable(cutoff)
+        summaries = _summaries(sales, purchases, transactions)
+        for month in sorted(summaries):
+            month_end = month_start(month + datetime.timedelta(days=31))
+            lower, upper = ledger.day_start(month), ledger.day_start(min(month_end, cutoff))
+            sale_ids = list(sales.filter(sale_date__gte=lower, sale_date__lt=upper).values_list('pk', flat=True))
+            purchase_ids = list(purchases.filter(purchase_date__gte=lower, purchase_date__lt=upper).values_list('pk', flat=True))
+            transaction_ids = list(transactions.filter(transaction_date__gte=lower, transaction_date__lt=upper).values_list('pk', flat=True))
+
+            _move_sales(sale_ids, batch_size)
+            _move_purchases(purchase_ids, batch_size)
+            _move_transactions(transaction_ids, batch_size)
+            _delete_chunked(Transaction, 'id', transaction_ids, batch_size)
+            _delete_chunked(SaleItem, 'sale', sale_ids, batch_size)
+            _delete_chunked(PurchaseItem, 'purchase', purchase_ids, batch_size)
+            _delete_chunked(Sale, 'id', sale_ids, batch_size)
+            _delete_chunked(Purchase, 'id', purchase_ids, batch_size)
+
+            period, _ = ArchivePeriod.objects.select_for_update().get_or_create(month=month)
+            for name, value in summaries[month].items():
+                setattr(period, name, getattr(period, name) + value)
+            period.save()
+        kpis.invalidate()
+        settlements.invalidate()
+    return summaries
+
+
+def default_cutoff(keep_months):
+    """
+    The first day of the oldest month to keep hot, ``keep_months`` months back
+    from the current one.
+    """
+    month = month_start(timezone.localdate())
+    for _ in range(keep_months):
+        month = month_start(month - datetime.timedelta(days=1))
+    return month
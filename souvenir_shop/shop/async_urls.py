@@ -0,0 +1,15 @@
+from django.urls import path
+from . import views
+from .urls import app_name, urlpatterns as sync_urlpatterns
+
+# Used by the ASGI application: the same routes, with async versions of the
+# views that run independent queries concurrently.
+async_urlpatterns = [
+    path('balances/', views.balance_list_async, name='balance_list'),
+    path('dashboard/', views.dashboard_async, name='dashboard'),
+]
+
+urlpatterns = [
+    *async_urlpatterns,
+    *[pattern for pattern in sync_urlpatterns if pattern.name not in {p.name for p in async_urlpatterns}],
+]
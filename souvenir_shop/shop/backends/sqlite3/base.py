@@ -0,0 +1,64 @@
+"""
+SQLite backend tuned for serving the shop: WAL journaling so readers never wait
+for writers, a busy timeout instead of immediate "database is locked" errors,
+and write transactions that take the write lock when they begin.
+
+Configured through ``OPTIONS`` in ``settings.DATABASES``:
+
+``pragmas``
+    A profile name from ``PRAGMA_PROFILES`` or a ``{name: value}`` dict, applied
+    to every new connection. ``'default'`` (the default) leaves SQLite's own
+    settings alone; ``'production'`` switches to WAL journaling and the tuned
+    cache settings. WAL mode is stored in the database file and adds ``-wal``
+    and ``-shm`` files next to it, so it is opt-in: a checked-in development
+    database stays untouched.
+``transaction_mode``
+    ``'IMMEDIATE'`` (default), ``'DEFERRED'`` or ``'EXCLUSIVE'``. A deferred
+    transaction that reads and then writes can fail with "database is locked"
+    without waiting out the busy timeout; an immediate one queues for the write
+    lock up front.
+``timeout``
+    Seconds to wait for a lock (passed to ``sqlite3.connect``; default 20).
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # Durable at checkpoints; safe from corruption in WAL mode
+    'cache_size': -20000,  # KiB, i.e. 20 MB of page cache per connection
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+PRAGMA_PROFILES = {
+    'default': {},
+    'production': PRODUCTION_PRAGMAS,
+}
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        pragmas = params.pop('pragmas', 'default')
+        if isinstance(pragmas, str):
+            if pragmas not in PRAGMA_PROFILES:
+                raise ImproperlyConfigured(f"pragmas must be a dict or one of {', '.join(PRAGMA_PROFILES)}.")
+            pragmas = PRAGMA_PROFILES[pragmas]
+        self.pragmas = dict(pragmas)
+        self.transaction_mode = params.pop('transaction_mode', 'IMMEDIATE').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}.")
+        params.setdefault('timeout', 20)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,159 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import kpis, ledger, settlements
+from .models import ArchivedSale, Product, Sale, SaleItem, StockMovement, Transaction
+from .rollups import apply_rollup_deltas, sale_deltas
+from .stock import adjust_stock, stock_deltas, stock_movements
+
+MAX_BATCH_SIZE = 1000
+
+
+class CheckoutError(ValueError):
+    """
+    A batch was rejected; ``errors`` lists the offending sales by index.
+    """
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _parse_sale(data, products):
+    """
+    Validates one queued sale and returns ``(key, sale_date, notes, {product_id: quantity})``.
+    Raises ValueError with a message for the terminal otherwise.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("sale must be an object")
+    key = data.get('key')
+    if not isinstance(key, str) or not key or len(key) > 64:
+        raise ValueError("key must be a non-empty string of at most 64 characters")
+
+    sale_date = timezone.now()
+    if data.get('sale_date'):
+        sale_date = parse_datetime(str(data['sale_date']))
+        if sale_date is None:
+            raise ValueError("invalid sale_date")
+        if timezone.is_naive(sale_date):
+            sale_date = timezone.make_aware(sale_date)
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("items must be a non-empty list")
+    quantities = defaultdict(int)
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("item must be an object")
+        product_id, quantity = item.get('product'), item.get('quantity')
+        if not isinstance(product_id, int) or isinstance(product_id, bool) or product_id not in products:
+            raise ValueError(f"unknown product {product_id!r}")
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            raise ValueError(f"invalid quantity for product {product_id}")
+        quantities[product_id] += quantity  # Repeated lines for a product are merged
+    return key, sale_date, data.get('notes') or None, quantities
+
+
+def checkout_batch(sales):
+    """
+    Records a batch of queued POS sales in one transaction.
+
+    Each sale carries a client ``key``; sales whose key is already stored are
+    reported as duplicates and not recorded again, so a terminal can safely
+    retry a batch. Sales, items and transactions are bulk inserted, stock is
+    decremented with one UPDATE and the balance and rollups are updated once
+    for the whole batch. Returns one result per submitted sale, in order.
+    """
+    if not isinstance(sales, list) or not sales:
+        raise CheckoutError([{'index': None, 'error': "sales must be a non-empty list"}])
+    if len(sales) > MAX_BATCH_SIZE:
+        raise CheckoutError([{'index': None, 'error': f"at most {MAX_BATCH_SIZE} sales per batch"}])
+
+    product_ids = {
+        item.get('product')
+        for sale in sales if isinstance(sale, dict) and isinstance(sale.get('items'), list)
+        for item in sale['items']
+        if isinstance(item, dict) and isinstance(item.get('product'), int) and not isinstance(item['product'], bool)
+    }
+
+    with transaction.atomic():
+        products = Product.objects.in_bulk(product_ids)
+        parsed, errors = [], []
+        for index, data in enumerate(sales):
+            try:
+                parsed.append(_parse_sale(data, products))
+            except ValueError as exc:
+                errors.append({'index': index, 'key': data.get('key') if isinstance(data, dict) else None, 'error': str(exc)})
+        if errors:
+            raise CheckoutError(errors)
+
+        keys = {key for key, *_ in parsed}
+        # Archived sales keep their id and key, so a retry of an old batch is still a duplicate.
+        recorded = dict(ArchivedSale.objects.filter(client_key__in=keys).values_list('client_key', 'pk'))
+        recorded.update(Sale.objects.filter(client_key__in=keys).values_list('client_key', 'pk'))
+        results, new_sales, new_lines = [], [], []
+        for key, sale_date, notes, quantities in parsed:
+            if key in recorded:
+                results.append({'key': key, 'status': 'duplicate', 'sale': recorded[key]})
+                continue
+            lines = [(product_id, quantity, products[product_id].selling_price) for product_id, quantity in quantities.items()]
+            sale = Sale(
+                client_key=key,
+                sale_date=sale_date,
+                notes=notes,
+                total_amount=sum((quantity * price for _, quantity, price in lines), Decimal('0')),
+            )
+            recorded[key] = sale  # Later copies of the key in this batch are duplicates
+            new_sales.append(sale)
+            new_lines.append(lines)
+            results.append({'key': key, 'status': 'created', 'sale': sale})
+
+        if new_sales:
+            Sale.objects.bulk_create(new_sales)
+            SaleItem.objects.bulk_create([
+                SaleItem(sale=sale, product_id=product_id, quantity=quantity, unit_price=unit_price,
+                         unit_cost=products[product_id].purchase_price)
+                for sale, lines in zip(new_sales, new_lines)
+                for product_id, quantity, unit_price in lines
+            ])
+            Transaction.objects.bulk_create([
+                Transaction(
+                    transaction_type='SALE',
+                    description=f'Sale on {sale.sale_date.strftime("%Y-%m-%d")}',
+                    amount=sale.total_amount,  # Positive for sale
+                    related_sale=sale,
+                    transaction_date=sale.sale_date,
+                )
+                for sale in new_sales
+            ])
+
+            adjust_stock([
+                movement
+                for sale, lines in zip(new_sales, new_lines)
+                for movement in stock_movements(stock_deltas(lines, sign=-1), StockMovement.SALE, sale.sale_date, sale=sale)
+            ])
+
+            costs = {product_id: product.purchase_price for product_id, product in products.items()}
+            balance_deltas = defaultdict(Decimal)
+            rollup_deltas = []
+            for sale, lines in zip(new_sales, new_lines):
+                day = timezone.localdate(sale.sale_date)
+                balance_deltas[day] += sale.total_amount
+                rollup_deltas.append(sale_deltas(day, lines, costs))
+            apply_rollup_deltas(*rollup_deltas)
+            if ledger.ledger_enabled():
+                ledger.apply_balance_deltas(balance_deltas)
+            else:
+                ledger.update_or_create_balance()
+            kpis.invalidate_for('Sale')
+            # bulk_create skips the post_save handler; back-dated sales may land in closed months.
+            for month in {timezone.localdate(sale.sale_date).replace(day=1) for sale in new_sales}:
+                settlements.invalidate_month(month)
+
+    for result in results:
+        sale = result.pop('sale')
+        result['sale_id'] = sale.pk if isinstance(sale, Sale) else sale
+    return results
@@ -0,0 +1,146 @@
+import hashlib
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.forms.models import ModelChoiceIterator
+
+CACHE_PREFIX = 'shop:choices'
+
+
+def _timeout():
+    # 0 keeps choices for the current request only.
+    return getattr(settings, 'SHOP_CHOICE_CACHE_TIMEOUT', 0)
+
+
+def _version_key(model):
+    return f'{CACHE_PREFIX}:{model._meta.label_lower}:version'
+
+
+def version(model):
+    cache.add(_version_key(model), 1, timeout=None)
+    return cache.get(_version_key(model), 1)
+
+
+def invalidate(*models):
+    """
+    Makes the cached choices of ``models`` stale once the current transaction
+    commits. Writes that bypass model signals (``update()``, ``bulk_create()``)
+    must call it themselves.
+    """
+    def bump():
+        for model in models:
+            key = _version_key(model)
+            cache.add(key, 1, timeout=None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+    transaction.on_commit(bump)
+
+
+class ChoiceCache:
+    """
+    Objects of ``queryset`` by pk, shared by every form of a formset. ``prefetch``
+    loads all the submitted pks with one ``in_bulk`` query; with
+    ``SHOP_CHOICE_CACHE_TIMEOUT`` set the objects are also kept in the cache
+    across requests until the model's version changes.
+    """
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.objects = {}
+
+    def _key(self, version, pk):
+        return f'{CACHE_PREFIX}:{self.queryset.model._meta.label_lower}:v{version}:{pk}'
+
+    def prefetch(self, pks):
+        field = self.queryset.model._meta.pk
+        wanted = set()
+        for pk in pks:
+            try:
+                wanted.add(field.to_python(pk))
+            except forms.ValidationError:
+                continue
+        wanted -= {None, ''}
+        wanted -= self.objects.keys()
+        if not wanted:
+            return
+        timeout = _timeout()
+        if timeout:
+            current = version(self.queryset.model)
+            cached = cache.get_many([self._key(current, pk) for pk in wanted])
+            for obj in cached.values():
+                self.objects[obj.pk] = obj
+            wanted -= self.objects.keys()
+        found = self.queryset.in_bulk(wanted) if wanted else {}
+        self.objects.update(found)
+        # Pks that do not exist are remembered too, so they are not looked up again.
+        self.objects.update({pk: None for pk in wanted - found.keys()})
+        if timeout and found:
+            cache.set_many({self._key(current, pk): obj for pk, obj in found.items()}, timeout)
+
+    def get(self, pk):
+        try:
+            pk = self.queryset.model._meta.pk.to_python(pk)
+        except forms.ValidationError:
+            return None
+        if pk not in self.objects:
+            self.prefetch([pk])
+        return self.objects[pk]
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    A ModelChoiceField that validates against a shared ``ChoiceCache`` when
+    one is attached (``field.choice_cache``) instead of querying per form.
+    """
+    choice_cache = None
+
+    def to_python(self, value):
+        if value in self.empty_values or self.choice_cache is None:
+            return super().to_python(value)
+        if isinstance(value, self.queryset.model):
+            return value
+        obj = self.choice_cache.get(value)
+        if obj is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return obj
+
+
+class CachedChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        yield from self.field.cached_options()
+
+    def __len__(self):
+        return len(self.field.cached_options()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.cached_options())
+
+
+class CachedChoicesField(forms.ModelChoiceField):
+    """
+    A ModelChoiceField for ``<select>`` menus whose ``(pk, label)`` options are
+    cached across requests (when ``SHOP_CHOICE_CACHE_TIMEOUT`` is set) until
+    the model's version changes, instead of being queried on every render.
+    """
+    def _get_choices(self):
+        if not _timeout():
+            return super()._get_choices()
+        return CachedChoiceIterator(self)
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+    def cached_options(self):
+        # Read lazily, when the menu is rendered, never when the form is built.
+        model = self.queryset.model
+        query = hashlib.md5(str(self.queryset.query).encode(), usedforsecurity=False).hexdigest()
+        key = f'{CACHE_PREFIX}:{model._meta.label_lower}:v{version(model)}:options:{query}'
+        options = cache.get(key)
+        if options is None:
+            options = [(obj.pk, self.label_from_instance(obj)) for obj in self.queryset]
+            cache.set(key, options, _timeout())
+        return options
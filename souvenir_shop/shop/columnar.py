@@ -0,0 +1,186 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .ledger import day_start
+from .models import ArchivePeriod, Artist, Product, SaleItem
+
+# Leading '_' and '.' keep the manifest and unfinished files out of
+# dataset readers (pyarrow, Spark, DuckDB hive scans).
+MANIFEST = '_manifest.json'
+CHUNK_SIZE = 50000
+
+# Column name -> (values_list lookup, arrow type)
+COLUMNS = {
+    'item_id': ('pk', pyarrow.int64()),
+    'sale_id': ('sale_id', pyarrow.int64()),
+    'sale_date': ('sale__sale_date', pyarrow.timestamp('us', tz='UTC')),
+    'product_id': ('product_id', pyarrow.int64()),
+    'product_name': ('product__name', pyarrow.string()),
+    'artist_id': ('product__artist_id', pyarrow.int64()),
+    'artist_name': ('product__artist__name', pyarrow.string()),
+    'quantity': ('quantity', pyarrow.int32()),
+    'unit_price': ('unit_price', pyarrow.decimal128(10, 2)),
+}
+
+EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def schema():
+    return pyarrow.schema([(name, type_) for name, (_, type_) in COLUMNS.items()])
+
+
+def month_fingerprints():
+    """
+    ``{'YYYY-MM': fingerprint}`` of the sale lines of every month, from one
+    grouped query. Any insert, edit or delete of a sale or its lines changes
+    the line count, the pk sum or the latest ``updated_at`` of its month.
+    """
+    rows = (SaleItem.objects
+            .annotate(month=TruncMonth('sale__sale_date'))
+            .values('month')
+            .annotate(lines=Count('pk'), pk_sum=Sum('pk'), units=Sum('quantity'),
+                      item_updated=Max('updated_at'), sale_updated=Max('sale__updated_at'))
+            .order_by('month'))
+    return {
+        row['month'].strftime('%Y-%m'): '{lines}:{pk_sum}:{units}:{item_updated}:{sale_updated}'.format(**row)
+        for row in rows
+    }
+
+
+def catalog_fingerprint():
+    """
+    A hash of the product and artist columns copied into every row; when it
+    changes every partition is written again.
+    """
+    digest = hashlib.sha256()
+    for row in Product.objects.order_by('pk').values_list('pk', 'name', 'artist_id').iterator(chunk_size=CHUNK_SIZE):
+        digest.update(repr(row).encode())
+    for row in Artist.objects.order_by('pk').values_list('pk', 'name').iterator(chunk_size=CHUNK_SIZE):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()
+
+
+def _month_rows(month):
+    start = datetime.date.fromisoformat(f'{month}-01')
+    end = (start + datetime.timedelta(days=31)).replace(day=1)
+    return (SaleItem.objects
+            .filter(sale__sale_date__gte=day_start(start), sale__sale_date__lt=day_start(end))
+            .order_by('sale__sale_date', 'sale_id', 'pk')
+            .values_list(*(lookup for lookup, _ in COLUMNS.values())))
+
+
+def _batches(rows, chunk_size):
+    # Arrow record batches of at most ``chunk_size`` rows, read from the ORM in chunks.
+    arrow_schema = schema()
+
+    def to_batch(rows):
+        columns = zip(*rows)
+        return pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, arrow_schema)], schema=arrow_schema,
+        )
+
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield to_batch(batch)
+            batch = []
+    if batch:
+        yield to_batch(batch)
+
+
+def write_partition(directory, month, file_format, chunk_size=CHUNK_SIZE):
+    """
+    Writes the sale lines of ``month`` to ``<directory>/month=YYYY-MM/part-0.<ext>``
+    batch by batch, replacing the previous file only once the new one is
+    complete. Returns ``(relative path, row count)``.
+    """
+    relative = os.path.join(f'month={month}', f'part-0.{EXTENSIONS[file_format]}')
+    path = os.path.join(directory, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.partial')
+    count = 0
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(partial, schema(), compression='zstd')
+    else:
+        writer = pyarrow.ipc.new_file(partial, schema())
+    try:
+        for batch in _batches(_month_rows(month), chunk_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    finally:
+        writer.close()
+    os.replace(partial, path)
+    return relative, count
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    partial = os.path.join(directory, f'.{MANIFEST}.partial')
+    with open(partial, 'w') as output:
+        json.dump(manifest, output, indent=2, sort_keys=True)
+    os.replace(partial, path)
+
+
+def export_sales(directory, file_format='parquet', full=False, chunk_size=CHUNK_SIZE, log=None):
+    """
+    Brings the month-partitioned sales snapshot in ``directory`` up to date:
+    only months whose fingerprint differs from the manifest are (re)written,
+    unless ``full`` is set or the catalog or format changed. Months that no
+    longer have hot sale lines are removed, except archived ones, whose last
+    export is kept. Returns ``{'written': [...], 'removed': [...], 'unchanged': n}``.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+    catalog = catalog_fingerprint()
+    archived = {month.strftime('%Y-%m') for month in ArchivePeriod.objects.values_list('month', flat=True)}
+    current = month_fingerprints()
+
+    if full or manifest.get('format') != file_format or manifest.get('catalog') != catalog:
+        # Start over, keeping only the exports of archived months when the
+        # format allows it: their rows cannot be read again.
+        kept = {}
+        if manifest.get('format') == file_format:
+            kept = {month: partition for month, partition in manifest.get('partitions', {}).items()
+                    if month in archived and month not in current}
+        for name in os.listdir(directory):
+            if name.startswith('month=') and name[len('month='):] not in kept:
+                shutil.rmtree(os.path.join(directory, name))
+        manifest = {'format': file_format, 'catalog': catalog, 'partitions': kept}
+    partitions = manifest['partitions']
+
+    written, removed = [], []
+    for month, fingerprint in current.items():
+        if partitions.get(month, {}).get('fingerprint') == fingerprint:
+            continue
+        relative, rows = write_partition(directory, month, file_format, chunk_size)
+        partitions[month] = {'fingerprint': fingerprint, 'file': relative, 'rows': rows,
+                             'exported_at': timezone.now().isoformat()}
+        save_manifest(directory, manifest)  # After every partition, so an interrupted run resumes
+        written.append(month)
+        if log:
+            log(f"{month}: {rows} row(s)")
+    for month in sorted(set(partitions) - set(current) - archived):
+        shutil.rmtree(os.path.join(directory, f'month={month}'), ignore_errors=True)
+        del partitions[month]
+        removed.append(month)
+    save_manifest(directory, manifest)
+    return {'written': written, 'removed': removed, 'unchanged': len(current) - len(written)}
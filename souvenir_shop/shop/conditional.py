@@ -0,0 +1,110 @@
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import kpis
+from .models import Artist, Product, Purchase, Sale
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def _table_version(model):
+    # Max(updated_at) alone misses deletes; the row count catches them.
+    version = model.objects.aggregate(rows=Count('pk'), last=Max('updated_at'))
+    return version['rows'], version['last'] and version['last'].isoformat()
+
+
+# Validators return (etag, last_modified or None) using at most two aggregate queries.
+
+def artist_list_validator(request):
+    return _etag('artists', _table_version(Artist)), None
+
+
+def product_list_validator(request):
+    # Product rows show the artist name.
+    return _etag('products', _table_version(Product), _table_version(Artist)), None
+
+
+def purchase_list_validator(request):
+    return _etag('purchases', _table_version(Purchase), _table_version(Artist)), None
+
+
+def sale_list_validator(request):
+    return _etag('sales', _table_version(Sale)), None
+
+
+def _detail_validator(queryset, pk, *related):
+    stamps = queryset.filter(pk=pk).aggregate(
+        item_count=Count('items'),
+        updated_at=Max('updated_at'),
+        **{f"{name.replace('__', '_')}_updated_at": Max(f'{name}__updated_at') for name in related},
+    )
+    if stamps['updated_at'] is None:
+        return None, None  # Let the view raise its 404
+    item_count = stamps.pop('item_count')
+    last_modified = max(stamp for stamp in stamps.values() if stamp is not None)
+    return _etag(item_count, sorted((name, str(stamp)) for name, stamp in stamps.items())), last_modified
+
+
+def purchase_detail_validator(request, pk):
+    return _detail_validator(Purchase.objects.all(), pk, 'artist', 'items', 'items__product')
+
+
+def sale_detail_validator(request, pk):
+    return _detail_validator(Sale.objects.all(), pk, 'items', 'items__product')
+
+
+def dashboard_validator(request):
+    # The widgets only change when kpis.invalidate runs or the day rolls over,
+    # so the page can be validated without touching the database.
+    return _etag('dashboard', kpis.generation(), timezone.localdate().isoformat()), None
+
+
+def conditional_view(validator):
+    """
+    Answers GET/HEAD requests whose If-None-Match / If-Modified-Since still
+    match ``validator(request, *args, **kwargs)`` with 304 Not Modified, before
+    the view runs its queries or renders anything, and adds the ETag and
+    Last-Modified headers to full responses. Works on sync and async views.
+    """
+    def check(request, args, kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None, None, None
+        etag, last_modified = validator(request, *args, **kwargs)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        return etag, timestamp, get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+    def finish(response, etag, timestamp):
+        if response.status_code == 200:
+            if etag and not response.has_header('ETag'):
+                response.headers['ETag'] = etag
+            if timestamp and not response.has_header('Last-Modified'):
+                response.headers['Last-Modified'] = http_date(timestamp)
+        return response
+
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag, timestamp, response = await sync_to_async(check)(request, args, kwargs)
+                if response is not None:
+                    return response
+                return finish(await view(request, *args, **kwargs), etag, timestamp)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag, timestamp, response = check(request, args, kwargs)
+            if response is not None:
+                return response
+            return finish(view(request, *args, **kwargs), etag, timestamp)
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+import csv
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from .ledger import day_start
+from .models import PurchaseItem, SaleItem, Transaction
+
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """
+    A file-like object whose ``write`` just returns the value, so csv.writer
+    can produce one line at a time for a streaming response.
+    """
+    def write(self, value):
+        return value
+
+
+def _date_range(queryset, field, start=None, end=None):
+    """
+    Limits ``field`` to the days ``start``..``end`` (inclusive) using plain
+    datetime bounds, so the date index on the column can be used.
+    """
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': day_start(start)})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lt': day_start(end + datetime.timedelta(days=1))})
+    return queryset
+
+
+def transaction_rows(start=None, end=None):
+    queryset = _date_range(Transaction.objects.all(), 'transaction_date', start, end)
+    return queryset.order_by('transaction_date', 'pk').values(
+        'id', 'transaction_date', 'transaction_type', 'description', 'amount',
+        'related_purchase_id', 'related_sale_id', 'notes',
+    )
+
+
+def sale_item_rows(start=None, end=None):
+    """
+    One row per sale line, denormalized with its sale and product.
+    """
+    queryset = _date_range(SaleItem.objects.all(), 'sale__sale_date', start, end)
+    return queryset.order_by('sale__sale_date', 'sale_id', 'pk').values(
+        'sale_id',
+        sale_date=F('sale__sale_date'),
+        sale_total=F('sale__total_amount'),
+        sale_notes=F('sale__notes'),
+        item_id=F('id'),
+        product_name=F('product__name'),
+        item_product_id=F('product_id'),
+        item_quantity=F('quantity'),
+        item_unit_price=F('unit_price'),
+    )
+
+
+def purchase_item_rows(start=None, end=None):
+    """
+    One row per purchase line, denormalized with its purchase, artist and product.
+    """
+    queryset = _date_range(PurchaseItem.objects.all(), 'purchase__purchase_date', start, end)
+    return queryset.order_by('purchase__purchase_date', 'purchase_id', 'pk').values(
+        'purchase_id',
+        purchase_date=F('purchase__purchase_date'),
+        purchase_total=F('purchase__total_amount'),
+        artist_name=F('purchase__artist__name'),
+        purchase_notes=F('purchase__notes'),
+        item_id=F('id'),
+        product_name=F('product__name'),
+        item_product_id=F('product_id'),
+        item_quantity=F('quantity'),
+        item_unit_price=F('unit_price'),
+    )
+
+
+def stream_csv(rows):
+    """
+    Yields CSV lines for a ``values()`` queryset, starting with the header,
+    while reading the queryset in chunks.
+    """
+    writer = csv.writer(Echo())
+    columns = [*rows.query.values_select, *rows.query.annotation_select]
+    yield writer.writerow(columns)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow([row[column] for column in columns])
+
+
+def stream_jsonl(rows):
+    """
+    Yields one JSON document per line for a ``values()`` queryset.
+    """
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORTS = {
+    'transactions': transaction_rows,
+    'sales': sale_item_rows,
+    'purchases': purchase_item_rows,
+}
+
+FORMATS = {
+    'csv': (stream_csv, 'text/csv'),
+    'jsonl': (stream_jsonl, 'application/x-ndjson'),
+}
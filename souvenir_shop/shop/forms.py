@@ -1,4 +1,6 @@
 from django import forms
+from django.forms import BaseInlineFormSet
+from .choices import CachedChoicesField, CachedModelChoiceField, ChoiceCache
 from .models import Artist, Product, Purchase, PurchaseItem, Sale, SaleItem, Transaction
 
 class ArtistForm(forms.ModelForm):
@@ -10,16 +12,134 @@ class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
         fields = ['name', 'description', 'purchase_price', 'selling_price', 'stock_quantity', 'artist']
+        field_classes = {'artist': CachedChoicesField}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Also submit the count the form showed, see stock_change().
+        self.fields['stock_quantity'].show_hidden_initial = True
+
+    def stock_change(self):
+        """
+        The submitted stock count minus the count the form showed, so an edit
+        is applied as a difference and sales made meanwhile are kept.
+        """
+        field = self.fields['stock_quantity']
+        shown = field.hidden_widget().value_from_datadict(self.data, self.files, self.add_initial_prefix('stock_quantity'))
+        try:
+            shown = field.to_python(shown)
+        except forms.ValidationError:
+            shown = None
+        if shown is None:
+            shown = self.initial.get('stock_quantity') or 0
+        return self.cleaned_data['stock_quantity'] - shown
+
+class ProductSearchInput(forms.Widget):
+    """
+    A product picker backed by the ``product_search`` autocomplete endpoint, so
+    item forms do not embed every product as a ``<select>`` option. Submits the
+    product pk; picking a product also fills in the row's unit price from
+    ``price_field``.
+    """
+    template_name = 'shop/widgets/product_search.html'
+
+    def __init__(self, price_field, attrs=None):
+        super().__init__(attrs)
+        self.price_field = price_field
+        self.selected = None  # (pk, label) of a saved row's product, so rendering needs no query
+        self.choice_cache = None  # The formset's ChoiceCache, for the labels of submitted products
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = ''
+        if self.selected is not None and str(self.selected[0]) == str(value):
+            label = self.selected[1]
+        elif value not in (None, '') and str(value).isdigit():
+            if self.choice_cache is not None:
+                product = self.choice_cache.get(value)
+            else:
+                product = Product.objects.select_related('artist').filter(pk=value).first()
+            label = product_label(product) if product else ''
+        context['widget'].update(label=label, price_field=self.price_field)
+        return context
+
+def product_label(product):
+    return f"{product.name} ({product.artist.name})"
+
+class ItemFormSet(BaseInlineFormSet):
+    """
+    Sale and purchase item formset; loads the products of the saved items
+    together with the items for the product search labels. The product field
+    of every row shares one ChoiceCache, so validating N rows takes one
+    ``in_bulk`` query instead of N lookups.
+    """
+    def __init__(self, *args, **kwargs):
+        if kwargs.get('queryset') is None:
+            kwargs['queryset'] = self.model._default_manager.select_related('product__artist')
+        self.product_choices = ChoiceCache(Product.objects.select_related('artist'))
+        super().__init__(*args, **kwargs)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['product'].choice_cache = self.product_choices
+        form.fields['product'].widget.choice_cache = self.product_choices
+        return form
+
+    def full_clean(self):
+        if self.is_bound and self.management_form.is_valid():
+            self.product_choices.prefetch(self.data.get(form.add_prefix('product')) for form in self.forms)
+        super().full_clean()
+
+    def clean(self):
+        """
+        Rejects a product listed on two rows; the item forms leave the
+        (sale or purchase, product) uniqueness to the formset, see ItemForm.
+        """
+        super().clean()
+        seen = set()
+        for form in self.forms:
+            cleaned_data = getattr(form, 'cleaned_data', {})
+            product = cleaned_data.get('product')
+            if product is None or cleaned_data.get('DELETE'):
+                continue
+            if product.pk in seen:
+                form.add_error('product', "This product is already listed on another row.")
+            seen.add(product.pk)
+
+class ItemForm(forms.ModelForm):
+    """
+    Base of the sale and purchase item forms. ``product`` is declared by each
+    form rather than listed in ``Meta.fields``, so the model validation does
+    not look the product up again (one query per row) after the field found
+    it in the formset's ChoiceCache. ``clean_product`` sets it on the instance
+    and ItemFormSet.clean() checks that no product is listed twice.
+    """
+    field_order = ['product', 'quantity', 'unit_price']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.product_id is not None:
+            product = self.instance.product
+            self.initial.setdefault('product', product.pk)
+            self.fields['product'].widget.selected = (product.pk, product_label(product))
+
+    def clean_product(self):
+        product = self.cleaned_data['product']
+        self.instance.product = product
+        return product
 
 class PurchaseForm(forms.ModelForm):
     class Meta:
         model = Purchase
         fields = ['artist', 'notes']
+        field_classes = {'artist': CachedChoicesField}
+
+class PurchaseItemForm(ItemForm):
+    product = CachedModelChoiceField(Product.objects.all(), widget=ProductSearchInput(price_field='purchase_price'))
 
-class PurchaseItemForm(forms.ModelForm):
     class Meta:
         model = PurchaseItem
-        fields = ['product', 'quantity', 'unit_price']
+        fields = ['quantity', 'unit_price']
         widgets = {
             'unit_price': forms.NumberInput(attrs={'readonly': 'readonly'}),
         }
@@ -29,10 +149,12 @@ class SaleForm(forms.ModelForm):
         model = Sale
         fields = ['notes']
 
-class SaleItemForm(forms.ModelForm):
+class SaleItemForm(ItemForm):
+    product = CachedModelChoiceField(Product.objects.all(), widget=ProductSearchInput(price_field='selling_price'))
+
     class Meta:
         model = SaleItem
-        fields = ['product', 'quantity', 'unit_price']
+        fields = ['quantity', 'unit_price']
         widgets = {
             'unit_price': forms.NumberInput(attrs={'readonly': 'readonly'}),
         }
@@ -43,4 +165,9 @@ class TransactionForm(forms.ModelForm):
         fields = ['transaction_type', 'description', 'amount', 'related_purchase', 'related_sale', 'notes']
         widgets = {
             'transaction_date': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
-        }
\ No newline at end of file
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Purchase labels include the artist name; fetch it with the choices.
+        self.fields['related_purchase'].queryset = Purchase.objects.select_related('artist')
\ No newline at end of file
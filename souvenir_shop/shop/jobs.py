@@ -0,0 +1,179 @@
+import datetime
+import traceback
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Job
+
+CACHE_PREFIX = 'shop:jobs'
+COUNTERS = ('enqueued', 'coalesced', 'succeeded', 'retried', 'failed', 'visibility_timeouts')
+
+
+def queue_enabled():
+    """
+    True when balance and rollup maintenance is left to ``run_shop_worker``
+    (``SHOP_BOOKKEEPING = 'queue'``) instead of being done inside the request.
+    """
+    return getattr(settings, 'SHOP_BOOKKEEPING', 'inline') == 'queue'
+
+
+def _count(name, amount=1):
+    key = f'{CACHE_PREFIX}:stats:{name}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.set(key, amount, timeout=None)
+
+
+# Tasks
+
+def _earliest_since(current, new):
+    return {'since': min(current['since'], new['since'])}
+
+
+def _rebuild_balances(payload):
+    from .ledger import rebuild_balances
+    rebuild_balances(datetime.date.fromisoformat(payload['since']))
+
+
+def _rebuild_rollups(payload):
+    from .rollups import rebuild_rollups
+    rebuild_rollups(datetime.date.fromisoformat(payload['since']))
+
+
+# task name -> (handler, payload merge for coalesced jobs)
+TASKS = {
+    'rebuild_balances': (_rebuild_balances, _earliest_since),
+    'rebuild_rollups': (_rebuild_rollups, _earliest_since),
+}
+
+
+# Producing
+
+def enqueue(task, payload=None, coalesce_key=None):
+    """
+    Adds a job, or merges ``payload`` into the pending job with the same
+    ``coalesce_key``. Call it inside the transaction of the write that needs
+    the job so both commit (or roll back) together.
+    """
+    payload = payload or {}
+    merge = TASKS[task][1]
+    with transaction.atomic():
+        for _ in range(2):
+            if coalesce_key is not None:
+                job = Job.objects.select_for_update().filter(coalesce_key=coalesce_key, status=Job.PENDING).first()
+                if job is not None:
+                    job.payload = merge(job.payload, payload)
+                    job.coalesced += 1
+                    job.save(update_fields=['payload', 'coalesced'])
+                    _count('coalesced')
+                    return job
+            try:
+                with transaction.atomic():
+                    job = Job.objects.create(task=task, payload=payload, coalesce_key=coalesce_key)
+            except IntegrityError:
+                continue  # Another request created the pending job first; merge into it
+            _count('enqueued')
+            return job
+    raise IntegrityError(f"Could not enqueue {task} job.")
+
+
+def enqueue_since(task, day):
+    """
+    Schedules ``task`` to recompute everything from ``day`` onwards; pending
+    requests are coalesced into one job starting at the earliest day.
+    """
+    return enqueue(task, {'since': day.isoformat()}, coalesce_key=task)
+
+
+def outstanding(task):
+    """
+    True while a ``task`` job is pending, running or failed, i.e. its work is not done.
+    """
+    return Job.objects.filter(task=task).exists()
+
+
+# Consuming
+
+def _claimable(now):
+    # Pending jobs that are due, and running jobs whose worker let the lock expire.
+    return Q(status=Job.PENDING, run_after__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+
+
+def claim(visibility_timeout):
+    """
+    Takes the next due job, hiding it from other workers for
+    ``visibility_timeout`` seconds. The claim is a conditional UPDATE, so two
+    workers never get the same job. Returns None when the queue is empty.
+    """
+    now = timezone.now()
+    for pk, status in Job.objects.filter(_claimable(now)).order_by('run_after', 'pk').values_list('pk', 'status')[:10]:
+        claimed = Job.objects.filter(_claimable(now), pk=pk, status=status).update(
+            status=Job.RUNNING,
+            locked_until=now + datetime.timedelta(seconds=visibility_timeout),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            if status == Job.RUNNING:
+                _count('visibility_timeouts')
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run(job, max_attempts):
+    """
+    Runs a claimed job. It is deleted on success; on failure it is retried with
+    exponential backoff, and marked failed after ``max_attempts`` attempts.
+    Returns True on success.
+    """
+    mine = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_until=job.locked_until)
+    try:
+        handler = TASKS[job.task][0]
+        handler(job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.task not in TASKS or job.attempts >= max_attempts:
+            mine.update(status=Job.FAILED, last_error=error, locked_until=None)
+            _count('failed')
+        else:
+            _retry(job, mine, error)
+            _count('retried')
+        return False
+    mine.delete()
+    _count('succeeded')
+    return True
+
+
+def _retry(job, mine, error):
+    run_after = timezone.now() + datetime.timedelta(seconds=min(2 ** job.attempts, 300))
+    with transaction.atomic():
+        pending = None
+        if job.coalesce_key is not None:
+            pending = Job.objects.select_for_update().filter(coalesce_key=job.coalesce_key, status=Job.PENDING).first()
+        if pending is None:
+            mine.update(status=Job.PENDING, run_after=run_after, locked_until=None, last_error=error)
+            return
+        # A newer request is already waiting: fold this job into it.
+        pending.payload = TASKS[job.task][1](pending.payload, job.payload)
+        pending.attempts = max(pending.attempts, job.attempts)
+        pending.coalesced += job.coalesced + 1
+        pending.run_after = max(pending.run_after, run_after)
+        pending.last_error = error
+        pending.save(update_fields=['payload', 'attempts', 'coalesced', 'run_after', 'last_error'])
+        mine.delete()
+
+
+def stats():
+    """
+    Queue depth by status plus the worker counters since the cache was last cleared.
+    """
+    depth = dict(Job.objects.values_list('status').annotate(total=Count('pk')).order_by())
+    return {
+        'jobs': {status: depth.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+        'counters': {name: cache.get(f'{CACHE_PREFIX}:stats:{name}', 0) for name in COUNTERS},
+    }
@@ -0,0 +1,183 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import DailyProductRollup, Product, ReorderForecast
+from .routers import primary_reads
+
+CACHE_PREFIX = 'shop:kpi'
+
+
+def sales_totals():
+    """
+    Sales revenue over the last 7 and 30 days.
+    """
+    today = timezone.localdate()
+    totals = DailyProductRollup.objects.filter(day__gt=today - timezone.timedelta(days=30)).aggregate(
+        last_7_days=Sum('sales_revenue', filter=Q(day__gt=today - timezone.timedelta(days=7))),
+        last_30_days=Sum('sales_revenue'),
+    )
+    return {'last_7_days': totals['last_7_days'] or 0, 'last_30_days': totals['last_30_days'] or 0}
+
+
+def top_sellers():
+    """
+    The five best selling products of the last 30 days.
+    """
+    today = timezone.localdate()
+    return list(
+        DailyProductRollup.objects.filter(day__gt=today - timezone.timedelta(days=30))
+        .values('product__name')
+        .annotate(total_sold=Sum('quantity_sold'))
+        .filter(total_sold__gt=0)
+        .order_by('-total_sold')[:5]
+    )
+
+
+LOW_STOCK_LIMIT = 10
+
+
+def low_stock():
+    """
+    Products whose stock will not last until a new purchase arrives, by sales
+    velocity (see ``reorder``), fewest days of cover first. Until forecasts
+    have been computed, products with less than five items in stock.
+    """
+    from .reorder import due_for_reorder
+    if not ReorderForecast.objects.exists():
+        return list(Product.objects.filter(stock_quantity__lt=5).values('pk', 'name', 'stock_quantity'))
+    return list(due_for_reorder().values(
+        'days_of_cover', 'stock_quantity', 'suggested_quantity', pk=F('product_id'), name=F('product__name'),
+    )[:LOW_STOCK_LIMIT])
+
+
+def profit():
+    """
+    Overall sales revenue minus overall purchase cost.
+    """
+    totals = DailyProductRollup.objects.aggregate(sales=Sum('sales_revenue'), purchases=Sum('purchase_cost'))
+    return (totals['sales'] or 0) - (totals['purchases'] or 0)
+
+
+def balance_history():
+    """
+    Closing balance of each of the last 30 days, as chart labels and values.
+    """
+    from .ledger import balance_series
+    today = timezone.localdate()
+    series = balance_series(today - timezone.timedelta(days=29), today)
+    return {
+        'dates': [day.strftime('%Y-%m-%d') for day, _ in series],
+        'amounts': [float(amount) for _, amount in series],
+    }
+
+
+# Widget name -> function computing it. Widgets covering a rolling window of
+# days are keyed by date as well so that they roll over at midnight.
+WIDGETS = {
+    'sales_totals': sales_totals,
+    'top_sellers': top_sellers,
+    'low_stock': low_stock,
+    'profit': profit,
+    'balance_history': balance_history,
+}
+DATED_WIDGETS = {'sales_totals', 'top_sellers', 'balance_history'}
+
+# Model name -> widgets whose value depends on that model's rows.
+DEPENDENCIES = {
+    'Sale': ('sales_totals', 'top_sellers', 'profit'),
+    'SaleItem': ('sales_totals', 'top_sellers', 'profit'),
+    'Purchase': ('profit',),
+    'PurchaseItem': ('profit',),
+    'Product': ('top_sellers', 'low_stock'),
+    'Balance': ('balance_history',),
+    'Transaction': ('balance_history',),
+    'DailyProductRollup': ('sales_totals', 'top_sellers', 'profit'),
+    'ReorderForecast': ('low_stock',),
+}
+
+
+def _key(name):
+    if name in DATED_WIDGETS:
+        return f'{CACHE_PREFIX}:{name}:{timezone.localdate().isoformat()}'
+    return f'{CACHE_PREFIX}:{name}'
+
+
+def _count(name, outcome):
+    key = f'{CACHE_PREFIX}:stats:{name}:{outcome}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_widget(name):
+    """
+    Returns the value of a dashboard widget, computing and caching it on a miss.
+    Misses are computed on the primary database: ``invalidate`` runs when the
+    primary commits, and a replica that has not caught up yet would put the
+    old value back in the cache until the timeout.
+    """
+    key = _key(name)
+    value = cache.get(key)
+    if value is not None:
+        _count(name, 'hits')
+        return value
+    _count(name, 'misses')
+    with primary_reads():
+        value = WIDGETS[name]()
+    cache.set(key, value, getattr(settings, 'SHOP_DASHBOARD_CACHE_TIMEOUT', 300))
+    return value
+
+
+def invalidate(*names):
+    """
+    Drops the cached value of the given widgets (all of them when none are given)
+    once the current database transaction commits, so that a concurrent request
+    cannot re-cache data from before the write.
+    """
+    names = names or tuple(WIDGETS)
+
+    def drop():
+        cache.delete_many([_key(name) for name in names])
+        _bump_generation()
+    transaction.on_commit(drop)
+
+
+def _bump_generation():
+    key = f'{CACHE_PREFIX}:generation'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def generation():
+    """
+    A number that changes whenever any widget is invalidated; the dashboard's
+    ETag is built from it.
+    """
+    return cache.get(f'{CACHE_PREFIX}:generation', 0)
+
+
+def invalidate_for(model_name):
+    names = DEPENDENCIES.get(model_name)
+    if names:
+        invalidate(*names)
+
+
+def cache_stats():
+    """
+    Hit/miss counters per widget since the cache was last cleared.
+    """
+    stats = {}
+    for name in WIDGETS:
+        hits = cache.get(f'{CACHE_PREFIX}:stats:{name}:hits', 0)
+        misses = cache.get(f'{CACHE_PREFIX}:stats:{name}:misses', 0)
+        total = hits + misses
+        stats[name] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 3) if total else None}
+    return stats
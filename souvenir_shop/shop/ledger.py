@@ -0,0 +1,294 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import jobs, kpis
+from .models import ArchivedTransaction, ArchivePeriod, Balance, Transaction
+
+
+def ledger_enabled():
+    """
+    True when balances are maintained incrementally from Transaction writes
+    (``SHOP_BALANCE_MODE = 'ledger'``) instead of re-aggregated after each write.
+    """
+    return getattr(settings, 'SHOP_BALANCE_MODE', 'ledger') == 'ledger'
+
+
+def transaction_day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _ensure_snapshot(day):
+    """
+    Makes sure a Balance row exists for ``day``, carrying the amount forward
+    from the closest earlier snapshot.
+    """
+    if Balance.objects.filter(balance_date=day).exists():
+        return
+    previous = (Balance.objects.filter(balance_date__lt=day)
+                .order_by('-balance_date')
+                .values_list('amount', flat=True)
+                .first())
+    Balance.objects.get_or_create(balance_date=day, defaults={'amount': previous or 0})
+
+
+def apply_balance_deltas(deltas):
+    """
+    Applies signed amounts, keyed by transaction day, to the Balance history.
+
+    Every snapshot on or after a transaction's day includes it, so one
+    ``UPDATE ... SET amount = amount + delta`` per day keeps both today's
+    balance and older snapshots correct, even for back-dated entries.
+    In queue mode a ``rebuild_balances`` job from the earliest day is queued instead.
+    """
+    deltas = {day: amount for day, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    if jobs.queue_enabled():
+        jobs.enqueue_since('rebuild_balances', min(deltas))
+        return
+    with transaction.atomic():
+        _ensure_snapshot(timezone.localdate())
+        for day in sorted(deltas):
+            if day > timezone.localdate():
+                _ensure_snapshot(day)
+            Balance.objects.filter(balance_date__gte=day).update(amount=F('amount') + deltas[day])
+        kpis.invalidate_for('Balance')
+
+
+def apply_balance_delta(day, amount):
+    apply_balance_deltas({day: amount})
+
+
+def current_balance():
+    """
+    The latest snapshot on or before today; a single indexed lookup.
+    """
+    amount = (Balance.objects.filter(balance_date__lte=timezone.localdate())
+              .order_by('-balance_date')
+              .values_list('amount', flat=True)
+              .first())
+    return amount or Decimal('0')
+
+
+def get_current_balance():
+    """
+    Calculates the current balance by summing all transactions up to today.
+    In ledger mode the latest Balance row is already current, so it is read directly.
+    """
+    if ledger_enabled():
+        return current_balance()
+    today = timezone.now().date()
+    # Get the latest balance, and use that as a starting point.
+    latest_balance = Balance.objects.order_by('-balance_date').first()
+    if latest_balance:
+        amount = latest_balance.amount
+        # Add transactions since the latest balance date
+        transactions = Transaction.objects.filter(transaction_date__date__gt=latest_balance.balance_date, transaction_date__date__lte=today).aggregate(Sum('amount'))['amount__sum'] or 0
+        amount += transactions
+    else:
+        # No previous balance, so start from zero.
+        amount = Transaction.objects.filter(transaction_date__date__lte=today).aggregate(Sum('amount'))['amount__sum'] or 0
+
+    return amount
+
+
+def update_or_create_balance():
+    """
+    Updates the current balance or creates a new balance entry for today.
+    Nothing to do in ledger mode: Transaction signals have already applied the change.
+    In queue mode the worker recomputes today's balance instead.
+    """
+    if ledger_enabled():
+        return
+    if jobs.queue_enabled():
+        jobs.enqueue_since('rebuild_balances', timezone.localdate())
+        return
+    today = timezone.now().date()
+    amount = get_current_balance()
+
+    # Check if a balance entry for today already exists
+    balance, created = Balance.objects.get_or_create(balance_date=today, defaults={'amount': amount})
+    if not created:
+        # Update the existing balance entry
+        balance.amount = amount
+        balance.save()
+
+
+def transaction_deltas(previous, instance=None):
+    """
+    Returns the per-day deltas for replacing ``previous`` (a ``(day, amount)``
+    pair or None) with ``instance`` (a Transaction or None).
+    """
+    deltas = defaultdict(Decimal)
+    if previous is not None:
+        day, amount = previous
+        deltas[day] -= Decimal(amount)
+    if instance is not None:
+        deltas[transaction_day(instance.transaction_date)] += Decimal(instance.amount)
+    return deltas
+
+
+CENT = Decimal('0.01')
+
+
+def day_start(day):
+    """
+    The aware datetime at which ``day`` starts in the current time zone. Days
+    are filtered as ``[day_start(first), day_start(last + 1 day))`` so the date
+    indexes can be used.
+    """
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def archive_cutoff():
+    """
+    The first day after the archived months, or None when nothing is archived.
+    Archived transactions are all dated before it.
+    """
+    month = ArchivePeriod.objects.aggregate(last=Max('month'))['last']
+    if month is None:
+        return None
+    return (month + datetime.timedelta(days=31)).replace(day=1)
+
+
+def opening_balance(day):
+    """
+    The sum of every transaction, hot or archived, dated before ``day``.
+    """
+    hot = Transaction.objects.filter(transaction_date__lt=day_start(day)).aggregate(total=Sum('amount'))['total']
+    cutoff = archive_cutoff()
+    if cutoff is None:
+        archived = None
+    elif day >= cutoff:
+        # The whole archive counts: read the month summaries, not the rows.
+        archived = ArchivePeriod.objects.aggregate(total=Sum('transactions_total'))['total']
+    else:
+        archived = ArchivedTransaction.objects.filter(transaction_date__lt=day_start(day)).aggregate(total=Sum('amount'))['total']
+    return ((hot or Decimal('0')) + (archived or Decimal('0'))).quantize(CENT)
+
+
+def daily_totals(start=None, end=None):
+    """
+    ``{day: sum of amounts}`` over hot and archived transactions from ``start``
+    to ``end`` inclusive (either may be None); one grouped query per table, and
+    the archive is skipped when the range lies after it.
+    """
+    filters = {}
+    if start is not None:
+        filters['transaction_date__gte'] = day_start(start)
+    if end is not None:
+        filters['transaction_date__lt'] = day_start(end + datetime.timedelta(days=1))
+    models = [Transaction]
+    cutoff = archive_cutoff()
+    if cutoff is not None and (start is None or start < cutoff):
+        models.append(ArchivedTransaction)
+    totals = defaultdict(Decimal)
+    for model in models:
+        for day, total in (model.objects.filter(**filters)
+                           .annotate(day=TruncDate('transaction_date'))
+                           .values('day').annotate(total=Sum('amount'))
+                           .order_by().values_list('day', 'total')):
+            totals[day] += total.quantize(CENT)  # SQLite sums decimals as floats
+    return totals
+
+
+def daily_closing_balances():
+    """
+    Yields ``(day, closing_balance)`` for every day that has transactions,
+    hot or archived, in day order.
+    """
+    running = Decimal('0')
+    for day, total in sorted(daily_totals().items()):
+        running += total
+        yield day, running
+
+
+def rebuild_balances(since):
+    """
+    Recomputes the Balance snapshots from ``since`` onwards: one aggregate for
+    the opening balance, one grouped query for the daily totals after it.
+    """
+    opening = opening_balance(since)
+    daily = daily_totals(since)
+
+    with transaction.atomic():
+        existing = {balance.balance_date: balance for balance in Balance.objects.filter(balance_date__gte=since)}
+        days = set(daily) | set(existing)
+        if timezone.localdate() >= since:
+            days.add(timezone.localdate())
+        running = opening
+        to_create, to_update = [], []
+        for day in sorted(days):
+            running += daily.get(day, 0)
+            balance = existing.get(day)
+            if balance is None:
+                to_create.append(Balance(balance_date=day, amount=running))
+            elif balance.amount != running:
+                balance.amount = running
+                to_update.append(balance)
+        Balance.objects.bulk_update(to_update, ['amount'], batch_size=1000)
+        Balance.objects.bulk_create(to_create, batch_size=1000)
+        kpis.invalidate_for('Balance')
+    return len(to_create) + len(to_update)
+
+
+def snapshots_current():
+    """
+    True when every Balance snapshot includes all transactions up to its day:
+    balances are kept by the ledger and no ``rebuild_balances`` job is still
+    outstanding. In aggregate mode snapshots are only refreshed for the day of
+    a write, and in queue mode they lag until the worker has run.
+    """
+    return ledger_enabled() and not jobs.outstanding('rebuild_balances')
+
+
+def balance_series(start, end):
+    """
+    Returns ``[(day, closing_balance)]`` for every day from ``start`` to ``end``
+    inclusive, with no gaps.
+
+    The cost does not depend on the length of the range: one indexed lookup
+    for the nearest snapshot before ``start``, then one grouped query for the
+    daily transaction totals from that snapshot to ``end`` (plus one over the
+    archive when the range reaches into it), turned into balances with a
+    running (prefix) sum. When the snapshots may be stale (see
+    ``snapshots_current``) the series starts from ``opening_balance(start)``
+    instead.
+    """
+    anchor = None
+    if snapshots_current():
+        anchor = (Balance.objects.filter(balance_date__lt=start)
+                  .order_by('-balance_date')
+                  .values_list('balance_date', 'amount')
+                  .first())
+    if anchor is not None:
+        anchor_day, running = anchor
+        since = anchor_day + datetime.timedelta(days=1)
+    else:
+        running, since = opening_balance(start), start
+    daily = daily_totals(since, end)
+
+    for day in sorted(day for day in daily if day < start):
+        running += daily[day]
+    series = []
+    day = start
+    while day <= end:
+        running += daily.get(day, 0)
+        # SQLite sums decimals as floats; report whole cents.
+        series.append((day, running.quantize(CENT)))
+        day += datetime.timedelta(days=1)
+    return series
+
+
+def balance_as_of(day):
+    """
+    The closing balance of ``day``, whether or not a snapshot exists for it.
+    """
+    return balance_series(day, day)[0][1]
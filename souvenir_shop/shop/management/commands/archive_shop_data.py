@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.archive import archive_before, default_cutoff
+
+
+class Command(BaseCommand):
+    help = "Moves sales, purchases and transactions of old months to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help="Archive everything dated before the month of this date (YYYY-MM-DD).")
+        parser.add_argument('--keep-months', type=int, default=12,
+                            help="Months to keep in the hot tables besides the current one (default 12).")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = datetime.date.fromisoformat(options['before']).replace(day=1)
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['before']}")
+        else:
+            if options['keep_months'] < 0:
+                raise CommandError("--keep-months must not be negative.")
+            cutoff = default_cutoff(options['keep_months'])
+        summaries = archive_before(cutoff, batch_size=options['batch_size'])
+        for month in sorted(summaries):
+            summary = summaries[month]
+            self.stdout.write(
+                f"{month:%Y-%m}: {summary['sale_count']} sale(s), {summary['purchase_count']} purchase(s), "
+                f"{summary['transaction_count']} transaction(s)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Archived {len(summaries)} month(s) before {cutoff}."))
@@ -0,0 +1,262 @@
+import asyncio
+import datetime
+import itertools
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from importlib import import_module
+from io import StringIO
+
+import django
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, reverse
+
+from shop import exports, profiling
+from shop.management.commands.generate_shop_data import SCALES
+from shop.models import ArchivedPurchase, ArchivedSale, ArchivePeriod, Artist, Balance, Product, Purchase, PurchaseItem, Sale, SaleItem, Transaction
+from shop.views import ARCHIVE_DATASETS
+
+# Model whose first row fills the ``<int:pk>`` of a URL, by URL name without its last word.
+PK_MODELS = {
+    'archived_purchase': ArchivedPurchase,
+    'archived_sale': ArchivedSale,
+    'artist': Artist,
+    'product': Product,
+    'purchase': Purchase,
+    'sale': Sale,
+    'transaction': Transaction,
+}
+
+COUNTED_MODELS = (Artist, Product, Purchase, PurchaseItem, Sale, SaleItem, Transaction, Balance)
+
+# Client, root URLconf and shop URLconf of each deployment; asgi.py serves souvenir_shop.asgi_urls.
+HANDLERS = {
+    'wsgi': (Client, 'souvenir_shop.urls', 'shop.urls'),
+    'asgi': (AsyncClient, 'souvenir_shop.asgi_urls', 'shop.async_urls'),
+}
+
+BENCHMARK_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shop-benchmark'}}
+
+
+def item_formset_data(product, name):
+    """
+    POST data of an item formset with one line of ``product``, priced the way
+    the sale or purchase form fills it in.
+    """
+    price = product.purchase_price if name == 'purchase_create' else product.selling_price
+    return {
+        'items-TOTAL_FORMS': 1, 'items-INITIAL_FORMS': 0,
+        'items-0-product': product.pk, 'items-0-quantity': 1, 'items-0-unit_price': price,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks every URL in shop/urls.py against freshly generated test databases of "
+        "several sizes, reporting wall time, query count and peak Python memory, and saves the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='tiny,small', help=f"Comma separated data sizes from {', '.join(SCALES)} (default tiny,small).")
+        parser.add_argument('--handlers', default='wsgi,asgi', help="Comma separated deployments to compare: wsgi, asgi (default both).")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed requests per URL (default 5).")
+        parser.add_argument('--only', help="Comma separated URL names to benchmark instead of all of them.")
+        parser.add_argument('--exclude', default='', help="Comma separated URL names to skip.")
+        parser.add_argument('--warm-cache', action='store_true', help="Keep the cache between requests instead of clearing it before each one.")
+        parser.add_argument('--seed', type=int, default=42, help="Seed for the generated data (default 42).")
+        parser.add_argument('--output', default='benchmark-results.json', help="JSON file to write (default benchmark-results.json).")
+
+    def handle(self, *args, **options):
+        scales = [scale for scale in options['scales'].split(',') if scale]
+        unknown = set(scales) - set(SCALES)
+        if unknown:
+            raise CommandError(f"Unknown scale(s): {', '.join(sorted(unknown))}.")
+        self.handlers = [handler for handler in options['handlers'].split(',') if handler]
+        if set(self.handlers) - set(HANDLERS):
+            raise CommandError(f"Unknown handler(s): {', '.join(sorted(set(self.handlers) - set(HANDLERS)))}.")
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        self.repeat = options['repeat']
+        self.warm_cache = options['warm_cache']
+        self.seed = options['seed']
+        self.keys = itertools.count()  # Checkout keys must stay unique across handlers
+        self.names = {name for name in (options['only'] or '').split(',') if name}
+        self.excluded = {name for name in options['exclude'].split(',') if name}
+
+        report = {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': self.repeat,
+            'warm_cache': self.warm_cache,
+            'scales': {},
+        }
+        setup_test_environment()
+        try:
+            # The checkout API is off without a token; give the benchmark one if none is configured.
+            token = getattr(settings, 'SHOP_API_TOKEN', None) or 'benchmark'
+            with override_settings(CACHES=BENCHMARK_CACHES, DEBUG=False, SHOP_API_TOKEN=token):
+                for scale in scales:
+                    report['scales'][scale] = self.benchmark_scale(scale)
+        finally:
+            teardown_test_environment()
+
+        with open(options['output'], 'w') as handle:
+            json.dump(report, handle, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    def benchmark_scale(self, scale):
+        """
+        Creates a test database, fills it with ``scale`` data and times every URL.
+        """
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            call_command('generate_shop_data', scale=scale, seed=self.seed, stdout=StringIO())
+            generated = time.perf_counter() - started
+            result = {
+                'generate_seconds': round(generated, 3),
+                'rows': {model.__name__: model.objects.count() for model in COUNTED_MODELS},
+                'handlers': {},
+            }
+            self.stdout.write(f"\n{scale}: generated in {generated:.1f}s")
+            for handler in self.handlers:
+                client_class, urlconf, shop_urlconf = HANDLERS[handler]
+                result['handlers'][handler] = {}
+                self.stdout.write(f"  {handler:<28}{'status':>7}{'queries':>9}{'median ms':>11}{'max ms':>9}{'peak KiB':>10}")
+                with override_settings(ROOT_URLCONF=urlconf):
+                    for name, request in self.requests(scale, shop_urlconf):
+                        measured = self.measure(client_class, request)
+                        result['handlers'][handler][name] = measured
+                        self.stdout.write(
+                            f"  {name:<28}{measured['status']:>7}{measured['queries']:>9}"
+                            f"{measured['median_ms']:>11.1f}{measured['max_ms']:>9.1f}{measured['peak_kib']:>10.0f}"
+                        )
+            return result
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def requests(self, scale, shop_urlconf):
+        """
+        Yields ``(label, request)`` for each URL pattern in ``shop_urlconf``, where
+        ``request(client)`` performs one request and returns the response (or a
+        coroutine for the async client).
+        """
+        product = Product.objects.order_by('-stock_quantity', 'pk').first()  # Sold by the checkout and sale_create POSTs
+        token = settings.SHOP_API_TOKEN
+
+        for pattern in import_module(shop_urlconf).urlpatterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+            name = pattern.name
+            if (self.names and name not in self.names) or name in self.excluded:
+                continue
+            converters = pattern.pattern.converters
+            if name == 'export_data':
+                for dataset in exports.EXPORTS:
+                    url = reverse(f'shop:{name}', kwargs={'dataset': dataset})
+                    yield f'{name}:{dataset}', lambda client, url=url: client.get(url)
+                continue
+            if name == 'archive_period':
+                period = ArchivePeriod.objects.order_by('-month').first()
+                if period is None:
+                    continue
+                for dataset in ARCHIVE_DATASETS:
+                    url = reverse(f'shop:{name}', kwargs={'year': period.month.year, 'month': period.month.month, 'dataset': dataset})
+                    yield f'{name}:{dataset}', lambda client, url=url: client.get(url)
+                continue
+
+            kwargs = {}
+            if 'pk' in converters:
+                obj = PK_MODELS[name.rsplit('_', 1)[0]].objects.order_by('pk').first()
+                if obj is None:
+                    continue
+                kwargs['pk'] = obj.pk
+            if set(converters) - kwargs.keys():
+                continue  # No sample value for other parameters, such as a profile name
+            url = reverse(f'shop:{name}', kwargs=kwargs)
+
+            if name == 'api_checkout':
+                if product is None:
+                    continue
+                # ``headers`` rather than HTTP_* extras: AsyncClient only sends the former as ASGI headers.
+                headers = {'Authorization': f'Bearer {token}'}
+
+                def checkout(client, url=url, headers=headers):
+                    body = {'sales': [{'key': f'benchmark-{scale}-{next(self.keys)}', 'items': [{'product': product.pk, 'quantity': 1}]}]}
+                    return client.post(url, json.dumps(body), content_type='application/json', headers=headers)
+
+                yield name, checkout
+            else:
+                yield name, lambda client, url=url: client.get(url)
+                if name in ('sale_create', 'purchase_create') and product is not None:
+                    data = {'notes': 'Benchmark', **item_formset_data(product, name)}
+                    if name == 'purchase_create':
+                        data['artist'] = product.artist_id
+                    yield f'{name}:post', lambda client, url=url, data=data: client.post(url, data)
+
+    def run(self, client, request):
+        if not self.warm_cache:
+            cache.clear()
+        response = request(client)
+        if asyncio.iscoroutine(response):
+            response = async_to_sync(self.consume)(response)
+        elif response.streaming:
+            self.drain(response)
+        response.close()
+        return response
+
+    async def consume(self, pending):
+        response = await pending
+        if response.streaming:
+            if response.is_async:
+                async for _ in response.streaming_content:
+                    pass
+            else:
+                await sync_to_async(self.drain)(response)  # Sync iterators query the database
+        return response
+
+    def drain(self, response):
+        for _ in response.streaming_content:
+            pass
+
+    def measure(self, client_class, request):
+        """
+        Times ``repeat`` requests, then repeats one under tracemalloc for the
+        peak memory (tracing slows requests down, so it is kept out of the timings).
+        """
+        client = client_class(raise_request_exception=False)
+        self.run(client, request)  # Warm up imports and the template cache
+        timings = []
+        with profiling.recording(profiling.QueryRecorder()) as recorder:
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                response = self.run(client, request)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        try:
+            self.run(client, request)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'status': response.status_code,
+            'queries': len(recorder.queries) // self.repeat,
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'peak_kib': round(peak / 1024, 1),
+        }
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import columnar
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the sale lines, denormalized with their sale, product and artist, as a columnar "
+        "snapshot partitioned by month (month=YYYY-MM/part-0.parquet). Later runs only rewrite "
+        "the months that changed since the last export."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Directory of the snapshot; its _manifest.json records what was exported.")
+        parser.add_argument('--format', choices=sorted(columnar.EXTENSIONS), default='parquet',
+                            help="parquet (default) or arrow (Arrow IPC files).")
+        parser.add_argument('--full', action='store_true', help="Rewrite every partition.")
+        parser.add_argument('--chunk-size', type=int, default=columnar.CHUNK_SIZE,
+                            help=f"Rows read from the database per batch (default {columnar.CHUNK_SIZE}).")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        result = columnar.export_sales(
+            options['output'], options['format'], full=options['full'],
+            chunk_size=options['chunk_size'], log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(result['written'])} partition(s), removed {len(result['removed'])}, "
+            f"{result['unchanged']} unchanged."
+        ))
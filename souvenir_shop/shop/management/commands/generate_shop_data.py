@@ -0,0 +1,226 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from shop import choices, kpis, settlements
+from shop.models import Artist, Product, Purchase, PurchaseItem, Sale, SaleItem, StockMovement, Transaction
+from shop.rollups import rebuild_rollups
+from shop.reorder import refresh_forecasts
+from shop.search import index_products
+
+# Preset data volumes; "large" is roughly 5M sale items.
+SCALES = {
+    'tiny': {'artists': 10, 'products': 100, 'purchases': 50, 'sales': 500, 'days': 90},
+    'small': {'artists': 100, 'products': 1000, 'purchases': 500, 'sales': 10000, 'days': 365},
+    'medium': {'artists': 1000, 'products': 10000, 'purchases': 5000, 'sales': 200000, 'days': 730},
+    'large': {'artists': 10000, 'products': 100000, 'purchases': 50000, 'sales': 1700000, 'days': 730},
+}
+
+WORDS = (
+    'amber', 'clay', 'coastal', 'copper', 'felt', 'forest', 'glass', 'harbor', 'linen', 'marble',
+    'meadow', 'moss', 'oak', 'painted', 'river', 'salt', 'silver', 'stone', 'willow', 'woven',
+)
+KINDS = ('mug', 'print', 'postcard', 'magnet', 'scarf', 'bowl', 'pin', 'tote', 'candle', 'earrings')
+
+
+class Command(BaseCommand):
+    help = "Fills the database with seeded, realistic synthetic shop data for benchmarking, inserted in bulk."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help="Preset data volume (default small).")
+        parser.add_argument('--artists', type=int, help="Override the number of artists.")
+        parser.add_argument('--products', type=int, help="Override the number of products.")
+        parser.add_argument('--purchases', type=int, help="Override the number of purchases.")
+        parser.add_argument('--sales', type=int, help="Override the number of sales.")
+        parser.add_argument('--days', type=int, help="Override the number of days of history.")
+        parser.add_argument('--max-items', type=int, default=5, help="Maximum line items per sale or purchase (default 5).")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed (default 42).")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per bulk insert (default 5000).")
+
+    def handle(self, *args, **options):
+        volumes = dict(SCALES[options['scale']])
+        for name in volumes:
+            if options[name] is not None:
+                volumes[name] = options[name]
+        if volumes['artists'] < 1 or volumes['products'] < 1:
+            raise CommandError("At least one artist and one product are needed.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.max_items = options['max_items']
+        self.end = timezone.now().replace(microsecond=0)
+        self.start = self.end - datetime.timedelta(days=volumes['days'])
+
+        artist_ids = self.create_artists(volumes['artists'])
+        products = self.create_products(volumes['products'], artist_ids)
+        stock = {product_id: 0 for product_id, _, _, _ in products}
+        self.create_purchases(volumes['purchases'], products, stock)
+        self.create_sales(volumes['sales'], products, stock)
+        self.restock(products, stock)
+
+        with transaction.atomic():
+            now = timezone.now()
+            Product.objects.bulk_update(
+                [Product(pk=product_id, stock_quantity=quantity, updated_at=now) for product_id, quantity in stock.items()],
+                ['stock_quantity', 'updated_at'],
+                batch_size=1000,
+            )
+        call_command('rebuild_balances', stdout=self.stdout)
+        rebuild_rollups()
+        index_products()
+        refresh_forecasts()
+        kpis.invalidate()
+        settlements.invalidate()
+        choices.invalidate(Artist, Product)
+        self.stdout.write(self.style.SUCCESS(
+            "Generated {artists} artists, {products} products, {purchases} purchases and {sales} sales.".format(**volumes)
+        ))
+
+    def moments(self, count):
+        """
+        ``count`` random datetimes between start and end, in ascending order.
+        """
+        span = int((self.end - self.start).total_seconds())
+        return (self.start + datetime.timedelta(seconds=offset) for offset in sorted(self.rng.randrange(span) for _ in range(count)))
+
+    def batches(self, count):
+        for first in range(0, count, self.batch_size):
+            yield range(first, min(first + self.batch_size, count))
+
+    def create_artists(self, count):
+        artist_ids = []
+        for batch in self.batches(count):
+            artists = [
+                Artist(
+                    name=f'{self.rng.choice(WORDS).title()} Studio {i + 1}',
+                    contact_information=f'artist{i + 1}@example.com',
+                )
+                for i in batch
+            ]
+            Artist.objects.bulk_create(artists)
+            artist_ids.extend(artist.pk for artist in artists)
+        return artist_ids
+
+    def create_products(self, count, artist_ids):
+        """
+        Returns ``(pk, artist_id, purchase_price, selling_price)`` for every product.
+        """
+        products = []
+        for batch in self.batches(count):
+            objects = []
+            for i in batch:
+                purchase_price = Decimal(self.rng.randint(100, 5000)) / 100
+                objects.append(Product(
+                    name=f'{self.rng.choice(WORDS).title()} {self.rng.choice(KINDS)} #{i + 1}',
+                    description=f'Handmade {self.rng.choice(WORDS)} {self.rng.choice(KINDS)}',
+                    purchase_price=purchase_price,
+                    selling_price=(purchase_price * Decimal(self.rng.choice(('1.5', '2', '2.5')))).quantize(Decimal('0.01')),
+                    artist_id=self.rng.choice(artist_ids),
+                ))
+            Product.objects.bulk_create(objects)
+            products.extend((p.pk, p.artist_id, p.purchase_price, p.selling_price) for p in objects)
+        return products
+
+    def create_purchases(self, count, products, stock):
+        by_artist = {}
+        for product in products:
+            by_artist.setdefault(product[1], []).append(product)
+        artists = list(by_artist)
+        moments = self.moments(count)
+        for batch in self.batches(count):
+            planned = []
+            for _ in batch:
+                artist_id = self.rng.choice(artists)
+                choices = by_artist[artist_id]
+                chosen = self.rng.sample(choices, min(len(choices), self.rng.randint(1, self.max_items)))
+                planned.append((next(moments), artist_id, [(p, self.rng.randint(5, 50)) for p in chosen]))
+            self.insert_purchases(planned, stock)
+
+    def restock(self, products, stock):
+        """
+        Adds one closing purchase per artist for every product sold below zero,
+        so the generated stock levels stay non-negative.
+        """
+        by_artist = {}
+        for product in products:
+            if stock[product[0]] < 0:
+                by_artist.setdefault(product[1], []).append((product, self.rng.randint(5, 20) - stock[product[0]]))
+        planned = [(self.end, artist_id, items) for artist_id, items in by_artist.items()]
+        for first in range(0, len(planned), self.batch_size):
+            self.insert_purchases(planned[first:first + self.batch_size], stock)
+
+    def insert_purchases(self, planned, stock):
+        """
+        Bulk inserts ``(purchase_date, artist_id, [(product, quantity)])`` purchases
+        with their items and transactions.
+        """
+        purchases = [
+            Purchase(purchase_date=moment, artist_id=artist_id, total_amount=sum(p[2] * quantity for p, quantity in items))
+            for moment, artist_id, items in planned
+        ]
+        with transaction.atomic():
+            Purchase.objects.bulk_create(purchases)
+            PurchaseItem.objects.bulk_create([
+                PurchaseItem(purchase=purchase, product_id=p[0], quantity=quantity, unit_price=p[2])
+                for purchase, (_, _, items) in zip(purchases, planned) for p, quantity in items
+            ])
+            StockMovement.objects.bulk_create([
+                StockMovement(product_id=p[0], quantity=quantity, kind=StockMovement.PURCHASE,
+                              moved_at=purchase.purchase_date, related_purchase_id=purchase.pk)
+                for purchase, (_, _, items) in zip(purchases, planned) for p, quantity in items
+            ])
+            Transaction.objects.bulk_create([
+                Transaction(
+                    transaction_type='PURCHASE',
+                    description=f'Purchase from artist {purchase.artist_id} on {purchase.purchase_date.strftime("%Y-%m-%d")}',
+                    amount=-purchase.total_amount,
+                    related_purchase=purchase,
+                    transaction_date=purchase.purchase_date,
+                )
+                for purchase in purchases
+            ])
+        for _, _, items in planned:
+            for p, quantity in items:
+                stock[p[0]] += quantity
+
+    def create_sales(self, count, products, stock):
+        # A few products sell far more than the rest, as in a real shop.
+        weights = [1 / (rank + 1) for rank in range(len(products))]
+        moments = self.moments(count)
+        for batch in self.batches(count):
+            sales, lines = [], []
+            for _ in batch:
+                size = self.rng.randint(1, self.max_items)
+                chosen = {p[0]: p for p in self.rng.choices(products, weights=weights, k=size)}
+                items = [(p, self.rng.randint(1, 3)) for p in chosen.values()]
+                sales.append(Sale(sale_date=next(moments), total_amount=sum(p[3] * quantity for p, quantity in items)))
+                lines.append(items)
+            with transaction.atomic():
+                Sale.objects.bulk_create(sales)
+                SaleItem.objects.bulk_create([
+                    SaleItem(sale=sale, product_id=p[0], quantity=quantity, unit_price=p[3], unit_cost=p[2])
+                    for sale, items in zip(sales, lines) for p, quantity in items
+                ])
+                StockMovement.objects.bulk_create([
+                    StockMovement(product_id=p[0], quantity=-quantity, kind=StockMovement.SALE,
+                                  moved_at=sale.sale_date, related_sale_id=sale.pk)
+                    for sale, items in zip(sales, lines) for p, quantity in items
+                ])
+                Transaction.objects.bulk_create([
+                    Transaction(
+                        transaction_type='SALE',
+                        description=f'Sale on {sale.sale_date.strftime("%Y-%m-%d")}',
+                        amount=sale.total_amount,
+                        related_sale=sale,
+                        transaction_date=sale.sale_date,
+                    )
+                    for sale in sales
+                ])
+            for items in lines:
+                for p, quantity in items:
+                    stock[p[0]] -= quantity
@@ -0,0 +1,414 @@
+import csv
+import datetime
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from shop import choices, kpis, ledger, settlements
+from shop.models import Artist, ImportRef, Product, Purchase, PurchaseItem, Sale, SaleItem, StockMovement, Transaction
+from shop.rollups import rebuild_rollups
+from shop.search import index_products
+from shop.stock import adjust_stock, stock_movements
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports artists, products, purchases and sales from CSV files in bounded memory. "
+        "Rows are written with bulk_create in chunks, all in one transaction, and names and refs "
+        "are looked up a chunk at a time; purchase/sale totals, stock and the derived transactions "
+        "are recomputed afterwards in set-based passes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--artists', help="CSV with name, contact_information, notes.")
+        parser.add_argument('--products', help="CSV with name, description, purchase_price, selling_price, stock_quantity, artist.")
+        parser.add_argument('--purchases', help="CSV with ref, purchase_date, artist, notes.")
+        parser.add_argument('--purchase-items', help="CSV with purchase_ref, product, quantity, unit_price.")
+        parser.add_argument('--sales', help="CSV with ref, sale_date, notes.")
+        parser.add_argument('--sale-items', help="CSV with sale_ref, product, quantity, unit_price.")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows per bulk insert and update (default 1000).")
+        parser.add_argument('--encoding', default='utf-8-sig', help="Encoding of the CSV files (default utf-8-sig).")
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        self.encoding = options['encoding']
+        if self.chunk_size < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        # The imported purchases and sales are recorded as ImportRef rows of
+        # this run: item rows resolve their refs through them, and finalize()
+        # only ever touches these rows, never rows written concurrently by the
+        # views or the checkout API.
+        self.run = uuid.uuid4()
+        self.earliest_day = None
+
+        steps = [
+            ('artists', self.import_artists),
+            ('products', self.import_products),
+            ('purchases', self.import_purchases),
+            ('purchase_items', self.import_purchase_items),
+            ('sales', self.import_sales),
+            ('sale_items', self.import_sale_items),
+        ]
+        # One transaction for the whole run: a bad row in a later chunk must not
+        # leave earlier purchases and sales committed without their totals,
+        # transactions, stock and rollups.
+        with transaction.atomic():
+            for option, step in steps:
+                if options[option]:
+                    count = step(options[option])
+                    self.stdout.write(f"Imported {count} {option.replace('_', ' ')}.")
+
+            if options['purchases'] or options['sales']:
+                self.finalize()
+            ImportRef.objects.filter(run=self.run).delete()
+        if options['artists'] or options['products']:
+            choices.invalidate(Artist, Product)
+        self.stdout.write(self.style.SUCCESS("Import finished."))
+
+    # Reading
+
+    def read(self, path):
+        """
+        Yields ``(file_name, row)`` from a CSV file without loading it into memory.
+        """
+        try:
+            with open(path, newline='', encoding=self.encoding) as handle:
+                for row in csv.DictReader(handle):
+                    yield handle.name, row
+        except OSError as exc:
+            raise CommandError(f"Cannot read {path}: {exc}")
+
+    def bulk_insert(self, path, build, model, inserted=None, prepare=None):
+        """
+        Streams ``path`` through ``build(row)`` and bulk inserts the resulting
+        instances chunk by chunk. ``prepare(rows)`` is called before a chunk is
+        built so the lookups it needs can be loaded, and ``inserted(rows, objects)``
+        after it is written so lookups can learn the new primary keys.
+        Returns the number of rows inserted.
+        """
+        count = 0
+        for chunk in _chunks(enumerate(self.read(path), start=2), self.chunk_size):
+            rows = [row for _, (_, row) in chunk]
+            if prepare is not None:
+                prepare(rows)
+            objects = []
+            for line, (name, row) in chunk:
+                try:
+                    objects.append(build(row))
+                except (KeyError, ValueError, ArithmeticError) as exc:
+                    raise CommandError(f"{name}, line {line}: {exc!r}")
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(objects)
+                    if inserted is not None:
+                        inserted(rows, objects)
+            except IntegrityError as exc:
+                raise CommandError(f"{name}, lines {chunk[0][0]}-{chunk[-1][0]}: {exc}")
+            count += len(objects)
+        return count
+
+    def imported(self, kind):
+        """
+        Yields the pks of the purchases or sales imported by this run,
+        ``--chunk-size`` at a time, in pk order.
+        """
+        refs = ImportRef.objects.filter(run=self.run, kind=kind).order_by('object_id')
+        last = None
+        while True:
+            chunk = list((refs if last is None else refs.filter(object_id__gt=last)).values_list('object_id', flat=True)[:self.chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last = chunk[-1]
+
+    def record_refs(self, kind, rows, objects):
+        ImportRef.objects.bulk_create([
+            ImportRef(run=self.run, kind=kind, ref=row['ref'], object_id=obj.pk) for row, obj in zip(rows, objects)
+        ])
+
+    def lookup_refs(self, kind, refs):
+        """
+        ``{ref: pk}`` of the given refs of this run; one query per chunk.
+        """
+        return dict(ImportRef.objects.filter(run=self.run, kind=kind, ref__in=refs).values_list('ref', 'object_id'))
+
+    # Field parsing
+
+    def parse_decimal(self, value, default=None):
+        if value in (None, '') and default is not None:
+            return default
+        return Decimal(value)
+
+    def parse_moment(self, value):
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"invalid date {value!r}")
+            moment = datetime.datetime.combine(day, datetime.time())
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        day = timezone.localdate(moment)
+        if self.earliest_day is None or day < self.earliest_day:
+            self.earliest_day = day
+        return moment
+
+    def load_artists(self, names):
+        """
+        ``{name: pk}`` of the given artist names; one query per chunk.
+        """
+        return dict(Artist.objects.filter(name__in=names).values_list('name', 'pk'))
+
+    def load_products(self, names):
+        """
+        ``{name: (pk, purchase_price, selling_price)}`` of the given product
+        names; one query per chunk.
+        """
+        return {name: (pk, purchase_price, selling_price) for pk, name, purchase_price, selling_price
+                in Product.objects.filter(name__in=names).values_list('pk', 'name', 'purchase_price', 'selling_price')}
+
+    def lookup(self, known, key, description):
+        try:
+            return known[key]
+        except KeyError:
+            raise ValueError(f"unknown {description} {key!r}")
+
+    # Steps
+
+    def import_artists(self, path):
+        def build(row):
+            return Artist(name=row['name'], contact_information=row.get('contact_information') or '', notes=row.get('notes') or None)
+
+        return self.bulk_insert(path, build, Artist)
+
+    def import_products(self, path):
+        artists = {}
+
+        def prepare(rows):
+            artists.clear()
+            artists.update(self.load_artists({row.get('artist') for row in rows}))
+
+        def build(row):
+            return Product(
+                name=row['name'],
+                description=row.get('description') or None,
+                purchase_price=self.parse_decimal(row['purchase_price']),
+                selling_price=self.parse_decimal(row['selling_price']),
+                stock_quantity=int(row.get('stock_quantity') or 0),
+                artist_id=self.lookup(artists, row['artist'], 'artist'),
+            )
+
+        def inserted(rows, products):
+            index_products([p.pk for p in products])
+            StockMovement.objects.bulk_create(stock_movements(
+                {p.pk: p.stock_quantity for p in products}, StockMovement.ADJUSTMENT, note='Imported stock',
+            ))
+
+        return self.bulk_insert(path, build, Product, inserted, prepare)
+
+    def import_purchases(self, path):
+        artists, refs = {}, set()
+
+        def prepare(rows):
+            artists.clear()
+            artists.update(self.load_artists({row.get('artist') for row in rows}))
+            refs.clear()
+            refs.update(self.lookup_refs(ImportRef.PURCHASE, {row.get('ref') for row in rows}))
+
+        def build(row):
+            if not row.get('ref'):
+                raise ValueError("missing ref")
+            if row['ref'] in refs:
+                raise ValueError(f"duplicate ref {row['ref']!r}")
+            refs.add(row['ref'])
+            return Purchase(
+                purchase_date=self.parse_moment(row['purchase_date']),
+                artist_id=self.lookup(artists, row['artist'], 'artist'),
+                total_amount=0,
+                notes=row.get('notes') or None,
+            )
+
+        def inserted(rows, purchases):
+            self.record_refs(ImportRef.PURCHASE, rows, purchases)
+
+        return self.bulk_insert(path, build, Purchase, inserted, prepare)
+
+    def import_sales(self, path):
+        refs = set()
+
+        def prepare(rows):
+            refs.clear()
+            refs.update(self.lookup_refs(ImportRef.SALE, {row.get('ref') for row in rows}))
+
+        def build(row):
+            if not row.get('ref'):
+                raise ValueError("missing ref")
+            if row['ref'] in refs:
+                raise ValueError(f"duplicate ref {row['ref']!r}")
+            refs.add(row['ref'])
+            return Sale(sale_date=self.parse_moment(row['sale_date']), total_amount=0, notes=row.get('notes') or None)
+
+        def inserted(rows, sales):
+            self.record_refs(ImportRef.SALE, rows, sales)
+
+        return self.bulk_insert(path, build, Sale, inserted, prepare)
+
+    def import_items(self, path, model, kind, make):
+        """
+        Imports the item rows of purchases or sales (``kind``) through
+        ``make(row, parent_pk, product)``. The refs and products of each chunk
+        are looked up together with the items their parents already have, so a
+        product listed twice for one parent is reported with its line.
+        """
+        ref_column = f'{kind}_ref'
+        refs, products, listed = {}, {}, set()
+
+        def prepare(rows):
+            refs.clear()
+            refs.update(self.lookup_refs(kind, {row.get(ref_column) for row in rows}))
+            products.clear()
+            products.update(self.load_products({row.get('product') for row in rows}))
+            listed.clear()
+            listed.update(model.objects.filter(**{f'{kind}__in': refs.values()}).values_list(f'{kind}_id', 'product_id'))
+
+        def build(row):
+            product = self.lookup(products, row['product'], 'product')
+            parent_pk = self.lookup(refs, row[ref_column], f'{kind} ref')
+            if (parent_pk, product[0]) in listed:
+                raise ValueError(f"product {row['product']!r} is listed twice for {kind} ref {row[ref_column]!r}")
+            listed.add((parent_pk, product[0]))
+            return make(row, parent_pk, product)
+
+        return self.bulk_insert(path, build, model, prepare=prepare)
+
+    def import_purchase_items(self, path):
+        def make(row, purchase_pk, product):
+            product_pk, purchase_price, _ = product
+            return PurchaseItem(
+                purchase_id=purchase_pk,
+                product_id=product_pk,
+                quantity=int(row['quantity']),
+                unit_price=self.parse_decimal(row.get('unit_price'), purchase_price),
+            )
+
+        return self.import_items(path, PurchaseItem, ImportRef.PURCHASE, make)
+
+    def import_sale_items(self, path):
+        def make(row, sale_pk, product):
+            product_pk, purchase_price, selling_price = product
+            return SaleItem(
+                sale_id=sale_pk,
+                product_id=product_pk,
+                quantity=int(row['quantity']),
+                unit_price=self.parse_decimal(row.get('unit_price'), selling_price),
+                unit_cost=purchase_price,
+            )
+
+        return self.import_items(path, SaleItem, ImportRef.SALE, make)
+
+    # Derived data
+
+    def finalize(self):
+        """
+        Recomputes everything derived from the imported purchases and sales
+        with a handful of set-based statements per chunk of them.
+        """
+        balance_deltas = defaultdict(Decimal)
+        sale_months = set()
+        for pks in self.imported(ImportRef.PURCHASE):
+            self.finalize_purchases(pks, balance_deltas)
+        for pks in self.imported(ImportRef.SALE):
+            self.finalize_sales(pks, balance_deltas, sale_months)
+
+        if ledger.ledger_enabled():
+            ledger.apply_balance_deltas(balance_deltas)
+        else:
+            ledger.update_or_create_balance()
+
+        if self.earliest_day is not None:
+            rebuild_rollups(self.earliest_day)
+        kpis.invalidate()
+        # bulk_create skips the Sale signals, so drop the settlements of the months sold into.
+        for month in sale_months:
+            settlements.invalidate_month(month)
+
+    def item_total(self, model, parent):
+        return Coalesce(
+            Subquery(
+                model.objects.filter(**{parent: OuterRef('pk')}).order_by()
+                .values(parent).annotate(total=Sum(F('quantity') * F('unit_price'))).values('total')
+            ),
+            Value(Decimal('0')),
+        )
+
+    def finalize_purchases(self, pks, balance_deltas):
+        """
+        Sets the totals of the purchases ``pks``, adds their items to stock and
+        inserts their transactions, adding the amounts to ``balance_deltas``.
+        """
+        purchases = Purchase.objects.filter(pk__in=pks)
+        purchases.update(total_amount=self.item_total(PurchaseItem, 'purchase'), updated_at=Now())
+        adjust_stock([
+            StockMovement(product_id=product_id, quantity=quantity, kind=StockMovement.PURCHASE, moved_at=moved_at, related_purchase_id=purchase_id)
+            for product_id, quantity, moved_at, purchase_id in
+            PurchaseItem.objects.filter(purchase__in=pks).values_list('product_id', 'quantity', 'purchase__purchase_date', 'purchase_id')
+        ])
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                transaction_type='PURCHASE',
+                description=f'Purchase from {artist_name} on {purchase_date.strftime("%Y-%m-%d")}',
+                amount=-total_amount,
+                related_purchase_id=pk,
+                transaction_date=purchase_date,
+            )
+            for pk, purchase_date, total_amount, artist_name in
+            purchases.order_by('pk').values_list('pk', 'purchase_date', 'total_amount', 'artist__name')
+        ])
+        for row in transactions:
+            balance_deltas[timezone.localdate(row.transaction_date)] += row.amount
+
+    def finalize_sales(self, pks, balance_deltas, sale_months):
+        """
+        Sets the totals of the sales ``pks``, takes their items out of stock and
+        inserts their transactions, adding the amounts to ``balance_deltas`` and
+        their months to ``sale_months``.
+        """
+        sales = Sale.objects.filter(pk__in=pks)
+        sales.update(total_amount=self.item_total(SaleItem, 'sale'), updated_at=Now())
+        adjust_stock([
+            StockMovement(product_id=product_id, quantity=-quantity, kind=StockMovement.SALE, moved_at=moved_at, related_sale_id=sale_id)
+            for product_id, quantity, moved_at, sale_id in
+            SaleItem.objects.filter(sale__in=pks).values_list('product_id', 'quantity', 'sale__sale_date', 'sale_id')
+        ])
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                transaction_type='SALE',
+                description=f'Sale on {sale_date.strftime("%Y-%m-%d")}',
+                amount=total_amount,
+                related_sale_id=pk,
+                transaction_date=sale_date,
+            )
+            for pk, sale_date, total_amount in sales.order_by('pk').values_list('pk', 'sale_date', 'total_amount')
+        ])
+        for row in transactions:
+            day = timezone.localdate(row.transaction_date)
+            balance_deltas[day] += row.amount
+            sale_months.add(day.replace(day=1))
@@ -0,0 +1,50 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from shop import kpis
+from shop.ledger import daily_closing_balances
+from shop.models import Balance
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the Balance history from the Transaction table in one ordered pass and reports any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only verify the stored balances; exit with an error on drift.")
+
+    def handle(self, *args, **options):
+        closing = dict(daily_closing_balances())
+        existing = {b.balance_date: b for b in Balance.objects.all()}
+
+        days = sorted(set(closing) | set(existing) | {timezone.localdate()})
+        running = Decimal('0')
+        to_create, to_update, drift = [], [], []
+        for day in days:
+            running = closing.get(day, running)
+            balance = existing.get(day)
+            if balance is None:
+                to_create.append(Balance(balance_date=day, amount=running))
+            elif balance.amount != running:
+                drift.append((day, balance.amount, running))
+                balance.amount = running
+                to_update.append(balance)
+
+        for day, stored, expected in drift:
+            self.stdout.write(f"{day}: stored {stored}, expected {expected}")
+
+        if options['check']:
+            if drift:
+                raise CommandError(f"{len(drift)} balance(s) drifted from the transaction history.")
+            self.stdout.write(self.style.SUCCESS(f"{len(existing)} balance(s) verified."))
+            return
+
+        with transaction.atomic():
+            Balance.objects.bulk_update(to_update, ['amount'], batch_size=500)
+            Balance.objects.bulk_create(to_create, batch_size=500)
+            kpis.invalidate_for('Balance')
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt balances: {len(to_update)} corrected, {len(to_create)} created."
+        ))
@@ -0,0 +1,22 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the daily per-product sales/purchase rollups from SaleItem and PurchaseItem."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days on or after this date (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['since']}")
+        count = rebuild_rollups(since)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup row(s)."))
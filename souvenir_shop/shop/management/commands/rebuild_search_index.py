@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.search import index_products
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the product search tokens from product names, descriptions and artist names."
+
+    def handle(self, *args, **options):
+        count = index_products()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} search token(s)."))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
+
+from shop import kpis
+from shop.models import Product, StockMovement
+from shop.stock import expected_stock
+
+
+class Command(BaseCommand):
+    help = "Compares every product's stock with its stock movements (purchased - sold + adjusted) and reports any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Set the drifted stock quantities to what the movements add up to.")
+
+    def handle(self, *args, **options):
+        drift = [row for row in expected_stock().iterator(chunk_size=2000) if row['stock_quantity'] != row['expected']]
+
+        for row in drift:
+            self.stdout.write(
+                f"{row['name']} (#{row['pk']}): stock {row['stock_quantity']}, expected {row['expected']} "
+                f"(purchased {row['purchased']}, sold {row['sold']}, adjusted {row['adjusted']})"
+            )
+
+        if not options['fix']:
+            if drift:
+                raise CommandError(f"{len(drift)} product(s) drifted from their stock movements.")
+            self.stdout.write(self.style.SUCCESS("Stock matches the stock movements."))
+            return
+
+        moved = (StockMovement.objects.filter(product=OuterRef('pk')).order_by()
+                 .values('product').annotate(total=Sum('quantity')).values('total'))
+        with transaction.atomic():
+            fixed = Product.objects.filter(pk__in=[row['pk'] for row in drift]).update(
+                stock_quantity=Coalesce(Subquery(moved), Value(0), output_field=IntegerField()),
+                updated_at=Now(),
+            )
+            kpis.invalidate_for('Product')
+        self.stdout.write(self.style.SUCCESS(f"Fixed the stock of {fixed} product(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.reorder import refresh_forecasts
+
+
+class Command(BaseCommand):
+    help = "Recomputes the sales velocity and reorder thresholds of every product (run it daily, e.g. from cron)."
+
+    def handle(self, *args, **options):
+        count = refresh_forecasts()
+        self.stdout.write(self.style.SUCCESS(f"Computed {count} reorder forecast(s)."))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from shop import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs queued background bookkeeping (balance and rollup recomputation) "
+        "until stopped. Several workers may run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty instead of polling.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty (default 1).")
+        parser.add_argument('--visibility-timeout', type=int, default=300, help="Seconds a claimed job stays hidden from other workers (default 300).")
+        parser.add_argument('--max-attempts', type=int, default=5, help="Attempts before a job is marked failed (default 5).")
+
+    def handle(self, *args, **options):
+        if options['visibility_timeout'] < 1 or options['max_attempts'] < 1:
+            raise CommandError("--visibility-timeout and --max-attempts must be at least 1.")
+        processed = 0
+        try:
+            while True:
+                close_old_connections()
+                job = jobs.claim(options['visibility_timeout'])
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                started = time.perf_counter()
+                ok = jobs.run(job, options['max_attempts'])
+                processed += 1
+                outcome = "done" if ok else f"failed (attempt {job.attempts})"
+                self.stdout.write(
+                    f"{job.task} {job.payload} x{job.coalesced + 1}: {outcome} in {time.perf_counter() - started:.2f}s"
+                )
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)."))
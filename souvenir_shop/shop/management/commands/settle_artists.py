@@ -0,0 +1,52 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop.settlements import month_bounds, month_settlement, settlement
+
+
+class Command(BaseCommand):
+    help = "Prints units sold, revenue, cost and margin per artist and product for a month or date range."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Month to settle (YYYY-MM); defaults to last month.")
+        parser.add_argument('--start', help="First day of a custom range (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last day of a custom range (YYYY-MM-DD).")
+        parser.add_argument('--artist', type=int, help="Only print this artist (pk).")
+
+    def handle(self, *args, **options):
+        try:
+            if options['start'] or options['end']:
+                if not (options['start'] and options['end']):
+                    raise CommandError("--start and --end go together.")
+                start = datetime.date.fromisoformat(options['start'])
+                end = datetime.date.fromisoformat(options['end'])
+                report = settlement(start, end)
+            else:
+                if options['month']:
+                    month = datetime.date.fromisoformat(f"{options['month']}-01")
+                else:
+                    month = timezone.localdate().replace(day=1) - datetime.timedelta(days=1)
+                start, end = month_bounds(month)
+                report = month_settlement(month)
+        except ValueError as exc:
+            raise CommandError(f"Invalid date: {exc}")
+
+        self.stdout.write(f"Settlement from {start} to {end}")
+        for artist in report['artists']:
+            if options['artist'] is not None and artist['artist_id'] != options['artist']:
+                continue
+            self.stdout.write(f"\n{artist['artist_name']}")
+            for line in artist['products']:
+                self.stdout.write(
+                    f"  {line['product_name']:<40} {line['quantity']:>8} {line['revenue']:>12} {line['cost']:>12} {line['margin']:>12}"
+                )
+            self.stdout.write(
+                f"  {'Total':<40} {artist['quantity']:>8} {artist['revenue']:>12} {artist['cost']:>12} {artist['margin']:>12}"
+            )
+        totals = report['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{len(report['artists'])} artist(s): {totals['quantity']} unit(s), revenue {totals['revenue']}, "
+            f"cost {totals['cost']}, margin {totals['margin']}"
+        ))
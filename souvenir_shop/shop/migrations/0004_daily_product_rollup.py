@@ -0,0 +1,67 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:39
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    # Same grouped queries as shop.rollups.rebuild_rollups, on the historical models.
+    DailyProductRollup = apps.get_model('shop', 'DailyProductRollup')
+    PurchaseItem = apps.get_model('shop', 'PurchaseItem')
+    SaleItem = apps.get_model('shop', 'SaleItem')
+    db_alias = schema_editor.connection.alias
+
+    rows = defaultdict(dict)
+    sales = (SaleItem.objects.using(db_alias)
+             .annotate(day=TruncDate('sale__sale_date'))
+             .values('day', 'product_id')
+             .annotate(quantity_sold=Sum('quantity'),
+                       sales_revenue=Sum(F('quantity') * F('unit_price')),
+                       sales_cost=Sum(F('quantity') * F('product__purchase_price')))
+             .order_by())
+    purchases = (PurchaseItem.objects.using(db_alias)
+                 .annotate(day=TruncDate('purchase__purchase_date'))
+                 .values('day', 'product_id')
+                 .annotate(quantity_purchased=Sum('quantity'),
+                           purchase_cost=Sum(F('quantity') * F('unit_price')))
+                 .order_by())
+    for queryset in (sales, purchases):
+        for row in queryset:
+            rows[(row.pop('day'), row.pop('product_id'))].update(row)
+    DailyProductRollup.objects.using(db_alias).bulk_create(
+        [DailyProductRollup(day=day, product_id=product_id, **values) for (day, product_id), values in rows.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Day')),
+                ('quantity_sold', models.IntegerField(default=0, verbose_name='Quantity Sold')),
+                ('sales_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Sales Revenue')),
+                ('sales_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Cost of Goods Sold')),
+                ('quantity_purchased', models.IntegerField(default=0, verbose_name='Quantity Purchased')),
+                ('purchase_cost', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Purchase Cost')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='shop.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Daily Product Rollup',
+                'verbose_name_plural': 'Daily Product Rollups',
+                'unique_together': {('day', 'product')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_daily_product_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Client Key'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:06
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# A frozen copy of shop.search.tokenize as it was when this migration was
+# written, so later changes to the app code cannot change what it does.
+_WORD = re.compile(r'\w+')
+
+
+def _tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return list(dict.fromkeys(word[:64] for word in _WORD.findall(text)))
+
+
+def _product_tokens(name, description, artist_name):
+    return set(_tokenize(name)) | set(_tokenize(description)) | set(_tokenize(artist_name))
+
+
+def index_existing_products(apps, schema_editor):
+    # Same tokens as shop.search.index_products, for the products that already exist.
+    Product = apps.get_model('shop', 'Product')
+    ProductSearchToken = apps.get_model('shop', 'ProductSearchToken')
+    db_alias = schema_editor.connection.alias
+    batch = []
+    products = Product.objects.using(db_alias).order_by('pk').values_list('pk', 'name', 'description', 'artist__name')
+    for pk, name, description, artist_name in products.iterator(chunk_size=1000):
+        batch.extend(ProductSearchToken(product_id=pk, token=token)
+                     for token in _product_tokens(name, description, artist_name))
+        if len(batch) >= 1000:
+            ProductSearchToken.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    ProductSearchToken.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, verbose_name='Token')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='shop.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Product Search Token',
+                'verbose_name_plural': 'Product Search Tokens',
+                'indexes': [models.Index(fields=['token', 'product'], name='shop_search_token_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,121 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPurchase',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('purchase_date', models.DateTimeField(verbose_name='Purchase Date')),
+                ('artist_id', models.BigIntegerField(verbose_name='Artist ID')),
+                ('artist_name', models.CharField(max_length=200, verbose_name='Artist Name')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Total Amount')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+            ],
+            options={
+                'verbose_name': 'Archived Purchase',
+                'verbose_name_plural': 'Archived Purchases',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedPurchaseItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField(verbose_name='Product ID')),
+                ('product_name', models.CharField(max_length=200, verbose_name='Product Name')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Price')),
+            ],
+            options={
+                'verbose_name': 'Archived Purchase Item',
+                'verbose_name_plural': 'Archived Purchase Items',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSale',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('sale_date', models.DateTimeField(verbose_name='Sale Date')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Total Amount')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+                ('client_key', models.CharField(blank=True, max_length=64, null=True, verbose_name='Client Key')),
+            ],
+            options={
+                'verbose_name': 'Archived Sale',
+                'verbose_name_plural': 'Archived Sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivePeriod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='Month')),
+                ('sale_count', models.PositiveIntegerField(default=0, verbose_name='Sales')),
+                ('sales_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Sales Total')),
+                ('purchase_count', models.PositiveIntegerField(default=0, verbose_name='Purchases')),
+                ('purchases_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Purchases Total')),
+                ('transaction_count', models.PositiveIntegerField(default=0, verbose_name='Transactions')),
+                ('transactions_total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Transactions Total')),
+                ('archived_at', models.DateTimeField(auto_now=True, verbose_name='Archived At')),
+            ],
+            options={
+                'verbose_name': 'Archive Period',
+                'verbose_name_plural': 'Archive Periods',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_date', models.DateTimeField(verbose_name='Transaction Date')),
+                ('transaction_type', models.CharField(choices=[('PURCHASE', 'Purchase'), ('SALE', 'Sale'), ('EXPENSE', 'Expense'), ('INCOME', 'Income'), ('ADJUSTMENT', 'Adjustment')], max_length=20, verbose_name='Transaction Type')),
+                ('description', models.CharField(max_length=200, verbose_name='Description')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Amount')),
+                ('related_purchase_id', models.BigIntegerField(blank=True, null=True, verbose_name='Related Purchase ID')),
+                ('related_sale_id', models.BigIntegerField(blank=True, null=True, verbose_name='Related Sale ID')),
+                ('notes', models.TextField(blank=True, null=True, verbose_name='Notes')),
+            ],
+            options={
+                'verbose_name': 'Archived Transaction',
+                'verbose_name_plural': 'Archived Transactions',
+                'indexes': [models.Index(fields=['transaction_date', 'id'], name='shop_archtransaction_date_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSaleItem',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField(verbose_name='Product ID')),
+                ('product_name', models.CharField(max_length=200, verbose_name='Product Name')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Unit Price')),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.archivedsale', verbose_name='Sale')),
+            ],
+            options={
+                'verbose_name': 'Archived Sale Item',
+                'verbose_name_plural': 'Archived Sale Items',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedsale',
+            index=models.Index(fields=['sale_date', 'id'], name='shop_archsale_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedpurchaseitem',
+            name='purchase',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.archivedpurchase', verbose_name='Purchase'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedpurchase',
+            index=models.Index(fields=['purchase_date', 'id'], name='shop_archpurchase_date_idx'),
+        ),
+    ]
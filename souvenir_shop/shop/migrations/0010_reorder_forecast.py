@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reorder_forecast', serialize=False, to='shop.product', verbose_name='Product')),
+                ('daily_velocity', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Units Sold per Day')),
+                ('demand_deviation', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Daily Demand Deviation')),
+                ('reorder_point', models.IntegerField(verbose_name='Reorder Point')),
+                ('target_stock', models.IntegerField(verbose_name='Target Stock')),
+                ('computed_at', models.DateTimeField(verbose_name='Computed At')),
+            ],
+            options={
+                'verbose_name': 'Reorder Forecast',
+                'verbose_name_plural': 'Reorder Forecasts',
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:23
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Min, Sum
+from django.utils import timezone
+import django.db.models.deletion
+
+# Seeds the ledger with a movement per existing (and archived) purchase and
+# sale item; seed_opening_balances then adds the adjustments.
+SEED_MOVEMENTS = [
+    """
+    INSERT INTO shop_stockmovement (product_id, quantity, kind, moved_at, related_purchase_id, related_sale_id, note, recorded_at)
+    SELECT item.product_id, item.quantity, 'PURCHASE', purchase.purchase_date, purchase.id, NULL, '', CURRENT_TIMESTAMP
+    FROM shop_purchaseitem item JOIN shop_purchase purchase ON purchase.id = item.purchase_id
+    """,
+    """
+    INSERT INTO shop_stockmovement (product_id, quantity, kind, moved_at, related_purchase_id, related_sale_id, note, recorded_at)
+    SELECT item.product_id, -item.quantity, 'SALE', sale.sale_date, NULL, sale.id, '', CURRENT_TIMESTAMP
+    FROM shop_saleitem item JOIN shop_sale sale ON sale.id = item.sale_id
+    """,
+    """
+    INSERT INTO shop_stockmovement (product_id, quantity, kind, moved_at, related_purchase_id, related_sale_id, note, recorded_at)
+    SELECT item.product_id, item.quantity, 'PURCHASE', purchase.purchase_date, purchase.id, NULL, '', CURRENT_TIMESTAMP
+    FROM shop_archivedpurchaseitem item JOIN shop_archivedpurchase purchase ON purchase.id = item.purchase_id
+    WHERE item.product_id IN (SELECT id FROM shop_product)
+    """,
+    """
+    INSERT INTO shop_stockmovement (product_id, quantity, kind, moved_at, related_purchase_id, related_sale_id, note, recorded_at)
+    SELECT item.product_id, -item.quantity, 'SALE', sale.sale_date, NULL, sale.id, '', CURRENT_TIMESTAMP
+    FROM shop_archivedsaleitem item JOIN shop_archivedsale sale ON sale.id = item.sale_id
+    WHERE item.product_id IN (SELECT id FROM shop_product)
+    """,
+]
+
+
+def seed_opening_balances(apps, schema_editor):
+    # One adjustment per product for whatever the current stock does not
+    # explain, so the movements add up to today's stock. It is the stock the
+    # product had before its first purchase or sale, so it is dated just
+    # before that movement; stock_as_of() of a past day then includes it.
+    Product = apps.get_model('shop', 'Product')
+    StockMovement = apps.get_model('shop', 'StockMovement')
+    db_alias = schema_editor.connection.alias
+    moved = {
+        product_id: (total, first)
+        for product_id, total, first in StockMovement.objects.using(db_alias).values('product_id')
+        .annotate(total=Sum('quantity'), first=Min('moved_at')).order_by().values_list('product_id', 'total', 'first')
+    }
+    now = timezone.now()
+    batch = []
+    for pk, stock in Product.objects.using(db_alias).order_by('pk').values_list('pk', 'stock_quantity').iterator(chunk_size=1000):
+        total, first = moved.get(pk, (0, None))
+        if stock == total:
+            continue
+        batch.append(StockMovement(
+            product_id=pk, quantity=stock - total, kind='ADJUSTMENT', note='Opening balance',
+            moved_at=first - datetime.timedelta(seconds=1) if first else now,
+        ))
+        if len(batch) >= 1000:
+            StockMovement.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    StockMovement.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_reorder_forecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('kind', models.CharField(choices=[('PURCHASE', 'Purchase'), ('SALE', 'Sale'), ('ADJUSTMENT', 'Adjustment')], max_length=20, verbose_name='Kind')),
+                ('moved_at', models.DateTimeField(verbose_name='Moved At')),
+                ('related_purchase_id', models.BigIntegerField(blank=True, null=True, verbose_name='Related Purchase ID')),
+                ('related_sale_id', models.BigIntegerField(blank=True, null=True, verbose_name='Related Sale ID')),
+                ('note', models.CharField(blank=True, max_length=200, verbose_name='Note')),
+                ('recorded_at', models.DateTimeField(auto_now_add=True, verbose_name='Recorded At')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='shop.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'indexes': [models.Index(fields=['product', 'moved_at'], name='shop_stockmove_product_idx'), models.Index(fields=['moved_at'], name='shop_stockmove_date_idx')],
+            },
+        ),
+        migrations.RunSQL(SEED_MOVEMENTS, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunPython(seed_opening_balances, migrations.RunPython.noop),
+    ]
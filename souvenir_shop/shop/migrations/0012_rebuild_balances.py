@@ -0,0 +1,54 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:37
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+CENT = Decimal('0.01')
+
+
+def rebuild_balances(apps, schema_editor):
+    # Snapshots written in the old aggregate mode hold the total at the time
+    # they were saved, while the ledger mode (now the default) treats each one
+    # as its day's closing balance and adds deltas on top. Same pass as
+    # ``manage.py rebuild_balances``, on the historical models.
+    Balance = apps.get_model('shop', 'Balance')
+    db_alias = schema_editor.connection.alias
+
+    totals = defaultdict(Decimal)
+    for model_name in ('Transaction', 'ArchivedTransaction'):
+        model = apps.get_model('shop', model_name)
+        for day, total in (model.objects.using(db_alias)
+                           .annotate(day=TruncDate('transaction_date'))
+                           .values('day').annotate(total=Sum('amount'))
+                           .order_by().values_list('day', 'total')):
+            totals[day] += total.quantize(CENT)  # SQLite sums decimals as floats
+
+    existing = {balance.balance_date: balance for balance in Balance.objects.using(db_alias)}
+    running = Decimal('0')
+    to_create, to_update = [], []
+    for day in sorted(set(totals) | set(existing) | {timezone.localdate()}):
+        running += totals.get(day, 0)
+        balance = existing.get(day)
+        if balance is None:
+            to_create.append(Balance(balance_date=day, amount=running))
+        elif balance.amount != running:
+            balance.amount = running
+            to_update.append(balance)
+    Balance.objects.using(db_alias).bulk_update(to_update, ['amount'], batch_size=1000)
+    Balance.objects.using(db_alias).bulk_create(to_create, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_stock_movement'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:12
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_purchase_prices(apps, schema_editor):
+    # The cost at the time of sale was never stored; the current purchase
+    # price is what the rollups were built from so far.
+    Product = apps.get_model('shop', 'Product')
+    SaleItem = apps.get_model('shop', 'SaleItem')
+    db_alias = schema_editor.connection.alias
+    SaleItem.objects.using(db_alias).update(
+        unit_cost=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('purchase_price')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_rebuild_balances'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Unit Cost'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_purchase_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 03:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_saleitem_unit_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRef',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.UUIDField(verbose_name='Import Run')),
+                ('kind', models.CharField(choices=[('purchase', 'Purchase'), ('sale', 'Sale')], max_length=10, verbose_name='Kind')),
+                ('ref', models.CharField(max_length=255, verbose_name='Ref')),
+                ('object_id', models.BigIntegerField(verbose_name='Object ID')),
+            ],
+            options={
+                'verbose_name': 'Import Ref',
+                'verbose_name_plural': 'Import Refs',
+                'indexes': [models.Index(fields=['run', 'kind', 'object_id'], name='shop_importref_object_idx')],
+                'unique_together': {('run', 'kind', 'ref')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+import datetime
+
+from django.db import migrations
+from django.db.models import Min
+
+
+def redate_opening_balances(apps, schema_editor):
+    # Databases that ran an earlier 0011 have their seeded opening balances
+    # dated when the migration ran; move them to just before each product's
+    # first other movement, as 0011 now does.
+    StockMovement = apps.get_model('shop', 'StockMovement')
+    db_alias = schema_editor.connection.alias
+    movements = StockMovement.objects.using(db_alias)
+    seeded = movements.filter(kind='ADJUSTMENT', note='Opening balance')
+    first_moves = dict(
+        movements.filter(product_id__in=seeded.values('product_id')).exclude(kind='ADJUSTMENT', note='Opening balance')
+        .values('product_id').annotate(first=Min('moved_at')).order_by().values_list('product_id', 'first')
+    )
+    for pk, product_id, moved_at in seeded.values_list('pk', 'product_id', 'moved_at').iterator(chunk_size=1000):
+        first = first_moves.get(product_id)
+        if first is not None and moved_at >= first:
+            movements.filter(pk=pk).update(moved_at=first - datetime.timedelta(seconds=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_import_ref'),
+    ]
+
+    operations = [
+        migrations.RunPython(redate_opening_balances, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,7 @@ class Artist(models.Model):
     name = models.CharField(max_length=200, verbose_name="Artist Name")
     contact_information = models.TextField(verbose_name="Contact Info")
     notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
     def __str__(self):
         return self.name
@@ -26,6 +27,7 @@ class Product(models.Model):
     selling_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Selling Price")
     stock_quantity = models.IntegerField(default=0, verbose_name="Stock Quantity")
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE, related_name="products", verbose_name="Artist")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")  # Also set by update() calls such as adjust_stock
 
     def __str__(self):
         return self.name
@@ -42,6 +44,7 @@ class Purchase(models.Model):
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE, related_name="purchases", verbose_name="Artist")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total Amount")
     notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
     def __str__(self):
         return f"Purchase from {self.artist} on {self.purchase_date.strftime('%Y-%m-%d')}"
@@ -49,6 +52,9 @@ class Purchase(models.Model):
     class Meta:
         verbose_name = "Purchase"
         verbose_name_plural = "Purchases"
+        indexes = [
+            models.Index(fields=['purchase_date', 'id'], name='shop_purchase_date_idx'),  # Keyset pagination order
+        ]
 
 class PurchaseItem(models.Model):
     """
@@ -58,6 +64,7 @@ class PurchaseItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="purchase_items", verbose_name="Product")
     quantity = models.IntegerField(verbose_name="Quantity")
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Unit Price")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Purchase {self.purchase.id}"
@@ -74,6 +81,8 @@ class Sale(models.Model):
     sale_date = models.DateTimeField(default=timezone.now, verbose_name="Sale Date")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total Amount")
     notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+    client_key = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Client Key")  # Idempotency key sent by POS terminals
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
     def __str__(self):
         return f"Sale on {self.sale_date.strftime('%Y-%m-%d')}"
@@ -81,6 +90,9 @@ class Sale(models.Model):
     class Meta:
         verbose_name = "Sale"
         verbose_name_plural = "Sales"
+        indexes = [
+            models.Index(fields=['sale_date', 'id'], name='shop_sale_date_idx'),  # Keyset pagination order
+        ]
 
 class SaleItem(models.Model):
     """
@@ -90,6 +102,10 @@ class SaleItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="sale_items", verbose_name="Product")
     quantity = models.IntegerField(verbose_name="Quantity")
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Unit Price")
+    # The product's purchase price when the line was sold, so reversing the
+    # line later takes back exactly the cost that was added to the rollups.
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Unit Cost")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated At")
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Sale {self.sale.id}"
@@ -124,6 +140,9 @@ class Transaction(models.Model):
     class Meta:
         verbose_name = "Transaction"
         verbose_name_plural = "Transactions"
+        indexes = [
+            models.Index(fields=['transaction_date', 'id'], name='shop_transaction_date_idx'),  # Keyset pagination order
+        ]
 
 class Balance(models.Model):
     """
@@ -139,3 +158,284 @@ class Balance(models.Model):
     class Meta:
         verbose_name = "Balance"
         verbose_name_plural = "Balances"
+
+class ProductSearchToken(models.Model):
+    """
+    One lower-cased word of a product's name, description or artist name.
+    Kept in sync by ``shop.search``; rebuilt with ``manage.py rebuild_search_index``.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="search_tokens", verbose_name="Product")
+    token = models.CharField(max_length=64, verbose_name="Token")
+
+    def __str__(self):
+        return self.token
+
+    class Meta:
+        verbose_name = "Product Search Token"
+        verbose_name_plural = "Product Search Tokens"
+        indexes = [
+            models.Index(fields=['token', 'product'], name='shop_search_token_idx'),  # Prefix range scans
+        ]
+
+class DailyProductRollup(models.Model):
+    """
+    Per-day, per-product totals of sales and purchases, kept up to date by the
+    sale and purchase views so the dashboard does not scan the raw tables.
+    """
+    day = models.DateField(verbose_name="Day")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_rollups", verbose_name="Product")
+    quantity_sold = models.IntegerField(default=0, verbose_name="Quantity Sold")
+    sales_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Sales Revenue")
+    sales_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Cost of Goods Sold")
+    quantity_purchased = models.IntegerField(default=0, verbose_name="Quantity Purchased")
+    purchase_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Purchase Cost")
+
+    def __str__(self):
+        return f"{self.product} on {self.day.strftime('%Y-%m-%d')}"
+
+    class Meta:
+        verbose_name = "Daily Product Rollup"
+        verbose_name_plural = "Daily Product Rollups"
+        unique_together = ('day', 'product')
+
+class ReorderForecast(models.Model):
+    """
+    Sales velocity and reorder thresholds of a product, precomputed from the
+    daily rollups by ``manage.py refresh_reorder_forecasts``. Stock is compared
+    with the thresholds when read, so the alerts follow every sale at once.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="reorder_forecast", verbose_name="Product")
+    daily_velocity = models.DecimalField(max_digits=10, decimal_places=3, verbose_name="Units Sold per Day")
+    demand_deviation = models.DecimalField(max_digits=10, decimal_places=3, verbose_name="Daily Demand Deviation")
+    reorder_point = models.IntegerField(verbose_name="Reorder Point")  # Stock that lasts the lead time, plus safety stock
+    target_stock = models.IntegerField(verbose_name="Target Stock")  # Stock to order up to
+    computed_at = models.DateTimeField(verbose_name="Computed At")
+
+    def __str__(self):
+        return f"Reorder forecast for {self.product}"
+
+    class Meta:
+        verbose_name = "Reorder Forecast"
+        verbose_name_plural = "Reorder Forecasts"
+
+class StockMovement(models.Model):
+    """
+    One append-only change to a product's stock. Every stock update goes
+    through ``stock.adjust_stock``, which writes these rows, so the stock of
+    any product at any date is the sum of its movements up to then.
+    """
+    PURCHASE = 'PURCHASE'
+    SALE = 'SALE'
+    ADJUSTMENT = 'ADJUSTMENT'
+    KIND_CHOICES = [
+        (PURCHASE, 'Purchase'),
+        (SALE, 'Sale'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_movements", verbose_name="Product")
+    quantity = models.IntegerField(verbose_name="Quantity")  # Signed: purchases add, sales remove
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Kind")
+    moved_at = models.DateTimeField(verbose_name="Moved At")  # Date of the sale or purchase; when recorded for adjustments
+    related_purchase_id = models.BigIntegerField(null=True, blank=True, verbose_name="Related Purchase ID")  # Kept after archiving
+    related_sale_id = models.BigIntegerField(null=True, blank=True, verbose_name="Related Sale ID")
+    note = models.CharField(max_length=200, blank=True, verbose_name="Note")
+    recorded_at = models.DateTimeField(auto_now_add=True, verbose_name="Recorded At")
+
+    def __str__(self):
+        return f"{self.quantity:+d} {self.product} ({self.kind})"
+
+    class Meta:
+        verbose_name = "Stock Movement"
+        verbose_name_plural = "Stock Movements"
+        indexes = [
+            models.Index(fields=['product', 'moved_at'], name='shop_stockmove_product_idx'),
+            models.Index(fields=['moved_at'], name='shop_stockmove_date_idx'),
+        ]
+
+class Job(models.Model):
+    """
+    A unit of background bookkeeping for ``manage.py run_shop_worker``.
+
+    Pending jobs with the same ``coalesce_key`` are merged into one, so a burst
+    of writes leads to a single recompute. A worker claims a job by setting
+    ``locked_until``; if it dies the job becomes visible to other workers again
+    once that time has passed.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name="Task")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="Payload")
+    coalesce_key = models.CharField(max_length=200, null=True, blank=True, verbose_name="Coalesce Key")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Status")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    coalesced = models.PositiveIntegerField(default=0, verbose_name="Coalesced Requests")
+    run_after = models.DateTimeField(default=timezone.now, verbose_name="Run After")
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name="Locked Until")
+    last_error = models.TextField(blank=True, verbose_name="Last Error")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created At")
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='shop_job_queue_idx'),
+        ]
+        constraints = [
+            # At most one pending job per key; running and failed jobs don't count.
+            models.UniqueConstraint(
+                fields=['coalesce_key'],
+                condition=models.Q(status='pending'),
+                name='shop_job_pending_coalesce_key',
+            ),
+        ]
+
+class ImportRef(models.Model):
+    """
+    The ``ref`` a CSV file gave to an imported purchase or sale, so that
+    ``manage.py import_shop_data`` can resolve item rows a chunk at a time
+    instead of holding every ref in memory. Rows only exist inside the
+    import's transaction; the command deletes them before it commits.
+    """
+    PURCHASE = 'purchase'
+    SALE = 'sale'
+    KIND_CHOICES = [
+        (PURCHASE, 'Purchase'),
+        (SALE, 'Sale'),
+    ]
+
+    run = models.UUIDField(verbose_name="Import Run")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Kind")
+    ref = models.CharField(max_length=255, verbose_name="Ref")
+    object_id = models.BigIntegerField(verbose_name="Object ID")
+
+    def __str__(self):
+        return f"{self.kind} {self.ref}"
+
+    class Meta:
+        verbose_name = "Import Ref"
+        verbose_name_plural = "Import Refs"
+        unique_together = ('run', 'kind', 'ref')
+        indexes = [
+            models.Index(fields=['run', 'kind', 'object_id'], name='shop_importref_object_idx'),  # Finalize walks the imported rows in pk order
+        ]
+
+class ArchivePeriod(models.Model):
+    """
+    Summary of one month of sales, purchases and transactions that
+    ``manage.py archive_shop_data`` moved out of the hot tables.
+    """
+    month = models.DateField(unique=True, verbose_name="Month")  # First day of the month
+    sale_count = models.PositiveIntegerField(default=0, verbose_name="Sales")
+    sales_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Sales Total")
+    purchase_count = models.PositiveIntegerField(default=0, verbose_name="Purchases")
+    purchases_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Purchases Total")
+    transaction_count = models.PositiveIntegerField(default=0, verbose_name="Transactions")
+    transactions_total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Transactions Total")
+    archived_at = models.DateTimeField(auto_now=True, verbose_name="Archived At")
+
+    def __str__(self):
+        return self.month.strftime('%Y-%m')
+
+    class Meta:
+        verbose_name = "Archive Period"
+        verbose_name_plural = "Archive Periods"
+
+class ArchivedSale(models.Model):
+    """
+    A sale moved to the archive. It keeps its original id; names of related
+    objects are copied so the record stays readable if they are deleted.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    sale_date = models.DateTimeField(verbose_name="Sale Date")
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total Amount")
+    notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+    client_key = models.CharField(max_length=64, null=True, blank=True, verbose_name="Client Key")
+
+    def __str__(self):
+        return f"Sale on {self.sale_date.strftime('%Y-%m-%d')}"
+
+    class Meta:
+        verbose_name = "Archived Sale"
+        verbose_name_plural = "Archived Sales"
+        indexes = [
+            models.Index(fields=['sale_date', 'id'], name='shop_archsale_date_idx'),
+        ]
+
+class ArchivedSaleItem(models.Model):
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    sale = models.ForeignKey(ArchivedSale, on_delete=models.CASCADE, related_name="items", verbose_name="Sale")
+    product_id = models.BigIntegerField(verbose_name="Product ID")
+    product_name = models.CharField(max_length=200, verbose_name="Product Name")
+    quantity = models.IntegerField(verbose_name="Quantity")
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Unit Price")
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} in Sale {self.sale_id}"
+
+    class Meta:
+        verbose_name = "Archived Sale Item"
+        verbose_name_plural = "Archived Sale Items"
+
+class ArchivedPurchase(models.Model):
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    purchase_date = models.DateTimeField(verbose_name="Purchase Date")
+    artist_id = models.BigIntegerField(verbose_name="Artist ID")
+    artist_name = models.CharField(max_length=200, verbose_name="Artist Name")
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Total Amount")
+    notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+
+    def __str__(self):
+        return f"Purchase from {self.artist_name} on {self.purchase_date.strftime('%Y-%m-%d')}"
+
+    class Meta:
+        verbose_name = "Archived Purchase"
+        verbose_name_plural = "Archived Purchases"
+        indexes = [
+            models.Index(fields=['purchase_date', 'id'], name='shop_archpurchase_date_idx'),
+        ]
+
+class ArchivedPurchaseItem(models.Model):
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    purchase = models.ForeignKey(ArchivedPurchase, on_delete=models.CASCADE, related_name="items", verbose_name="Purchase")
+    product_id = models.BigIntegerField(verbose_name="Product ID")
+    product_name = models.CharField(max_length=200, verbose_name="Product Name")
+    quantity = models.IntegerField(verbose_name="Quantity")
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Unit Price")
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} in Purchase {self.purchase_id}"
+
+    class Meta:
+        verbose_name = "Archived Purchase Item"
+        verbose_name_plural = "Archived Purchase Items"
+
+class ArchivedTransaction(models.Model):
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID")
+    transaction_date = models.DateTimeField(verbose_name="Transaction Date")
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES, verbose_name="Transaction Type")
+    description = models.CharField(max_length=200, verbose_name="Description")
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Amount")
+    related_purchase_id = models.BigIntegerField(null=True, blank=True, verbose_name="Related Purchase ID")
+    related_sale_id = models.BigIntegerField(null=True, blank=True, verbose_name="Related Sale ID")
+    notes = models.TextField(blank=True, null=True, verbose_name="Notes")
+
+    def __str__(self):
+        return f"{self.transaction_type} on {self.transaction_date.strftime('%Y-%m-%d')}: {self.description}"
+
+    class Meta:
+        verbose_name = "Archived Transaction"
+        verbose_name_plural = "Archived Transactions"
+        indexes = [
+            models.Index(fields=['transaction_date', 'id'], name='shop_archtransaction_date_idx'),
+        ]
@@ -0,0 +1,114 @@
+import base64
+import json
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+
+
+class KeysetPage:
+    """
+    One page of a keyset (cursor) paginated queryset.
+    """
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """
+    Turns a cursor string back into the python values of the ordering fields.
+    Returns None for anything that does not decode cleanly.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        return None
+
+
+def _cursor_values(obj, ordering):
+    values = []
+    for name, _ in ordering:
+        value = getattr(obj, name)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return values
+
+
+def _seek_filter(ordering, values, forward):
+    """
+    Builds the row-value comparison (a, b) > (x, y) as nested OR/AND terms,
+    which every database backend can answer from a composite index.
+    """
+    query = Q()
+    for i, (name, descending) in enumerate(ordering):
+        lookup = 'lt' if descending == forward else 'gt'
+        term = Q(**{f'{name}__{lookup}': values[i]})
+        for j in range(i):
+            term &= Q(**{ordering[j][0]: values[j]})
+        query |= term
+    return query
+
+
+def keyset_paginate(request, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Paginates ``queryset`` using the ``after``/``before`` cursors in the query string.
+
+    ``ordering`` is a list of field names in ``order_by`` syntax and must end with a
+    unique column (normally ``pk``) so that every row has a stable position.
+    Each page costs a single indexed query regardless of how deep it is.
+    """
+    ordering = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+    model_fields = [queryset.model._meta.pk if name == 'pk' else queryset.model._meta.get_field(name) for name, _ in ordering]
+
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    forward = not before
+    cursor = decode_cursor(before or after, model_fields) if (before or after) else None
+
+    order_by = [('-' if descending == forward else '') + name for name, descending in ordering]
+    rows = queryset.order_by(*order_by)
+    if cursor is not None:
+        rows = rows.filter(_seek_filter(ordering, cursor, forward))
+    rows = list(rows[:per_page + 1])
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if forward:
+            if has_more:
+                next_cursor = encode_cursor(_cursor_values(rows[-1], ordering))
+            if cursor is not None:
+                prev_cursor = encode_cursor(_cursor_values(rows[0], ordering))
+        else:
+            next_cursor = encode_cursor(_cursor_values(rows[-1], ordering))
+            if has_more:
+                prev_cursor = encode_cursor(_cursor_values(rows[0], ordering))
+    return KeysetPage(rows, next_cursor, prev_cursor)
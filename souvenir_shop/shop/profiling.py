@@ -0,0 +1,194 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+CACHE_PREFIX = 'shop:sqlprofile'
+
+logger = logging.getLogger('shop.sql')
+
+# The recorder of the request being profiled. Context variables follow the request
+# into sync_to_async/async_to_sync threads, so queries the async views run in
+# worker threads are recorded too.
+_active_recorder = ContextVar('shop_sql_recorder', default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+
+
+def query_shape(sql):
+    """
+    Normalizes a statement so queries that only differ in their parameters
+    (``WHERE id = 1`` vs ``WHERE id = 2``, ``IN (?, ?)`` vs ``IN (?, ?, ?)``) compare equal.
+    """
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = shape.replace('%s', '?')
+    return _PLACEHOLDER_LIST.sub('(...)', shape)
+
+
+class QueryRecorder:
+    """
+    A ``connection.execute_wrapper`` that records every statement and its duration.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, (time.perf_counter() - started) * 1000))
+
+    def report(self, slowest=3, repeat_threshold=3):
+        shapes = Counter(query_shape(sql) for sql, _ in self.queries)
+        return {
+            'queries': len(self.queries),
+            'sql_ms': round(sum(duration for _, duration in self.queries), 2),
+            'slowest': [
+                {'sql': sql, 'ms': round(duration, 2)}
+                for sql, duration in sorted(self.queries, key=lambda query: query[1], reverse=True)[:slowest]
+            ],
+            'repeated': [
+                {'shape': shape, 'count': count}
+                for shape, count in shapes.most_common() if count >= repeat_threshold
+            ],
+        }
+
+
+def _record_if_active(execute, sql, params, many, context):
+    recorder = _active_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_hook(connection):
+    """
+    Adds the recording hook to a connection (each thread has its own). It goes
+    first in the list, since ``execute_wrapper()`` pops the last wrapper on exit.
+    """
+    if _record_if_active not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_if_active)
+
+
+@contextmanager
+def recording(recorder):
+    """
+    Sends every query run in this context, on any connection or worker thread, to ``recorder``.
+    """
+    for alias in connections:
+        install_hook(connections[alias])
+    token = _active_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active_recorder.reset(token)
+
+
+def record_view(view, report):
+    """
+    Adds one request's report to the per-view totals kept in the cache, so every
+    worker process contributes to the same summary. Updates are read-modify-write
+    and may occasionally lose a request under heavy concurrency, which is fine for
+    finding hot spots.
+    """
+    key = f'{CACHE_PREFIX}:view:{view}'
+    stats = cache.get(key) or {
+        'view': view, 'requests': 0, 'queries': 0, 'sql_ms': 0.0,
+        'max_queries': 0, 'n_plus_one': 0, 'shapes': {},
+    }
+    stats['requests'] += 1
+    stats['queries'] += report['queries']
+    stats['sql_ms'] = round(stats['sql_ms'] + report['sql_ms'], 2)
+    stats['max_queries'] = max(stats['max_queries'], report['queries'])
+    if report['repeated']:
+        stats['n_plus_one'] += 1
+    for repeated in report['repeated']:
+        stats['shapes'][repeated['shape']] = max(stats['shapes'].get(repeated['shape'], 0), repeated['count'])
+    stats['shapes'] = dict(Counter(stats['shapes']).most_common(5))
+    cache.set(key, stats, timeout=None)
+
+    views = cache.get(f'{CACHE_PREFIX}:views') or []
+    if view not in views:
+        cache.set(f'{CACHE_PREFIX}:views', [*views, view], timeout=None)
+
+
+def view_summary():
+    """
+    Per-view totals, the views spending the most time in SQL first.
+    """
+    views = cache.get(f'{CACHE_PREFIX}:views') or []
+    summary = [stats for stats in cache.get_many([f'{CACHE_PREFIX}:view:{view}' for view in views]).values()]
+    for stats in summary:
+        stats['avg_queries'] = round(stats['queries'] / stats['requests'], 1)
+        stats['avg_sql_ms'] = round(stats['sql_ms'] / stats['requests'], 2)
+    return sorted(summary, key=lambda stats: stats['sql_ms'], reverse=True)
+
+
+def reset_summary():
+    views = cache.get(f'{CACHE_PREFIX}:views') or []
+    cache.delete_many([f'{CACHE_PREFIX}:views', *[f'{CACHE_PREFIX}:view:{view}' for view in views]])
+
+
+def server_timing(report, total_ms):
+    metrics = [
+        f'db;dur={report["sql_ms"]:.2f};desc="{report["queries"]} queries"',
+        f'app;dur={max(total_ms - report["sql_ms"], 0):.2f}',
+    ]
+    if report['repeated']:
+        metrics.append(f'nplusone;desc="{len(report["repeated"])} repeated query shapes"')
+    return ', '.join(metrics)
+
+
+class SQLProfilingMiddleware:
+    """
+    Opt-in (``SHOP_SQL_PROFILING = True``) per-request SQL profiling.
+
+    Records every query of the request on all database connections (including
+    the worker threads of the async views) and adds the
+    query count and SQL time to a ``Server-Timing`` header. Each request is logged
+    as one JSON line to the ``shop.sql`` logger with its slowest statements and any
+    query shape repeated ``SHOP_SQL_PROFILING_REPEAT_THRESHOLD`` times or more (an
+    N+1 signature), and is added to the per-view summary page.
+
+    Queries run while a streaming response is being consumed happen after the
+    middleware returns and are not counted.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_SQL_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slowest = getattr(settings, 'SHOP_SQL_PROFILING_SLOWEST', 3)
+        self.repeat_threshold = getattr(settings, 'SHOP_SQL_PROFILING_REPEAT_THRESHOLD', 3)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with recording(QueryRecorder()) as recorder:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        view = match.view_name if match else '(unresolved)'
+        report = recorder.report(self.slowest, self.repeat_threshold)
+        response['Server-Timing'] = server_timing(report, total_ms)
+        logger.info(json.dumps({
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            **report,
+        }))
+        record_view(view, report)
+        return response
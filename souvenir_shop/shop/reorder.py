@@ -0,0 +1,108 @@
+import math
+from decimal import Decimal
+
+import numpy
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from . import kpis
+from .models import DailyProductRollup, Product, ReorderForecast
+
+VELOCITY = Decimal('0.001')
+
+
+def _setting(name, default):
+    return getattr(settings, f'SHOP_REORDER_{name}', default)
+
+
+def _demand(history_days):
+    """
+    Product pks and the ``(product_id, day index, quantity)`` sales of the last
+    ``history_days`` days, read from the rollups in one query.
+    """
+    today = timezone.localdate()
+    first_day = today - timezone.timedelta(days=history_days - 1)
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    sales = [
+        (product_id, (day - first_day).days, quantity)
+        for product_id, day, quantity in
+        DailyProductRollup.objects.filter(day__gte=first_day, day__lte=today)
+        .exclude(quantity_sold=0).values_list('product_id', 'day', 'quantity_sold')
+    ]
+    return product_ids, sales
+
+
+def _velocity(product_ids, sales, history_days):
+    # One products x days matrix for the whole catalog; the statistics are
+    # computed per row in a single vectorized pass.
+    ids = numpy.array(product_ids, dtype=numpy.int64)
+    demand = numpy.zeros((len(ids), history_days))
+    if sales:
+        product, day, quantity = (numpy.array(column) for column in zip(*sales))
+        rows = numpy.searchsorted(ids, product)
+        known = (rows < len(ids)) & (ids[numpy.minimum(rows, len(ids) - 1)] == product)
+        numpy.add.at(demand, (rows[known], day[known]), quantity[known])
+    return demand.mean(axis=1).tolist(), demand.std(axis=1).tolist()
+
+
+def compute_forecasts(history_days=None, lead_time_days=None, cover_days=None, safety_factor=None):
+    """
+    Unsaved ReorderForecast objects for every product: the mean and deviation
+    of daily units sold over the last ``history_days`` days, the stock needed
+    to last the supplier lead time (plus safety stock) as the reorder point,
+    and that point plus ``cover_days`` of sales as the stock to order up to.
+    """
+    history_days = history_days or _setting('HISTORY_DAYS', 56)
+    lead_time_days = _setting('LEAD_TIME_DAYS', 14) if lead_time_days is None else lead_time_days
+    cover_days = _setting('COVER_DAYS', 30) if cover_days is None else cover_days
+    safety_factor = _setting('SAFETY_FACTOR', 1.65) if safety_factor is None else safety_factor
+
+    product_ids, sales = _demand(history_days)
+    if not product_ids:
+        return []
+    velocities, deviations = _velocity(product_ids, sales, history_days)
+
+    now = timezone.now()
+    forecasts = []
+    for product_id, velocity, deviation in zip(product_ids, velocities, deviations):
+        safety_stock = safety_factor * deviation * math.sqrt(lead_time_days)
+        forecasts.append(ReorderForecast(
+            product_id=product_id,
+            daily_velocity=Decimal(velocity).quantize(VELOCITY),
+            demand_deviation=Decimal(deviation).quantize(VELOCITY),
+            reorder_point=math.ceil(velocity * lead_time_days + safety_stock),
+            target_stock=math.ceil(velocity * (lead_time_days + cover_days) + safety_stock),
+            computed_at=now,
+        ))
+    return forecasts
+
+
+def refresh_forecasts(batch_size=1000):
+    """
+    Replaces the stored forecasts with freshly computed ones. Returns their number.
+    """
+    forecasts = compute_forecasts()
+    with transaction.atomic():
+        ReorderForecast.objects.all().delete()
+        ReorderForecast.objects.bulk_create(forecasts, batch_size=batch_size)
+        kpis.invalidate_for('ReorderForecast')
+    return len(forecasts)
+
+
+def due_for_reorder():
+    """
+    Forecasts of products that sell and whose current stock is at or below
+    their reorder point, with ``days_of_cover`` (stock / daily velocity) and
+    ``suggested_quantity`` (units to reach the target stock), most urgent first.
+    """
+    return (ReorderForecast.objects
+            .filter(daily_velocity__gt=0, product__stock_quantity__lte=F('reorder_point'))
+            .annotate(
+                stock_quantity=F('product__stock_quantity'),
+                suggested_quantity=F('target_stock') - F('product__stock_quantity'),
+                days_of_cover=Cast('product__stock_quantity', FloatField()) / Cast('daily_velocity', FloatField()),
+            )
+            .order_by('days_of_cover', 'product_id'))
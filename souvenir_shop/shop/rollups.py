@@ -0,0 +1,129 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+from . import jobs, kpis
+from .ledger import archive_cutoff
+from .models import DailyProductRollup, PurchaseItem, SaleItem
+
+ROLLUP_FIELDS = ('quantity_sold', 'sales_revenue', 'sales_cost', 'quantity_purchased', 'purchase_cost')
+
+
+def _empty_row():
+    return {name: 0 for name in ROLLUP_FIELDS}
+
+
+def sale_deltas(day, items, costs, sign=1):
+    """
+    Rollup deltas for the ``(product_id, quantity, unit_price)`` lines of a sale.
+    ``costs`` maps each product to the ``unit_cost`` stored on its line, so a
+    reversed line takes back the cost it added even if the purchase price has
+    changed since.
+    """
+    deltas = defaultdict(_empty_row)
+    for product_id, quantity, unit_price in items:
+        row = deltas[(day, product_id)]
+        row['quantity_sold'] += sign * quantity
+        row['sales_revenue'] += sign * quantity * Decimal(unit_price)
+        row['sales_cost'] += sign * quantity * Decimal(costs[product_id])
+    return deltas
+
+
+def purchase_deltas(day, items, sign=1):
+    """
+    Rollup deltas for the ``(product_id, quantity, unit_price)`` lines of a purchase.
+    """
+    deltas = defaultdict(_empty_row)
+    for product_id, quantity, unit_price in items:
+        row = deltas[(day, product_id)]
+        row['quantity_purchased'] += sign * quantity
+        row['purchase_cost'] += sign * quantity * Decimal(unit_price)
+    return deltas
+
+
+def apply_rollup_deltas(*delta_sets):
+    """
+    Adds the given deltas to the rollup table: one query to find existing rows,
+    one bulk insert for new ones and one UPDATE for all of them. In queue mode
+    a ``rebuild_rollups`` job from the earliest day is queued instead.
+    """
+    merged = defaultdict(_empty_row)
+    for deltas in delta_sets:
+        for key, row in deltas.items():
+            for name, value in row.items():
+                merged[key][name] += value
+    merged = {key: row for key, row in merged.items() if any(row.values())}
+    if not merged:
+        return
+    if jobs.queue_enabled():
+        jobs.enqueue_since('rebuild_rollups', min(day for day, _ in merged))
+        return
+
+    match = Q()
+    for day, product_id in merged:
+        match |= Q(day=day, product_id=product_id)
+
+    with transaction.atomic():
+        existing = set(DailyProductRollup.objects.filter(match).values_list('day', 'product_id'))
+        DailyProductRollup.objects.bulk_create(
+            [DailyProductRollup(day=day, product_id=product_id) for day, product_id in merged if (day, product_id) not in existing],
+            ignore_conflicts=True,
+        )
+        updates = {}
+        for name in ROLLUP_FIELDS:
+            output_field = IntegerField() if name.startswith('quantity') else DecimalField(max_digits=12, decimal_places=2)
+            whens = [When(day=day, product_id=product_id, then=Value(row[name], output_field=output_field))
+                     for (day, product_id), row in merged.items() if row[name]]
+            if whens:
+                updates[name] = F(name) + Case(*whens, default=Value(0, output_field=output_field), output_field=output_field)
+        DailyProductRollup.objects.filter(match).update(**updates)
+        kpis.invalidate_for('DailyProductRollup')
+
+
+def rebuild_rollups(since=None):
+    """
+    Recomputes the rollup table (from ``since`` onwards, or entirely) with one
+    grouped query over SaleItem and one over PurchaseItem. Archived days are
+    never recomputed: their items are gone from those tables, so their rollups
+    are kept as they were.
+    """
+    cutoff = archive_cutoff()
+    if cutoff is not None and (since is None or since < cutoff):
+        since = cutoff
+    sales = SaleItem.objects.annotate(day=TruncDate('sale__sale_date'))
+    purchases = PurchaseItem.objects.annotate(day=TruncDate('purchase__purchase_date'))
+    rollups = DailyProductRollup.objects.all()
+    if since is not None:
+        sales = sales.filter(day__gte=since)
+        purchases = purchases.filter(day__gte=since)
+        rollups = rollups.filter(day__gte=since)
+
+    rows = defaultdict(_empty_row)
+    for row in sales.values('day', 'product_id').annotate(
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum(F('quantity') * F('unit_price')),
+        total_cost=Sum(F('quantity') * F('unit_cost')),
+    ).order_by():
+        rollup = rows[(row['day'], row['product_id'])]
+        rollup['quantity_sold'] = row['total_quantity']
+        rollup['sales_revenue'] = row['total_revenue']
+        rollup['sales_cost'] = row['total_cost']
+    for row in purchases.values('day', 'product_id').annotate(
+        total_quantity=Sum('quantity'),
+        total_cost=Sum(F('quantity') * F('unit_price')),
+    ).order_by():
+        rollup = rows[(row['day'], row['product_id'])]
+        rollup['quantity_purchased'] = row['total_quantity']
+        rollup['purchase_cost'] = row['total_cost']
+
+    with transaction.atomic():
+        rollups.delete()
+        DailyProductRollup.objects.bulk_create(
+            [DailyProductRollup(day=day, product_id=product_id, **values) for (day, product_id), values in rows.items()],
+            batch_size=1000,
+        )
+        kpis.invalidate_for('DailyProductRollup')
+    return len(rows)
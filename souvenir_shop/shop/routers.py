@@ -0,0 +1,105 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+REPLICA = 'replica'
+PRIMARY = 'default'
+STICKY_COOKIE = 'shop_primary'
+
+# Set while a report view runs; context variables follow the request into the
+# worker threads of the async views.
+_use_replica = ContextVar('shop_use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+class ReplicaRouter:
+    """
+    Sends reads to the ``replica`` database while a ``replica_reads`` view is
+    running and everything else, including every write, to ``default``.
+    """
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary.
+        return db != REPLICA
+
+
+def _wants_replica(request):
+    # Right after a write the replica may lag behind; keep this client on the
+    # primary until the sticky cookie set by ReplicaStickinessMiddleware expires.
+    return replica_configured() and STICKY_COOKIE not in request.COOKIES
+
+
+def replica_reads(view):
+    """
+    Runs a read-only report view against the replica database (when one is
+    configured). Works on sync and async views.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _use_replica.set(_wants_replica(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _use_replica.set(_wants_replica(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """
+    Reads inside the block go to the primary, even within a ``replica_reads``
+    view. For values that are cached until a commit on the primary invalidates
+    them: computed from a lagging replica, they would be cached already stale.
+    """
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaStickinessMiddleware:
+    """
+    After a successful write request (including the redirect that usually
+    follows it), pins the client to the primary database for
+    ``SHOP_REPLICA_STICKY_SECONDS`` so it reads its own writes.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if replica_configured() and request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=getattr(settings, 'SHOP_REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
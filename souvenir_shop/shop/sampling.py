@@ -0,0 +1,160 @@
+import datetime
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+TOKEN_SALT = 'shop.sampling'
+TOKEN_PARAM = '_profile'
+TOKEN_HEADER = 'X-Shop-Profile'
+
+# <timestamp>--<view>--<milliseconds>ms.collapsed
+PROFILE_NAME = re.compile(r'^(?P<stamp>\d{8}T\d{6}\d{6})--(?P<view>[\w.:-]+)--(?P<ms>\d+)ms\.collapsed$')
+
+
+def profile_dir():
+    return str(getattr(settings, 'SHOP_PROFILER_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def make_token():
+    """
+    A token that switches profiling on for requests carrying it in the
+    ``_profile`` query parameter or ``X-Shop-Profile`` header.
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign('profile')
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=getattr(settings, 'SHOP_PROFILER_TOKEN_MAX_AGE', 3600))
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the call stack of another thread every ``interval`` seconds and
+    counts identical stacks, root first, in the collapsed format used by
+    flamegraph.pl, speedscope and similar tools.
+    """
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def save_profile(view, duration_ms, collapsed):
+    """
+    Writes a collapsed-stack file and keeps only the newest ``SHOP_PROFILER_KEEP`` files.
+    """
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    view = re.sub(r'[^\w.:-]', '_', view).replace(':', '.')
+    name = f'{stamp}--{view}--{int(duration_ms)}ms.collapsed'
+    with open(os.path.join(directory, name), 'w') as handle:
+        handle.write(collapsed)
+
+    keep = getattr(settings, 'SHOP_PROFILER_KEEP', 200)
+    for old in sorted(list_profile_names(), reverse=True)[keep:]:
+        os.remove(os.path.join(directory, old))
+    return name
+
+
+def list_profile_names():
+    try:
+        return [name for name in os.listdir(profile_dir()) if PROFILE_NAME.match(name)]
+    except FileNotFoundError:
+        return []
+
+
+def list_profiles():
+    """
+    Captured profiles, newest first, as dicts with name, view, duration_ms and captured_at.
+    """
+    profiles = []
+    for name in sorted(list_profile_names(), reverse=True):
+        match = PROFILE_NAME.match(name)
+        captured_at = datetime.datetime.strptime(match['stamp'], '%Y%m%dT%H%M%S%f').replace(tzinfo=datetime.timezone.utc)
+        profiles.append({'name': name, 'view': match['view'], 'duration_ms': int(match['ms']), 'captured_at': captured_at})
+    return profiles
+
+
+def profile_path(name):
+    """
+    The file for ``name``, or None when it is not a captured profile.
+    """
+    if not PROFILE_NAME.match(name) or name not in list_profile_names():
+        return None
+    return os.path.join(profile_dir(), name)
+
+
+class SamplingProfilerMiddleware:
+    """
+    Opt-in (``SHOP_PROFILER = True``) sampling profiler for slow requests.
+
+    A request is profiled when it carries a valid token (see ``make_token``) in
+    the ``_profile`` query parameter or ``X-Shop-Profile`` header. When
+    ``SHOP_PROFILER_SLOW_MS`` is set every request is sampled and the profile is
+    kept only if the request took at least that long. Profiles are written as
+    collapsed stacks to ``SHOP_PROFILER_DIR`` and listed at /shop/profiling/profiles/.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_PROFILER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.interval = getattr(settings, 'SHOP_PROFILER_INTERVAL_MS', 5) / 1000
+        self.slow_ms = getattr(settings, 'SHOP_PROFILER_SLOW_MS', 0)
+
+    def __call__(self, request):
+        token = request.GET.get(TOKEN_PARAM) or request.headers.get(TOKEN_HEADER)
+        requested = bool(token) and valid_token(token)
+        if not requested and not self.slow_ms:
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if requested or duration_ms >= self.slow_ms:
+            match = request.resolver_match
+            name = save_profile(match.view_name if match else '(unresolved)', duration_ms, sampler.collapsed())
+            response['X-Shop-Profile'] = name
+        return response
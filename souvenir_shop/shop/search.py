@@ -0,0 +1,99 @@
+import difflib
+import re
+import unicodedata
+
+from django.db import transaction
+
+from .models import Product, ProductSearchToken
+
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TERMS = 5
+FUZZY_CUTOFF = 0.75
+FUZZY_VOCABULARY = 5000  # Candidate tokens examined per misspelt term
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """
+    Lower-cased, accent-free words of ``text``, without duplicates, in order.
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return list(dict.fromkeys(word[:MAX_TOKEN_LENGTH] for word in _WORD.findall(text)))
+
+
+def product_tokens(name, description, artist_name):
+    return set(tokenize(name)) | set(tokenize(description)) | set(tokenize(artist_name))
+
+
+def index_products(product_ids=None, batch_size=1000):
+    """
+    (Re)builds the search tokens of the given products, or of every product
+    when ``product_ids`` is None. Returns the number of tokens written.
+    """
+    products = Product.objects.order_by('pk').values_list('pk', 'name', 'description', 'artist__name')
+    tokens = ProductSearchToken.objects.all()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(pk__in=product_ids)
+        tokens = tokens.filter(product_id__in=product_ids)
+    count = 0
+    with transaction.atomic():
+        tokens.delete()
+        batch = []
+        for pk, name, description, artist_name in products.iterator(chunk_size=batch_size):
+            batch.extend(ProductSearchToken(product_id=pk, token=token)
+                         for token in product_tokens(name, description, artist_name))
+            if len(batch) >= batch_size:
+                ProductSearchToken.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        ProductSearchToken.objects.bulk_create(batch)
+    return count + len(batch)
+
+
+def _prefix(term):
+    # A range rather than LIKE 'term%' so every database can use the token index.
+    return ProductSearchToken.objects.filter(token__gte=term, token__lt=term + '\uffff')
+
+
+def _close_tokens(term):
+    # Only indexed words with the same first letter are compared, so the
+    # vocabulary is one range of the token index rather than every token.
+    vocabulary = (_prefix(term[0]).values_list('token', flat=True)
+                  .distinct().order_by('token')[:FUZZY_VOCABULARY])
+    return difflib.get_close_matches(term, list(vocabulary), n=5, cutoff=FUZZY_CUTOFF)
+
+
+def search_products(query, limit=20, artist=None):
+    """
+    Products whose name, description or artist name has a word starting with
+    every word of ``query``. When nothing matches, words are also matched to
+    similar indexed words, so small typos still find the product. Only words
+    with the same first letter are considered similar: a typo in the first
+    letter of a word does not find it.
+    """
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    if not terms:
+        return []
+    products = Product.objects.select_related('artist').order_by('name', 'pk')
+    if artist is not None:
+        products = products.filter(artist=artist)
+
+    matches = products
+    for term in terms:
+        matches = matches.filter(pk__in=_prefix(term).values('product_id'))
+    results = list(matches[:limit])
+    if results:
+        return results
+
+    for term in terms:
+        candidates = _prefix(term).values('product_id')
+        close = _close_tokens(term)
+        if close:
+            candidates = candidates | ProductSearchToken.objects.filter(token__in=close).values('product_id')
+        products = products.filter(pk__in=candidates)
+    return list(products[:limit])
@@ -0,0 +1,152 @@
+import datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .ledger import CENT, archive_cutoff, day_start
+from .models import ArchivedSaleItem, Product, SaleItem
+from .routers import primary_reads
+
+CACHE_PREFIX = 'shop:settlement'
+TOTAL_FIELDS = ('quantity', 'revenue', 'cost', 'margin')
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def month_bounds(month):
+    """
+    The first and last day of the month of ``month``.
+    """
+    first = month.replace(day=1)
+    return first, (first + datetime.timedelta(days=31)).replace(day=1) - datetime.timedelta(days=1)
+
+
+def _hot_lines(start, end):
+    # SaleItem -> Product -> Artist, grouped per product in one query.
+    return (SaleItem.objects
+            .filter(sale__sale_date__gte=day_start(start), sale__sale_date__lt=day_start(end + datetime.timedelta(days=1)))
+            .values('product_id')
+            .annotate(
+                product_name=F('product__name'),
+                artist_id=F('product__artist_id'),
+                artist_name=F('product__artist__name'),
+                sold=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('unit_price'), output_field=MONEY),
+                cost=Sum(F('quantity') * F('product__purchase_price'), output_field=MONEY),
+            )
+            .order_by())
+
+
+def _archived_lines(start, end):
+    # Archived items keep the product id and name only; artist and purchase
+    # price are looked up in the same query.
+    products = Product.objects.filter(pk=OuterRef('product_id'))
+    return (ArchivedSaleItem.objects
+            .filter(sale__sale_date__gte=day_start(start), sale__sale_date__lt=day_start(end + datetime.timedelta(days=1)))
+            .values('product_id', 'product_name')
+            .annotate(
+                artist_id=Subquery(products.values('artist_id')),
+                artist_name=Subquery(products.values('artist__name')),
+                sold=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('unit_price'), output_field=MONEY),
+                cost=Sum(F('quantity') * Subquery(products.values('purchase_price')), output_field=MONEY),
+            )
+            .order_by())
+
+
+def _totals():
+    return {'quantity': 0, 'revenue': Decimal('0'), 'cost': Decimal('0'), 'margin': Decimal('0')}
+
+
+def settlement(start, end):
+    """
+    Units sold, revenue, cost (at the products' purchase price) and margin per
+    artist and per product for sales from ``start`` to ``end`` inclusive:
+    ``{'artists': [{'artist_id', 'artist_name', 'products': [...], <totals>}], 'totals': {...}}``.
+
+    One grouped query whatever the number of artists, plus one over the
+    archive when the range reaches into it.
+    """
+    querysets = [_hot_lines(start, end)]
+    cutoff = archive_cutoff()
+    if cutoff is not None and start < cutoff:
+        querysets.append(_archived_lines(start, end))
+
+    products = {}
+    for queryset in querysets:
+        for row in queryset:
+            line = products.setdefault(row['product_id'], {
+                'product_id': row['product_id'], 'product_name': row['product_name'],
+                'artist_id': row['artist_id'], 'artist_name': row['artist_name'] or 'Unknown artist', **_totals(),
+            })
+            line['quantity'] += row['sold'] or 0
+            line['revenue'] += (row['revenue'] or Decimal('0')).quantize(CENT)  # SQLite sums decimals as floats
+            line['cost'] += (row['cost'] or Decimal('0')).quantize(CENT)
+
+    artists = {}
+    grand_total = _totals()
+    for line in sorted(products.values(), key=lambda line: (line['artist_name'], line['artist_id'] or 0, line['product_name'], line['product_id'])):
+        line['margin'] = line['revenue'] - line['cost']
+        artist = artists.setdefault(line['artist_id'], {
+            'artist_id': line['artist_id'], 'artist_name': line['artist_name'], 'products': [], **_totals(),
+        })
+        artist['products'].append(line)
+        for name in TOTAL_FIELDS:
+            artist[name] += line[name]
+            grand_total[name] += line[name]
+    return {'start': start, 'end': end, 'artists': list(artists.values()), 'totals': grand_total}
+
+
+# Closed months are cached until a sale of that month, or any product or
+# artist, changes. Each of those writes bumps a version that is part of the key.
+
+def _version_key(scope):
+    return f'{CACHE_PREFIX}:version:{scope}'
+
+
+def _bump(*scopes):
+    def bump():
+        for scope in scopes:
+            key = _version_key(scope)
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+    transaction.on_commit(bump)
+
+
+def invalidate_month(day):
+    """
+    Drops the cached settlement of the month of ``day`` once the current
+    transaction commits.
+    """
+    _bump(day.strftime('%Y-%m'))
+
+
+def invalidate():
+    """
+    Drops every cached settlement once the current transaction commits.
+    """
+    _bump('all')
+
+
+def month_settlement(month):
+    """
+    ``settlement`` of the month of ``month``; cached when the month is over.
+    Cached reports are computed on the primary, like the dashboard widgets.
+    """
+    start, end = month_bounds(month)
+    if end >= timezone.localdate():
+        return settlement(start, end)
+    scope = start.strftime('%Y-%m')
+    versions = cache.get_many([_version_key('all'), _version_key(scope)])
+    key = f"{CACHE_PREFIX}:{scope}:v{versions.get(_version_key('all'), 0)}.{versions.get(_version_key(scope), 0)}"
+    report = cache.get(key)
+    if report is None:
+        with primary_reads():
+            report = settlement(start, end)
+        cache.set(key, report, None)
+    return report
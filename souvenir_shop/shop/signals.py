@@ -0,0 +1,121 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import choices, kpis, profiling, search, settlements
+from .ledger import apply_balance_deltas, ledger_enabled, transaction_day, transaction_deltas
+from .models import Artist, Balance, Product, Purchase, PurchaseItem, Sale, SaleItem, Transaction
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, raw=False, **kwargs):
+    """
+    Keeps the stored day/amount of an edited transaction so that only the
+    difference is applied to the balance.
+    """
+    instance._ledger_previous = None
+    if raw or not ledger_enabled() or instance.pk is None:
+        return
+    previous = Transaction.objects.filter(pk=instance.pk).values_list('transaction_date', 'amount').first()
+    if previous is not None:
+        instance._ledger_previous = (transaction_day(previous[0]), previous[1])
+
+
+@receiver(post_save, sender=Transaction)
+def apply_saved_transaction(sender, instance, raw=False, **kwargs):
+    if raw or not ledger_enabled():
+        return
+    apply_balance_deltas(transaction_deltas(getattr(instance, '_ledger_previous', None), instance))
+    instance._ledger_previous = None
+
+
+@receiver(post_delete, sender=Transaction)
+def apply_deleted_transaction(sender, instance, **kwargs):
+    if not ledger_enabled():
+        return
+    apply_balance_deltas(transaction_deltas((transaction_day(instance.transaction_date), instance.amount)))
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_save, sender=SaleItem)
+@receiver(post_save, sender=Purchase)
+@receiver(post_save, sender=PurchaseItem)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Balance)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Sale)
+@receiver(post_delete, sender=SaleItem)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_delete, sender=PurchaseItem)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Balance)
+@receiver(post_delete, sender=Transaction)
+def invalidate_dashboard_widgets(sender, **kwargs):
+    kpis.invalidate_for(sender.__name__)
+
+
+SEARCHED_PRODUCT_FIELDS = {'name', 'description', 'artist'}
+
+
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not SEARCHED_PRODUCT_FIELDS & set(update_fields)):
+        return
+    search.index_products([instance.pk])
+
+
+@receiver(post_save, sender=Artist)
+def index_artist_products(sender, instance, created=False, raw=False, **kwargs):
+    # Products are found by their artist's name too.
+    if raw or created:
+        return
+    search.index_products(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_choices(sender, **kwargs):
+    choices.invalidate(Product)
+
+
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Artist)
+def invalidate_artist_choices(sender, **kwargs):
+    # Product labels include the artist name.
+    choices.invalidate(Artist, Product)
+
+
+@receiver(pre_save, sender=Sale)
+def remember_previous_sale_date(sender, instance, raw=False, **kwargs):
+    """
+    Keeps the stored date of an edited sale, so a sale moved to another month
+    invalidates the settlement of the month it left too.
+    """
+    instance._settlement_previous_date = None
+    if raw or instance.pk is None:
+        return
+    instance._settlement_previous_date = Sale.objects.filter(pk=instance.pk).values_list('sale_date', flat=True).first()
+
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def invalidate_sale_settlement(sender, instance, **kwargs):
+    dates = {instance.sale_date, getattr(instance, '_settlement_previous_date', None)} - {None}
+    for month in {timezone.localdate(date).replace(day=1) for date in dates}:
+        settlements.invalidate_month(month)
+    instance._settlement_previous_date = None
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Artist)
+def invalidate_settlements(sender, **kwargs):
+    # Costs use the current purchase price; names are shown too.
+    settlements.invalidate()
+
+
+@receiver(connection_created)
+def install_sql_recording_hook(sender, connection, **kwargs):
+    profiling.install_hook(connection)
@@ -0,0 +1,100 @@
+import datetime
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from . import kpis
+from .ledger import day_start
+from .models import Product, StockMovement
+
+
+def stock_deltas(lines, sign=1):
+    """
+    Sums ``(product_id, quantity, ...)`` lines into ``{product_id: signed quantity}``.
+    """
+    deltas = defaultdict(int)
+    for product_id, quantity, *_ in lines:
+        deltas[product_id] += sign * quantity
+    return deltas
+
+
+def merge_deltas(*delta_sets):
+    merged = defaultdict(int)
+    for deltas in delta_sets:
+        for product_id, quantity in deltas.items():
+            merged[product_id] += quantity
+    return merged
+
+
+def stock_movements(deltas, kind, moved_at=None, sale=None, purchase=None, note=''):
+    """
+    Unsaved StockMovement rows for ``{product_id: signed quantity}``, dated
+    ``moved_at`` (now by default) and linked to the sale or purchase that
+    caused them.
+    """
+    moved_at = moved_at or timezone.now()
+    return [
+        StockMovement(
+            product_id=product_id, quantity=quantity, kind=kind, moved_at=moved_at, note=note,
+            related_sale_id=sale.pk if sale is not None else None,
+            related_purchase_id=purchase.pk if purchase is not None else None,
+        )
+        for product_id, quantity in deltas.items() if quantity
+    ]
+
+
+def adjust_stock(movements):
+    """
+    Appends ``movements`` to the stock ledger and adds them to the products'
+    stock: one INSERT and one UPDATE.
+
+    The increment is computed by the database (``stock_quantity = stock_quantity + delta``)
+    so concurrent checkouts touching the same product never overwrite each other.
+    ``updated_at`` is set too, since ``update()`` skips ``auto_now``.
+    """
+    movements = [movement for movement in movements if movement.quantity]
+    deltas = stock_deltas((movement.product_id, movement.quantity) for movement in movements)
+    deltas = {product_id: quantity for product_id, quantity in deltas.items() if quantity}
+    StockMovement.objects.bulk_create(movements)
+    if not deltas:
+        return 0
+    change = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    updated = Product.objects.filter(pk__in=deltas).update(stock_quantity=F('stock_quantity') + change, updated_at=Now())
+    kpis.invalidate_for('Product')
+    return updated
+
+
+def expected_stock():
+    """
+    Products with their stock as the movement ledger has it: purchased, sold
+    and adjusted quantities and ``expected`` (their sum) next to the stored
+    ``stock_quantity``, for the whole catalog in one grouped query.
+    """
+    def moved(kind):
+        return Coalesce(Sum('stock_movements__quantity', filter=Q(stock_movements__kind=kind)), 0)
+
+    return (Product.objects.order_by('pk')
+            .annotate(
+                purchased=moved(StockMovement.PURCHASE),
+                sold=-moved(StockMovement.SALE),
+                adjusted=moved(StockMovement.ADJUSTMENT),
+            )
+            .annotate(expected=F('purchased') - F('sold') + F('adjusted'))
+            .values('pk', 'name', 'stock_quantity', 'purchased', 'sold', 'adjusted', 'expected'))
+
+
+def stock_as_of(day, product_ids=None):
+    """
+    ``{product_id: stock}`` at the end of ``day``, from the movements up to
+    then; products without movements by that day are left out.
+    """
+    movements = StockMovement.objects.filter(moved_at__lt=day_start(day + datetime.timedelta(days=1)))
+    if product_ids is not None:
+        movements = movements.filter(product_id__in=product_ids)
+    return dict(movements.values('product_id').annotate(stock=Sum('quantity')).order_by().values_list('product_id', 'stock'))
@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shop.checkout import checkout_batch
+from shop.models import Product, Purchase, Sale
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shop-tests'},
+    'template_fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shop-tests-fragments'},
+}
+
+
+def item_data(lines, items=()):
+    """
+    POST data for an item formset: the saved ``items`` (with their new
+    ``(product, quantity)`` in ``lines``) followed by new rows for the rest.
+    """
+    data = {'items-TOTAL_FORMS': len(lines), 'items-INITIAL_FORMS': len(items)}
+    for index, (product, quantity) in enumerate(lines):
+        data[f'items-{index}-product'] = product.pk
+        data[f'items-{index}-quantity'] = quantity
+        data[f'items-{index}-unit_price'] = product.selling_price
+        if index < len(items):
+            data[f'items-{index}-id'] = items[index].pk
+    return data
+
+
+@override_settings(CACHES=TEST_CACHES, SHOP_BALANCE_MODE='ledger', SHOP_BOOKKEEPING='inline', SHOP_API_TOKEN='')
+class ShopTestCase(TestCase):
+    """
+    A small generated shop, with helpers that write through the views.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_shop_data', scale='tiny', artists=3, products=12, purchases=10, sales=60, days=75, seed=7,
+            stdout=StringIO(),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def log_in_staff(self):
+        user = User.objects.create_user('staff', password='staff', is_staff=True)
+        self.client.force_login(user)
+        return user
+
+    def products(self, count):
+        return list(Product.objects.filter(stock_quantity__gte=10).order_by('pk')[:count])
+
+    def write_through_views(self):
+        """
+        Creates a purchase and a sale, edits the sale, then deletes one older
+        sale and one older purchase, all through the views.
+        """
+        first, second = self.products(2)
+        response = self.client.post(reverse('shop:purchase_create'), {
+            'artist': first.artist_id, 'notes': 'Restock', **item_data([(first, 4), (second, 2)]),
+        })
+        self.assertEqual(response.status_code, 302)
+
+        response = self.client.post(reverse('shop:sale_create'), {'notes': '', **item_data([(first, 3), (second, 1)])})
+        self.assertEqual(response.status_code, 302)
+        sale = Sale.objects.latest('pk')
+
+        items = list(sale.items.order_by('pk'))
+        lines = [(item.product, item.quantity + 1) for item in items]
+        response = self.client.post(reverse('shop:sale_update', args=[sale.pk]), {'notes': 'Edited', **item_data(lines, items)})
+        self.assertEqual(response.status_code, 302)
+
+        old_sale = Sale.objects.order_by('sale_date').first()
+        self.assertEqual(self.client.post(reverse('shop:sale_delete', args=[old_sale.pk])).status_code, 302)
+        old_purchase = Purchase.objects.order_by('purchase_date').first()
+        self.assertEqual(self.client.post(reverse('shop:purchase_delete', args=[old_purchase.pk])).status_code, 302)
+
+    def checkout(self, *sales):
+        return checkout_batch([
+            {'key': key, 'sale_date': sale_date, 'items': [{'product': product.pk, 'quantity': quantity}]}
+            for key, sale_date, product, quantity in sales
+        ])
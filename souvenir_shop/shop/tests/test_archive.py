@@ -0,0 +1,59 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import ledger, settlements
+from shop.archive import archive_before
+from shop.models import ArchivedSale, ArchivedSaleItem, ArchivedTransaction, ArchivePeriod, Sale, SaleItem, Transaction
+
+from .base import ShopTestCase
+
+
+class ArchiveTests(ShopTestCase):
+    def test_archive_round_trip(self):
+        today = timezone.localdate()
+        cutoff = (today - datetime.timedelta(days=40)).replace(day=1)
+        first_day = Sale.objects.order_by('sale_date').values_list('sale_date', flat=True).first().date()
+        series = ledger.balance_series(first_day, today)
+        report = settlements.settlement(first_day, cutoff - datetime.timedelta(days=1))
+        old_sales = list(Sale.objects.filter(sale_date__lt=ledger.day_start(cutoff)).values_list('pk', flat=True))
+        old_items = SaleItem.objects.filter(sale__in=old_sales).count()
+        self.assertTrue(old_sales)
+
+        archive_before(cutoff)
+
+        self.assertFalse(Sale.objects.filter(pk__in=old_sales).exists())
+        self.assertEqual(set(ArchivedSale.objects.values_list('pk', flat=True)), set(old_sales))
+        self.assertEqual(ArchivedSaleItem.objects.count(), old_items)
+        self.assertFalse(Transaction.objects.filter(transaction_date__lt=ledger.day_start(cutoff)).exists())
+        self.assertTrue(ArchivedTransaction.objects.exists())
+        self.assertEqual(ArchivePeriod.objects.order_by('month').last().month, (cutoff - datetime.timedelta(days=1)).replace(day=1))
+
+        self.assertEqual(ledger.balance_series(first_day, today), series)
+        self.assertEqual(settlements.settlement(first_day, cutoff - datetime.timedelta(days=1))['totals'], report['totals'])
+        call_command('rebuild_balances', check=True, stdout=StringIO())
+
+        response = self.client.get(reverse('shop:sale_detail', args=[old_sales[0]]))
+        self.assertRedirects(response, reverse('shop:archived_sale_detail', args=[old_sales[0]]), fetch_redirect_response=False)
+
+    def test_archived_checkout_key_is_still_a_duplicate(self):
+        today = timezone.localdate()
+        cutoff = (today - datetime.timedelta(days=40)).replace(day=1)
+        product, = self.products(1)
+        old = timezone.now() - datetime.timedelta(days=70)
+        [result] = self.checkout(('till-1', old.isoformat(), product, 1))
+        sale = result['sale_id']
+        archive_before(cutoff)
+        self.assertEqual(ArchivedSale.objects.get(client_key='till-1').pk, sale)
+
+        stock = product.stock_quantity - 1
+        self.assertEqual(self.checkout(('till-1', old.isoformat(), product, 1)), [{'key': 'till-1', 'status': 'duplicate', 'sale_id': sale}])
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, stock)
+
+        period = ArchivePeriod.objects.get(month=old.date().replace(day=1))
+        response = self.client.get(reverse('shop:archive_period', args=[period.month.year, period.month.month, 'sales']))
+        self.assertContains(response, f'{sale}')
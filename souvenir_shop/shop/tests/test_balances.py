@@ -0,0 +1,71 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import jobs, ledger
+from shop.models import Balance, Transaction
+
+from .base import ShopTestCase
+
+
+class BalanceSeriesTests(ShopTestCase):
+    def expected(self, start, end):
+        """
+        Closing balances summed straight from the transactions.
+        """
+        totals = defaultdict(Decimal)
+        for date, amount in Transaction.objects.values_list('transaction_date', 'amount'):
+            totals[timezone.localdate(date)] += amount
+        series, running, day = [], sum((amount for day, amount in totals.items() if day < start), Decimal('0')), start
+        while day <= end:
+            running += totals.get(day, 0)
+            series.append((day, running.quantize(ledger.CENT)))
+            day += datetime.timedelta(days=1)
+        return series
+
+    def test_series_matches_the_transactions(self):
+        today = timezone.localdate()
+        start = today - datetime.timedelta(days=40)
+        self.assertEqual(ledger.balance_series(start, today), self.expected(start, today))
+        self.assertEqual(ledger.balance_as_of(start), self.expected(start, start)[0][1])
+
+    def test_cost_does_not_depend_on_the_range(self):
+        today = timezone.localdate()
+        with CaptureQueriesContext(connection) as short:
+            ledger.balance_series(today - datetime.timedelta(days=7), today)
+        with CaptureQueriesContext(connection) as long:
+            ledger.balance_series(today - datetime.timedelta(days=70), today)
+        self.assertEqual(len(short), len(long))
+
+    def test_stale_snapshots_are_not_trusted_in_aggregate_mode(self):
+        today = timezone.localdate()
+        start = today - datetime.timedelta(days=20)
+        Balance.objects.filter(balance_date__lt=start).update(amount=0)
+        with self.settings(SHOP_BALANCE_MODE='aggregate'):
+            self.assertFalse(ledger.snapshots_current())
+            self.assertEqual(ledger.balance_series(start, today), self.expected(start, today))
+
+    @override_settings(SHOP_BOOKKEEPING='queue')
+    def test_stale_snapshots_are_not_trusted_while_a_rebuild_is_queued(self):
+        today = timezone.localdate()
+        start = today - datetime.timedelta(days=20)
+        product, = self.products(1)
+        self.checkout(('queued', (timezone.now() - datetime.timedelta(days=30)).isoformat(), product, 3))
+        self.assertTrue(jobs.outstanding('rebuild_balances'))
+        self.assertFalse(ledger.snapshots_current())
+        self.assertEqual(ledger.balance_series(start, today), self.expected(start, today))
+
+    def test_views(self):
+        today = timezone.localdate()
+        response = self.client.get(reverse('shop:balance_as_of'), {'date': today.isoformat()})
+        self.assertEqual(response.json(), {'date': today.isoformat(), 'balance': str(self.expected(today, today)[0][1])})
+        chart = self.client.get(reverse('shop:balance_chart')).json()
+        self.assertEqual(len(chart['dates']), 30)
+        self.assertEqual(self.client.get(reverse('shop:balance_as_of'), {'date': '2025-02-30'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('shop:balance_chart'), {'start': '2020-01-01'}).status_code, 400)
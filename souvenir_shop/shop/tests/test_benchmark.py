@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    def test_every_url_answers_on_the_tiny_scale(self):
+        # In a separate process: the command sets up its own test environment
+        # and database, which cannot be nested inside this test run's.
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            subprocess.run(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark_shop',
+                 '--scales', 'tiny', '--repeat', '1', '--output', output],
+                check=True, capture_output=True, timeout=600,
+            )
+            with open(output) as results:
+                report = json.load(results)
+
+        for handler, urls in report['scales']['tiny']['handlers'].items():
+            for name, measured in urls.items():
+                self.assertIn(measured['status'], (200, 302), f'{handler} {name}')  # 302: staff-only pages
+            self.assertEqual(urls['sale_create:post']['status'], 302)
+            self.assertEqual(urls['purchase_create:post']['status'], 302)
+            self.assertEqual(urls['api_checkout']['status'], 200)
+            self.assertIn('export_data:sales', urls)
@@ -0,0 +1,79 @@
+import datetime
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.db.models import F, Sum
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import ledger
+from shop.models import Balance, DailyProductRollup, Product, PurchaseItem, Sale, SaleItem
+from shop.rollups import rebuild_rollups
+from shop.stock import expected_stock
+
+from .base import ShopTestCase, item_data
+
+
+class BookkeepingTests(ShopTestCase):
+    def test_ledger_balances_match_rebuild(self):
+        self.write_through_views()
+        product, = self.products(1)
+        back_dated = (timezone.now() - datetime.timedelta(days=20)).isoformat()
+        self.checkout((uuid.uuid4().hex, back_dated, product, 2))
+
+        stored = dict(Balance.objects.values_list('balance_date', 'amount'))
+        ledger.rebuild_balances(min(stored))
+        self.assertEqual(dict(Balance.objects.values_list('balance_date', 'amount')), stored)
+        call_command('rebuild_balances', check=True, stdout=StringIO())
+
+    def rollups(self):
+        fields = ('day', 'product_id', 'quantity_sold', 'sales_revenue', 'sales_cost', 'quantity_purchased', 'purchase_cost')
+        return set(DailyProductRollup.objects.exclude(
+            quantity_sold=0, quantity_purchased=0, sales_revenue=0, sales_cost=0, purchase_cost=0,
+        ).values_list(*fields))
+
+    def test_incremental_rollups_match_rebuild(self):
+        self.write_through_views()
+        product, = self.products(1)
+        self.checkout((uuid.uuid4().hex, None, product, 1))
+
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_reversed_sale_lines_keep_their_cost(self):
+        first, second = self.products(2)
+        before = self.rollups()
+        response = self.client.post(reverse('shop:sale_create'), {'notes': '', **item_data([(first, 2), (second, 1)])})
+        self.assertEqual(response.status_code, 302)
+        sale = Sale.objects.latest('pk')
+        self.assertEqual(sale.items.get(product=first).unit_cost, first.purchase_price)
+
+        # The lines are edited and then deleted after the purchase prices change.
+        Product.objects.filter(pk__in=[first.pk, second.pk]).update(purchase_price=F('purchase_price') + 5)
+        items = list(sale.items.order_by('pk'))
+        lines = [(item.product, item.quantity + 1) for item in items]
+        response = self.client.post(reverse('shop:sale_update', args=[sale.pk]), {'notes': '', **item_data(lines, items)})
+        self.assertEqual(response.status_code, 302)
+        incremental = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(self.rollups(), incremental)
+
+        Product.objects.filter(pk__in=[first.pk, second.pk]).update(purchase_price=F('purchase_price') + 5)
+        self.assertEqual(self.client.post(reverse('shop:sale_delete', args=[sale.pk])).status_code, 302)
+        self.assertEqual(self.rollups(), before)
+
+    def test_stock_matches_movements_after_writes(self):
+        self.write_through_views()
+        product, = self.products(1)
+        self.checkout((uuid.uuid4().hex, None, product, 1))
+
+        call_command('reconcile_stock', stdout=StringIO())
+        # The movements must also agree with the items that are left.
+        purchased = dict(PurchaseItem.objects.values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+        sold = dict(SaleItem.objects.values('product').annotate(total=Sum('quantity')).values_list('product', 'total'))
+        for row in expected_stock():
+            self.assertEqual(row['stock_quantity'], row['expected'], row['name'])
+            self.assertEqual(row['purchased'], purchased.get(row['pk'], 0), row['name'])
+            self.assertEqual(row['sold'], sold.get(row['pk'], 0), row['name'])
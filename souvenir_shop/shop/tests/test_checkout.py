@@ -0,0 +1,91 @@
+import json
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import ledger
+from shop.models import Balance, Sale, Transaction
+
+from .base import ShopTestCase
+
+
+class CheckoutTests(ShopTestCase):
+    def test_retried_batch_is_recorded_once(self):
+        first, second = self.products(2)
+        stock = {product.pk: product.stock_quantity for product in (first, second)}
+        sales = [('pos-1', None, first, 2), ('pos-2', None, second, 1)]
+
+        created = self.checkout(*sales)
+        self.assertEqual([result['status'] for result in created], ['created', 'created'])
+        counts = (Sale.objects.count(), Transaction.objects.count())
+
+        retried = self.checkout(*sales)
+        self.assertEqual([result['status'] for result in retried], ['duplicate', 'duplicate'])
+        self.assertEqual([result['sale_id'] for result in retried], [result['sale_id'] for result in created])
+        self.assertEqual((Sale.objects.count(), Transaction.objects.count()), counts)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.stock_quantity, stock[first.pk] - 2)
+        self.assertEqual(second.stock_quantity, stock[second.pk] - 1)
+
+    def test_repeated_key_in_one_batch(self):
+        product, = self.products(1)
+        results = self.checkout(('pos-3', None, product, 1), ('pos-3', None, product, 1))
+        self.assertEqual([result['status'] for result in results], ['created', 'duplicate'])
+        self.assertEqual(results[0]['sale_id'], results[1]['sale_id'])
+        self.assertEqual(Sale.objects.filter(client_key='pos-3').count(), 1)
+
+    def test_api_is_closed_without_token(self):
+        response = self.client.post(reverse('shop:api_checkout'), '{"sales": []}', content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_aggregate_mode_writes_todays_balance(self):
+        product, = self.products(1)
+        Balance.objects.filter(balance_date=timezone.localdate()).delete()
+        with self.settings(SHOP_BALANCE_MODE='aggregate'):
+            before = ledger.get_current_balance()
+            self.checkout(('pos-4', None, product, 1))
+            balance = Balance.objects.get(balance_date=timezone.localdate())
+        self.assertEqual(balance.amount, before + product.selling_price)
+
+
+@override_settings(SHOP_API_TOKEN='secret')
+class CheckoutApiTests(ShopTestCase):
+    def post(self, body, token='secret', content_type='application/json'):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        data = body if isinstance(body, str) else json.dumps(body)
+        return self.client.post(reverse('shop:api_checkout'), data, content_type=content_type, **headers)
+
+    def test_token_is_required(self):
+        self.assertEqual(self.post({'sales': []}, token=None).status_code, 401)
+        self.assertEqual(self.post({'sales': []}, token='secreT').status_code, 401)
+
+    def test_only_json_is_accepted(self):
+        self.assertEqual(self.post('{"sales": []}', content_type='text/plain').status_code, 415)
+        self.assertEqual(self.post('{"sales": [', content_type='application/json').status_code, 400)
+        self.assertEqual(self.post('[]').status_code, 400)
+
+    def test_batch_is_recorded_and_retries_are_duplicates(self):
+        product, = self.products(1)
+        body = {'sales': [{'key': 'api-1', 'items': [{'product': product.pk, 'quantity': 2}]}]}
+        created = self.post(body).json()['results']
+        self.assertEqual(created[0]['status'], 'created')
+        sale = Sale.objects.get(pk=created[0]['sale_id'])
+        self.assertEqual(sale.total_amount, 2 * product.selling_price)
+        retried = self.post(body).json()['results']
+        self.assertEqual(retried, [{'key': 'api-1', 'status': 'duplicate', 'sale_id': sale.pk}])
+
+    def test_invalid_sales_reject_the_whole_batch(self):
+        product, = self.products(1)
+        response = self.post({'sales': [
+            {'key': 'api-2', 'items': [{'product': product.pk, 'quantity': 1}]},
+            {'key': 'api-3', 'items': [{'product': True, 'quantity': 1}]},
+            {'key': 'api-4', 'items': [{'product': product.pk, 'quantity': False}]},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            {'index': 1, 'key': 'api-3', 'error': 'unknown product True'},
+            {'index': 2, 'key': 'api-4', 'error': f'invalid quantity for product {product.pk}'},
+        ])
+        self.assertFalse(Sale.objects.filter(client_key__startswith='api-').exists())
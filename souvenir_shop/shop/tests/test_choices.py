@@ -0,0 +1,60 @@
+from django.test import override_settings
+
+from shop import choices
+from shop.forms import ProductForm
+from shop.models import Artist, Product
+
+from .base import ShopTestCase
+
+
+class ChoiceCacheTests(ShopTestCase):
+    def test_prefetch_loads_every_pk_at_once(self):
+        first, second = self.products(2)
+        product_choices = choices.ChoiceCache(Product.objects.all())
+        with self.assertNumQueries(1):
+            product_choices.prefetch([str(first.pk), second.pk, '0', 'x', ''])
+            self.assertEqual(product_choices.get(first.pk), first)
+            self.assertEqual(product_choices.get(str(second.pk)), second)
+            self.assertIsNone(product_choices.get(0))  # Missing pks are remembered
+            self.assertIsNone(product_choices.get('x'))
+
+    @override_settings(SHOP_CHOICE_CACHE_TIMEOUT=300)
+    def test_cached_objects_are_dropped_when_the_model_changes(self):
+        product, = self.products(1)
+        choices.ChoiceCache(Product.objects.all()).prefetch([product.pk])
+        with self.assertNumQueries(0):
+            self.assertEqual(choices.ChoiceCache(Product.objects.all()).get(product.pk).name, product.name)
+
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(choices.ChoiceCache(Product.objects.all()).get(product.pk).name, 'Renamed')
+
+    @override_settings(SHOP_CHOICE_CACHE_TIMEOUT=300)
+    def test_invalidation_waits_for_the_commit(self):
+        product, = self.products(1)
+        before = choices.version(Product)
+        with self.captureOnCommitCallbacks() as callbacks:
+            product.save()
+        self.assertEqual(choices.version(Product), before)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(choices.version(Product), before + 1)
+
+    @override_settings(SHOP_CHOICE_CACHE_TIMEOUT=300)
+    def test_menu_options_follow_new_artists(self):
+        options = list(ProductForm().fields['artist'].choices)
+        self.assertEqual(len(options), Artist.objects.count() + 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(ProductForm().fields['artist'].choices), options)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            artist = Artist.objects.create(name='Newcomer', contact_information='x')
+        self.assertIn((artist.pk, 'Newcomer'), list(ProductForm().fields['artist'].choices))
+
+    @override_settings(SHOP_CHOICE_CACHE_TIMEOUT=0)
+    def test_menu_options_are_queried_without_a_timeout(self):
+        list(ProductForm().fields['artist'].choices)
+        with self.assertNumQueries(2):  # Django's COUNT for len(), then the options
+            list(ProductForm().fields['artist'].choices)
@@ -0,0 +1,99 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+import pyarrow.ipc
+import pyarrow.parquet
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from shop import columnar, ledger, settlements
+from shop.archive import archive_before
+from shop.models import Product, Sale, SaleItem
+
+from .base import ShopTestCase
+
+
+class ColumnarExportTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def export(self, **options):
+        return columnar.export_sales(self.directory, chunk_size=7, **options)
+
+    def manifest(self):
+        with open(os.path.join(self.directory, columnar.MANIFEST)) as manifest:
+            return json.load(manifest)
+
+    def test_partitions_hold_every_sale_line(self):
+        result = self.export()
+        months = sorted(columnar.month_fingerprints())
+        self.assertEqual((result['written'], result['removed'], result['unchanged']), (months, [], 0))
+        manifest = self.manifest()
+        self.assertEqual(manifest['format'], 'parquet')
+        self.assertEqual(sorted(manifest['partitions']), months)
+
+        table = pyarrow.parquet.read_table(os.path.join(self.directory, manifest['partitions'][months[-1]]['file']))
+        self.assertEqual(table.schema, columnar.schema())
+        self.assertEqual(table.num_rows, manifest['partitions'][months[-1]]['rows'])
+        self.assertEqual(sum(partition['rows'] for partition in manifest['partitions'].values()), SaleItem.objects.count())
+        item = SaleItem.objects.select_related('product__artist').get(pk=table.column('item_id')[0].as_py())
+        self.assertEqual(table.column('artist_name')[0].as_py(), item.product.artist.name)
+        self.assertEqual(table.column('unit_price')[0].as_py(), item.unit_price)
+        self.assertFalse([name for name in os.listdir(self.directory) if name.startswith('.')])
+
+    def test_later_runs_only_write_changed_months(self):
+        self.export()
+        self.assertEqual(self.export()['written'], [])
+
+        item = SaleItem.objects.select_related('sale').order_by('pk').first()
+        item.quantity += 1
+        item.save()
+        month = timezone.localtime(item.sale.sale_date).strftime('%Y-%m')
+        result = self.export()
+        self.assertEqual(result['written'], [month])
+        self.assertEqual(result['unchanged'], len(columnar.month_fingerprints()) - 1)
+
+        product = Product.objects.first()
+        product.name = 'Renamed'
+        product.save()
+        self.assertEqual(self.export()['written'], sorted(columnar.month_fingerprints()))
+
+    def test_months_without_sales_are_removed_unless_archived(self):
+        self.export()
+        months = sorted(columnar.month_fingerprints())
+        start, end = settlements.month_bounds(datetime.date.fromisoformat(f'{months[0]}-01'))
+        Sale.objects.filter(sale_date__gte=ledger.day_start(start), sale_date__lt=ledger.day_start(end + datetime.timedelta(days=1))).delete()
+        self.assertEqual(self.export()['removed'], [months[0]])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f'month={months[0]}')))
+
+        cutoff = timezone.localdate().replace(day=1)
+        archive_before(cutoff)
+        result = self.export(full=True)
+        archived = [month for month in months[1:] if month < cutoff.strftime('%Y-%m')]
+        self.assertTrue(archived)
+        self.assertEqual(result['removed'], [])
+        for month in archived:
+            self.assertTrue(os.path.exists(os.path.join(self.directory, f'month={month}')))
+
+    def test_arrow_format_and_command(self):
+        call_command('export_sales_columnar', self.directory, format='arrow', stdout=StringIO())
+        manifest = self.manifest()
+        self.assertEqual(manifest['format'], 'arrow')
+        rows = 0
+        for partition in manifest['partitions'].values():
+            with pyarrow.ipc.open_file(os.path.join(self.directory, partition['file'])) as reader:
+                rows += reader.read_all().num_rows
+        self.assertEqual(rows, SaleItem.objects.count())
+
+        out = StringIO()
+        call_command('export_sales_columnar', self.directory, format='arrow', stdout=out)
+        self.assertIn(f"Wrote 0 partition(s), removed 0, {len(manifest['partitions'])} unchanged.", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('export_sales_columnar', self.directory, chunk_size=0, stdout=StringIO())
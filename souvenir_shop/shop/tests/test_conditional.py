@@ -0,0 +1,68 @@
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+from django.urls import reverse
+
+from shop import views
+from shop.models import Artist, Sale
+
+from .base import ShopTestCase
+
+
+class ConditionalGetTests(ShopTestCase):
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_list_is_not_modified(self):
+        url = reverse('shop:product_list')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # Nothing but the validator's two aggregates runs for a 304.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(self.client.head(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_list_changes_after_writes(self):
+        url = reverse('shop:product_list')
+        response = self.client.get(url)
+        # Product rows show the artist name.
+        artist = Artist.objects.first()
+        artist.name = 'Renamed'
+        artist.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        url = reverse('shop:sale_list')
+        response = self.client.get(url)
+        Sale.objects.order_by('pk').last().delete()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_detail_uses_last_modified_too(self):
+        sale = Sale.objects.order_by('pk').first()
+        url = reverse('shop:sale_detail', args=[sale.pk])
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        item = sale.items.first()
+        item.quantity += 1
+        item.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+        self.assertEqual(self.client.get(reverse('shop:sale_detail', args=[0])).status_code, 404)
+
+    def test_writes_are_never_short_circuited(self):
+        url = reverse('shop:artist_create')
+        self.assertEqual(self.client.post(url, {'name': 'New', 'contact_information': 'x'}, HTTP_IF_NONE_MATCH='*').status_code, 302)
+
+    def test_dashboard_is_validated_by_the_kpi_generation(self):
+        url = reverse('shop:dashboard')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.write_through_views()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_async_view(self):
+        response = self.client.get(reverse('shop:dashboard'))
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(async_to_sync(views.dashboard_async)(request).status_code, 304)
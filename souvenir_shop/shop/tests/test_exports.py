@@ -0,0 +1,63 @@
+import csv
+import datetime
+import io
+import json
+from decimal import Decimal
+
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import exports, ledger
+from shop.models import SaleItem, Transaction
+
+from .base import ShopTestCase
+
+
+class ExportTests(ShopTestCase):
+    def download(self, dataset, **params):
+        response = self.client.get(reverse('shop:export_data', args=[dataset]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_has_a_header_and_every_row(self):
+        response, content = self.download('transactions')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.csv"')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), Transaction.objects.count())
+        self.assertEqual(list(rows[0]), [
+            'id', 'transaction_date', 'transaction_type', 'description', 'amount',
+            'related_purchase_id', 'related_sale_id', 'notes',
+        ])
+        self.assertEqual(sum(Decimal(row['amount']) for row in rows), sum(Transaction.objects.values_list('amount', flat=True)))
+
+    def test_jsonl_sale_lines_are_denormalized(self):
+        response, content = self.download('sales', format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(lines), SaleItem.objects.count())
+        item = SaleItem.objects.select_related('product', 'sale').get(pk=lines[0]['item_id'])
+        self.assertEqual(lines[0]['product_name'], item.product.name)
+        self.assertEqual(Decimal(lines[0]['sale_total']), item.sale.total_amount)
+
+    def test_date_range_is_inclusive(self):
+        day = timezone.localdate() - datetime.timedelta(days=10)
+        _, content = self.download('transactions', start=day.isoformat(), end=day.isoformat())
+        rows = list(csv.DictReader(io.StringIO(content)))
+        expected = Transaction.objects.filter(
+            transaction_date__gte=ledger.day_start(day),
+            transaction_date__lt=ledger.day_start(day + datetime.timedelta(days=1)),
+        )
+        self.assertEqual(sorted(int(row['id']) for row in rows), sorted(expected.values_list('pk', flat=True)))
+
+    def test_rows_are_read_in_chunks(self):
+        rows = exports.transaction_rows()
+        with self.assertNumQueries(1):
+            lines = list(exports.stream_csv(rows))
+        self.assertEqual(len(lines), Transaction.objects.count() + 1)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(reverse('shop:export_data', args=['nothing'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('shop:export_data', args=['sales']), {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('shop:export_data', args=['sales']), {'start': '2025-02-30'}).status_code, 400)
@@ -0,0 +1,80 @@
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from shop.models import Artist, ImportRef, Product, Purchase, Sale, SaleItem, Transaction
+from shop.rollups import rebuild_rollups
+from shop.stock import expected_stock
+
+from .base import ShopTestCase
+
+FILES = {
+    'artists': "name,contact_information,notes\nAna,ana@example.com,\nBen,ben@example.com,potter\n",
+    'products': (
+        "name,description,purchase_price,selling_price,stock_quantity,artist\n"
+        "Import Vase,,10.00,25.00,2,Ben\nImport Card,,1.00,3.50,0,Ana\n"
+    ),
+    'purchases': "ref,purchase_date,artist,notes\nP1,2025-03-01,Ben,\nP2,2025-03-02 10:00,Ana,\n",
+    'purchase_items': "purchase_ref,product,quantity,unit_price\nP1,Import Vase,5,\nP2,Import Card,100,0.90\n",
+    'sales': "ref,sale_date,notes\nS1,2025-03-05 12:00,\nS2,2025-03-06,\nS3,2025-03-06,\n",
+    'sale_items': (
+        "sale_ref,product,quantity,unit_price\n"
+        "S1,Import Vase,2,\nS1,Import Card,10,\nS2,Import Card,5,3.00\nS3,Import Vase,1,\nS3,Import Card,1,\n"
+    ),
+}
+
+
+class ImportTests(ShopTestCase):
+    def run_import(self, chunk_size=2, **overrides):
+        files = {**FILES, **overrides}
+        with tempfile.TemporaryDirectory() as directory:
+            options = {}
+            for name, content in files.items():
+                path = os.path.join(directory, f'{name}.csv')
+                with open(path, 'w') as handle:
+                    handle.write(content)
+                options[name] = path
+            call_command('import_shop_data', chunk_size=chunk_size, stdout=StringIO(), **options)
+
+    def test_import_derives_totals_stock_and_transactions(self):
+        sales_before, transactions_before = Sale.objects.count(), Transaction.objects.count()
+        self.run_import()
+
+        vase, card = Product.objects.get(name='Import Vase'), Product.objects.get(name='Import Card')
+        self.assertEqual((vase.stock_quantity, card.stock_quantity), (2 + 5 - 3, 100 - 16))
+        self.assertEqual(Sale.objects.count(), sales_before + 3)
+        self.assertEqual(Transaction.objects.count(), transactions_before + 5)
+        s1 = Sale.objects.get(transactions__description='Sale on 2025-03-05')
+        self.assertEqual(s1.total_amount, Decimal('85.00'))
+        self.assertEqual(Purchase.objects.get(items__product=card).total_amount, Decimal('90.00'))
+        self.assertEqual(SaleItem.objects.get(sale=s1, product=vase).unit_cost, Decimal('10.00'))
+        self.assertFalse(ImportRef.objects.exists())
+
+        for row in expected_stock():
+            self.assertEqual(row['stock_quantity'], row['expected'], row['name'])
+        call_command('rebuild_balances', check=True, stdout=StringIO())
+        fields = ('day', 'product_id', 'quantity_sold', 'sales_cost', 'quantity_purchased', 'purchase_cost')
+        imported = set(vase.daily_rollups.values_list(*fields)) | set(card.daily_rollups.values_list(*fields))
+        rebuild_rollups()
+        self.assertEqual(set(vase.daily_rollups.values_list(*fields)) | set(card.daily_rollups.values_list(*fields)), imported)
+
+    def test_product_listed_twice_names_the_line(self):
+        sale_items = FILES['sale_items'] + "S1,Import Vase,1,\n"
+        with self.assertRaisesMessage(CommandError, "sale_items.csv, line 7: ValueError(\"product 'Import Vase' is listed twice for sale ref 'S1'\")"):
+            self.run_import(sale_items=sale_items)
+        # Nothing of the run is kept.
+        self.assertFalse(Artist.objects.filter(name='Ana').exists())
+        self.assertFalse(ImportRef.objects.exists())
+
+    def test_duplicate_ref_names_the_line(self):
+        with self.assertRaisesMessage(CommandError, "sales.csv, line 5: ValueError(\"duplicate ref 'S1'\")"):
+            self.run_import(sales=FILES['sales'] + "S1,2025-03-07,\n")
+
+    def test_unknown_ref_names_the_line(self):
+        with self.assertRaisesMessage(CommandError, "purchase_items.csv, line 3: ValueError(\"unknown purchase ref 'P9'\")"):
+            self.run_import(purchase_items="purchase_ref,product,quantity,unit_price\nP1,Import Vase,5,\nP9,Import Card,1,\n")
+        self.assertFalse(Product.objects.filter(name='Import Vase').exists())
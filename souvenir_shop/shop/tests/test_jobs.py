@@ -0,0 +1,97 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import jobs
+from shop.models import DailyProductRollup, Job
+from shop.rollups import rebuild_rollups
+
+from .base import ShopTestCase, item_data
+
+
+def failing(payload):
+    raise RuntimeError("boom")
+
+
+FAILING_TASKS = {'rebuild_rollups': (failing, jobs._earliest_since)}
+
+
+class JobQueueTests(ShopTestCase):
+    def test_pending_jobs_coalesce_to_the_earliest_day(self):
+        today = timezone.localdate()
+        first = jobs.enqueue_since('rebuild_rollups', today)
+        second = jobs.enqueue_since('rebuild_rollups', today - datetime.timedelta(days=3))
+        jobs.enqueue_since('rebuild_rollups', today - datetime.timedelta(days=1))
+        self.assertEqual(first.pk, second.pk)
+        job = Job.objects.get()
+        self.assertEqual(job.payload, {'since': (today - datetime.timedelta(days=3)).isoformat()})
+        self.assertEqual(job.coalesced, 2)
+        self.assertEqual(jobs.stats()['counters']['coalesced'], 2)
+
+    @override_settings(SHOP_BOOKKEEPING='queue')
+    def test_worker_catches_up_with_queued_writes(self):
+        product, = self.products(1)
+        response = self.client.post(reverse('shop:sale_create'), {'notes': '', **item_data([(product, 1)])})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(Job.objects.values_list('task', flat=True)), {'rebuild_balances', 'rebuild_rollups'})
+
+        call_command('run_shop_worker', once=True, stdout=StringIO())
+        self.assertFalse(Job.objects.exists())
+        call_command('rebuild_balances', check=True, stdout=StringIO())
+        fields = ('day', 'product_id', 'quantity_sold', 'sales_revenue', 'sales_cost')
+        worker = set(DailyProductRollup.objects.values_list(*fields))
+        rebuild_rollups()
+        self.assertEqual(set(DailyProductRollup.objects.values_list(*fields)), worker)
+
+    @mock.patch.dict(jobs.TASKS, FAILING_TASKS)
+    def test_failed_job_is_retried_with_backoff_then_marked_failed(self):
+        jobs.enqueue_since('rebuild_rollups', timezone.localdate())
+        job = jobs.claim(visibility_timeout=60)
+        self.assertFalse(jobs.run(job, max_attempts=2))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('boom', job.last_error)
+        self.assertIsNone(jobs.claim(visibility_timeout=60))  # Not due yet
+
+        Job.objects.update(run_after=timezone.now())
+        job = jobs.claim(visibility_timeout=60)
+        self.assertFalse(jobs.run(job, max_attempts=2))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(jobs.stats()['jobs'][Job.FAILED], 1)
+
+    @mock.patch.dict(jobs.TASKS, FAILING_TASKS)
+    def test_retry_folds_into_a_newer_pending_job(self):
+        today = timezone.localdate()
+        jobs.enqueue_since('rebuild_rollups', today)
+        job = jobs.claim(visibility_timeout=60)
+        jobs.enqueue_since('rebuild_rollups', today - datetime.timedelta(days=1))  # Arrives while the first one runs
+        jobs.run(job, max_attempts=5)
+        pending = Job.objects.get()
+        self.assertEqual(pending.status, Job.PENDING)
+        self.assertEqual(pending.payload, {'since': (today - datetime.timedelta(days=1)).isoformat()})
+        self.assertEqual((pending.attempts, pending.coalesced), (1, 1))
+
+    def test_expired_claim_becomes_visible_again(self):
+        jobs.enqueue_since('rebuild_balances', timezone.localdate())
+        job = jobs.claim(visibility_timeout=60)
+        self.assertIsNone(jobs.claim(visibility_timeout=60))
+        Job.objects.update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        again = jobs.claim(visibility_timeout=60)
+        self.assertEqual((again.pk, again.attempts), (job.pk, 2))
+        self.assertEqual(jobs.stats()['counters']['visibility_timeouts'], 1)
+        # The first worker's lock is gone, so it cannot delete the job any more.
+        self.assertTrue(jobs.run(job, max_attempts=5))
+        self.assertTrue(Job.objects.filter(pk=job.pk).exists())
+
+    def test_job_stats_are_staff_only(self):
+        url = reverse('shop:job_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.log_in_staff()
+        self.assertEqual(set(self.client.get(url).json()), {'jobs', 'counters'})
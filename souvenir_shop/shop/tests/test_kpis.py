@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.urls import reverse
+
+from shop import kpis
+from shop.models import DailyProductRollup
+
+from .base import ShopTestCase, item_data
+
+
+class WidgetCacheTests(ShopTestCase):
+    def test_second_read_is_a_cache_hit(self):
+        value = kpis.get_widget('profit')
+        with self.assertNumQueries(0):
+            self.assertEqual(kpis.get_widget('profit'), value)
+        self.assertEqual(kpis.cache_stats()['profit'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_invalidation_waits_for_commit(self):
+        kpis.get_widget('sales_totals')
+        generation = kpis.generation()
+        with self.captureOnCommitCallbacks() as callbacks:
+            kpis.invalidate_for('Sale')
+        self.assertIsNotNone(cache.get(kpis._key('sales_totals')))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(kpis._key('sales_totals')))
+        self.assertEqual(kpis.generation(), generation + 1)
+
+    def test_unrelated_write_keeps_the_widget(self):
+        kpis.get_widget('low_stock')
+        with self.captureOnCommitCallbacks(execute=True):
+            kpis.invalidate_for('Balance')
+        self.assertIsNotNone(cache.get(kpis._key('low_stock')))
+
+    def test_sale_refreshes_the_dashboard(self):
+        before = kpis.get_widget('sales_totals')
+        product, = self.products(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('shop:sale_create'), {'notes': '', **item_data([(product, 2)])})
+        self.assertEqual(response.status_code, 302)
+        after = kpis.get_widget('sales_totals')
+        self.assertEqual(after['last_7_days'], before['last_7_days'] + 2 * product.selling_price)
+        self.assertTrue(DailyProductRollup.objects.filter(product=product, quantity_sold__gte=2).exists())
+
+    def test_cache_stats_are_staff_only(self):
+        url = reverse('shop:dashboard_cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.log_in_staff()
+        self.client.get(reverse('shop:dashboard'))
+        stats = self.client.get(url).json()
+        self.assertEqual(set(stats), set(kpis.WIDGETS))
+        self.assertEqual(stats['profit']['misses'], 1)
@@ -0,0 +1,59 @@
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from shop.models import Sale
+from shop.pagination import decode_cursor, encode_cursor, keyset_paginate
+
+from .base import ShopTestCase
+
+ORDERING = ['-sale_date', '-pk']
+
+
+class KeysetPaginationTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        # Rows sharing a sale_date must still get one stable position each.
+        tied = timezone.now().replace(microsecond=0)
+        Sale.objects.bulk_create([Sale(sale_date=tied, total_amount=0) for _ in range(5)])
+        self.expected = list(Sale.objects.order_by(*ORDERING).values_list('pk', flat=True))
+
+    def page(self, **params):
+        return keyset_paginate(RequestFactory().get('/', params), Sale.objects.all(), ORDERING, per_page=7)
+
+    def test_next_cursors_walk_every_row_once(self):
+        seen, page = [], self.page()
+        self.assertFalse(page.has_previous)
+        while True:
+            seen += [sale.pk for sale in page]
+            if not page.has_next:
+                break
+            page = self.page(after=page.next_cursor)
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_cursor_returns_the_same_page(self):
+        first = self.page()
+        second = self.page(after=first.next_cursor)
+        third = self.page(after=second.next_cursor)
+        back = self.page(before=third.prev_cursor)
+        self.assertEqual([sale.pk for sale in back], [sale.pk for sale in second])
+        self.assertEqual([sale.pk for sale in self.page(before=second.prev_cursor)], [sale.pk for sale in first])
+
+    def test_invalid_cursor_starts_from_the_top(self):
+        page = self.page(after='not-a-cursor')
+        self.assertEqual([sale.pk for sale in page], self.expected[:7])
+        fields = [Sale._meta.pk]
+        self.assertIsNone(decode_cursor(encode_cursor([1, 2]), fields))
+        self.assertEqual(decode_cursor(encode_cursor([3]), fields), [3])
+
+    def test_deep_page_is_one_query(self):
+        cursor = self.page().next_cursor
+        with self.assertNumQueries(1):
+            list(self.page(after=cursor))
+
+    def test_list_view_links_the_next_page(self):
+        response = self.client.get(reverse('shop:sale_list'))
+        self.assertEqual(response.status_code, 200)
+        page = response.context['sales']
+        self.assertTrue(page.has_next)
+        self.assertContains(response, f'after={page.next_cursor}')
@@ -0,0 +1,84 @@
+import datetime
+import math
+import statistics
+from collections import defaultdict
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import kpis, reorder
+from shop.models import Artist, DailyProductRollup, Product, ReorderForecast
+
+from .base import ShopTestCase
+
+
+@override_settings(SHOP_REORDER_HISTORY_DAYS=28, SHOP_REORDER_LEAD_TIME_DAYS=7, SHOP_REORDER_COVER_DAYS=14, SHOP_REORDER_SAFETY_FACTOR=2)
+class ReorderTests(ShopTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # A product selling exactly two a day: no deviation, so no safety stock.
+        cls.artist = Artist.objects.create(name='Steady Supplier', contact_information='x')
+        cls.steady = Product.objects.create(
+            name='Steady Seller', purchase_price=Decimal('4.00'), selling_price=Decimal('9.00'), stock_quantity=10, artist=cls.artist,
+        )
+        today = timezone.localdate()
+        DailyProductRollup.objects.bulk_create([
+            DailyProductRollup(day=today - datetime.timedelta(days=offset), product=cls.steady, quantity_sold=2)
+            for offset in range(40)
+        ])
+
+    def test_forecast_of_a_steady_seller(self):
+        forecast = next(f for f in reorder.compute_forecasts() if f.product_id == self.steady.pk)
+        self.assertEqual((forecast.daily_velocity, forecast.demand_deviation), (Decimal('2.000'), Decimal('0.000')))
+        self.assertEqual((forecast.reorder_point, forecast.target_stock), (2 * 7, 2 * (7 + 14)))
+
+    def test_forecasts_match_the_rollups(self):
+        today = timezone.localdate()
+        sold = defaultdict(lambda: [0] * 28)
+        for product_id, day, quantity in DailyProductRollup.objects.filter(
+            day__gt=today - datetime.timedelta(days=28), day__lte=today,
+        ).values_list('product_id', 'day', 'quantity_sold'):
+            sold[product_id][(day - today).days + 27] += quantity
+        forecasts = reorder.compute_forecasts()
+        self.assertEqual(len(forecasts), Product.objects.count())
+        for forecast in forecasts:
+            days = sold[forecast.product_id]
+            mean, deviation = statistics.fmean(days), statistics.pstdev(days)
+            self.assertAlmostEqual(float(forecast.daily_velocity), mean, places=3)
+            self.assertAlmostEqual(float(forecast.demand_deviation), deviation, places=3)
+            self.assertEqual(forecast.reorder_point, math.ceil(mean * 7 + 2 * deviation * math.sqrt(7)))
+
+    def test_due_for_reorder(self):
+        call_command('refresh_reorder_forecasts', stdout=StringIO())
+        self.assertEqual(ReorderForecast.objects.count(), Product.objects.count())
+        line = reorder.due_for_reorder().get(product=self.steady)
+        self.assertEqual((line.stock_quantity, line.suggested_quantity, line.days_of_cover), (10, 42 - 10, 5.0))
+        for line in reorder.due_for_reorder():
+            self.assertGreater(line.daily_velocity, 0)
+            self.assertLessEqual(line.stock_quantity, line.reorder_point)
+
+        Product.objects.filter(pk=self.steady.pk).update(stock_quantity=15)
+        self.assertFalse(reorder.due_for_reorder().filter(product=self.steady).exists())
+
+    def test_low_stock_widget_uses_the_forecasts(self):
+        ReorderForecast.objects.all().delete()
+        self.assertEqual(kpis.get_widget('low_stock'), list(Product.objects.filter(stock_quantity__lt=5).values('pk', 'name', 'stock_quantity')))
+        with self.captureOnCommitCallbacks(execute=True):
+            reorder.refresh_forecasts()
+        widget = kpis.get_widget('low_stock')
+        self.assertEqual(widget, kpis.low_stock())
+        self.assertIn(self.steady.pk, [row['pk'] for row in widget])
+
+    def test_reorder_list_groups_lines_by_artist(self):
+        reorder.refresh_forecasts()
+        response = self.client.get(reverse('shop:reorder_list'))
+        artists = response.context['artists']
+        self.assertEqual(len({group['artist'].pk for group in artists}), len(artists))
+        steady, = [group for group in artists if group['artist'] == self.artist]
+        self.assertEqual(steady['total_cost'], 32 * Decimal('4.00'))
+        self.assertContains(response, 'Steady Seller')
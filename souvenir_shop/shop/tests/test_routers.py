@@ -0,0 +1,83 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import reverse
+
+from shop.models import Sale
+from shop.routers import PRIMARY, REPLICA, STICKY_COOKIE, ReplicaRouter, primary_reads, replica_reads
+
+from .base import ShopTestCase
+
+
+def with_replica():
+    """
+    Pretends a ``replica`` alias is configured; the router only checks for it,
+    so no connection to it is ever opened here.
+    """
+    return mock.patch('shop.routers.replica_configured', lambda: True)
+
+
+@replica_reads
+def read_database(request):
+    return ReplicaRouter().db_for_read(Sale)
+
+
+@replica_reads
+async def read_database_async(request):
+    return ReplicaRouter().db_for_read(Sale)
+
+
+@replica_reads
+def read_database_for_cache(request):
+    with primary_reads():
+        return ReplicaRouter().db_for_read(Sale)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def request(self, **cookies):
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies)
+        return request
+
+    def test_reads_stay_on_the_primary_without_a_replica(self):
+        self.assertEqual(read_database(self.request()), PRIMARY)
+
+    @with_replica()
+    def test_report_views_read_from_the_replica(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Sale), PRIMARY)
+        self.assertEqual(read_database(self.request()), REPLICA)
+        self.assertEqual(async_to_sync(read_database_async)(self.request()), REPLICA)
+        self.assertEqual(router.db_for_read(Sale), PRIMARY)
+        self.assertEqual(router.db_for_write(Sale), PRIMARY)
+        self.assertFalse(router.allow_migrate(REPLICA, 'shop'))
+
+    @with_replica()
+    def test_sticky_cookie_pins_the_client_to_the_primary(self):
+        self.assertEqual(read_database(self.request(**{STICKY_COOKIE: '1'})), PRIMARY)
+
+    @with_replica()
+    def test_primary_reads_override_the_replica(self):
+        self.assertEqual(read_database_for_cache(self.request()), PRIMARY)
+
+
+class StickinessMiddlewareTests(ShopTestCase):
+    @with_replica()
+    def test_successful_write_sets_the_cookie(self):
+        response = self.client.post(reverse('shop:artist_create'), {'name': 'New Artist', 'contact_information': 'x'})
+        self.assertEqual(response.status_code, 302)
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.SHOP_REPLICA_STICKY_SECONDS)
+        self.assertTrue(cookie['httponly'])
+
+    @with_replica()
+    def test_failed_write_does_not_set_the_cookie(self):
+        response = self.client.post(reverse('shop:sale_delete', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_no_cookie_without_a_replica(self):
+        response = self.client.post(reverse('shop:artist_create'), {'name': 'New Artist', 'contact_information': 'x'})
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
@@ -0,0 +1,72 @@
+import importlib
+from decimal import Decimal
+
+from django.urls import reverse
+
+from shop import search
+from shop.models import Artist, Product, ProductSearchToken
+
+from .base import ShopTestCase
+
+
+class SearchTests(ShopTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.artist = Artist.objects.create(name='Émile Quillon', contact_information='emile@example.com')
+        cls.bowl = cls.product('Zebrawood Bowl', 'Turned by hand')
+        cls.board = cls.product('Zebrawood Board', 'Oiled')
+
+    @classmethod
+    def product(cls, name, description, artist=None):
+        return Product.objects.create(
+            name=name, description=description, purchase_price=Decimal('5.00'), selling_price=Decimal('12.00'),
+            artist=artist or cls.artist,
+        )
+
+    def test_every_word_matches_a_prefix(self):
+        self.assertEqual(search.search_products('zebra'), [self.board, self.bowl])
+        self.assertEqual(search.search_products('ZEBRAWOOD bo'), [self.board, self.bowl])
+        self.assertEqual(search.search_products('zebra turned'), [self.bowl])
+        self.assertEqual(search.search_products('zebra turned', limit=0), [])
+        self.assertEqual(search.search_products('  ,, '), [])
+
+    def test_accents_and_artist_names(self):
+        self.assertEqual(search.search_products('emile bowl'), [self.bowl])
+        self.assertEqual(search.search_products('Quillón'), [self.board, self.bowl])
+
+    def test_artist_filter(self):
+        other = Artist.objects.create(name='Other Turner', contact_information='x')
+        plate = self.product('Zebrawood Plate', '', artist=other)
+        self.assertEqual(search.search_products('zebrawood', artist=other.pk), [plate])
+
+    def test_typos_with_the_right_first_letter(self):
+        self.assertEqual(search.search_products('zebrawod bowl'), [self.bowl])
+        self.assertEqual(search.search_products('quilon'), [self.board, self.bowl])
+        # A typo in the first letter is not matched; see search_products.
+        self.assertEqual(search.search_products('xebrawood'), [])
+
+    def test_index_follows_renames(self):
+        self.bowl.name = 'Walnut Bowl'
+        self.bowl.save()
+        self.assertEqual(search.search_products('walnut'), [self.bowl])
+        self.assertEqual(search.search_products('zebrawood'), [self.board])
+        self.artist.name = 'Renamed Maker'
+        self.artist.save()
+        self.assertEqual(search.search_products('renamed'), [self.bowl, self.board])
+
+    def test_migration_tokenizer_matches_the_index(self):
+        migration = importlib.import_module('shop.migrations.0007_product_search_token')
+        for product in (self.bowl, self.board):
+            self.assertEqual(
+                migration._product_tokens(product.name, product.description, self.artist.name),
+                set(ProductSearchToken.objects.filter(product=product).values_list('token', flat=True)),
+            )
+
+    def test_view(self):
+        url = reverse('shop:product_search')
+        results = self.client.get(url, {'q': 'zebrawood', 'limit': 1}).json()['results']
+        self.assertEqual([result['id'] for result in results], [self.board.pk])
+        self.assertEqual(results[0]['artist'], 'Émile Quillon')
+        self.assertEqual(self.client.get(url, {'q': 'zebrawood', 'limit': 'many'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'q': 'zebrawood', 'artist': 'x'}).status_code, 400)
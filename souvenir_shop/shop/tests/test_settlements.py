@@ -0,0 +1,93 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import ledger, settlements
+from shop.models import Sale, SaleItem
+
+from .base import ShopTestCase
+
+
+class SettlementTests(ShopTestCase):
+    def last_month(self):
+        return timezone.localdate().replace(day=1) - datetime.timedelta(days=1)
+
+    def expected(self, start, end):
+        """
+        Revenue and cost per product, summed item by item.
+        """
+        totals = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+        for item in SaleItem.objects.select_related('product').filter(
+            sale__sale_date__gte=ledger.day_start(start), sale__sale_date__lt=ledger.day_start(end + datetime.timedelta(days=1)),
+        ):
+            line = totals[item.product_id]
+            line[0] += item.quantity
+            line[1] += item.quantity * item.unit_price
+            line[2] += item.quantity * item.product.purchase_price
+        return {pk: tuple(line) for pk, line in totals.items()}
+
+    def test_settlement_matches_the_items(self):
+        start, end = settlements.month_bounds(self.last_month())
+        report = settlements.settlement(start, end)
+        lines = {line['product_id']: line for artist in report['artists'] for line in artist['products']}
+        self.assertEqual({pk: (line['quantity'], line['revenue'], line['cost']) for pk, line in lines.items()}, self.expected(start, end))
+        for artist in report['artists']:
+            self.assertEqual(artist['revenue'], sum(line['revenue'] for line in artist['products']))
+            self.assertEqual(artist['margin'], artist['revenue'] - artist['cost'])
+        self.assertEqual(report['totals']['quantity'], sum(line['quantity'] for line in lines.values()))
+
+    def test_closed_month_is_cached_until_one_of_its_sales_changes(self):
+        month = self.last_month()
+        report = settlements.month_settlement(month)
+        with self.assertNumQueries(0):
+            self.assertEqual(settlements.month_settlement(month), report)
+
+        start, end = settlements.month_bounds(month)
+        sale = Sale.objects.filter(sale_date__gte=ledger.day_start(start), sale_date__lt=ledger.day_start(end)).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+        self.assertLess(settlements.month_settlement(month)['totals']['quantity'], report['totals']['quantity'])
+
+    def test_moved_sale_invalidates_both_months(self):
+        month = self.last_month()
+        earlier = month.replace(day=1) - datetime.timedelta(days=1)
+        reports = {day: settlements.month_settlement(day) for day in (month, earlier)}
+
+        start, end = settlements.month_bounds(month)
+        sale = Sale.objects.filter(sale_date__gte=ledger.day_start(start), sale_date__lt=ledger.day_start(end)).first()
+        quantity = sum(sale.items.values_list('quantity', flat=True))
+        sale.sale_date = ledger.day_start(earlier) + datetime.timedelta(hours=12)
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.save()
+        self.assertEqual(settlements.month_settlement(month)['totals']['quantity'], reports[month]['totals']['quantity'] - quantity)
+        self.assertEqual(settlements.month_settlement(earlier)['totals']['quantity'], reports[earlier]['totals']['quantity'] + quantity)
+
+    def test_current_month_is_never_cached(self):
+        today = timezone.localdate()
+        settlements.month_settlement(today)
+        product, = self.products(1)
+        self.checkout(('now', None, product, 2))
+        start, end = settlements.month_bounds(today)
+        self.assertEqual(settlements.month_settlement(today)['totals']['quantity'], sum(line[0] for line in self.expected(start, end).values()))
+
+    def test_view_and_command(self):
+        month = self.last_month()
+        response = self.client.get(reverse('shop:settlement_report'), {'month': month.strftime('%Y-%m')})
+        self.assertEqual(response.context['report'], settlements.month_settlement(month))
+        start = month - datetime.timedelta(days=3)
+        response = self.client.get(reverse('shop:settlement_report'), {'start': start.isoformat(), 'end': month.isoformat()})
+        self.assertEqual(response.context['report']['totals'], settlements.settlement(start, month)['totals'])
+        for params in ({'month': '2025-13'}, {'start': month.isoformat()}, {'start': month.isoformat(), 'end': start.isoformat()}):
+            self.assertEqual(self.client.get(reverse('shop:settlement_report'), params).status_code, 400)
+
+        out = StringIO()
+        call_command('settle_artists', month=month.strftime('%Y-%m'), stdout=out)
+        self.assertIn(f"{settlements.month_settlement(month)['totals']['quantity']} unit(s)", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('settle_artists', start='2025-01-01', stdout=StringIO())
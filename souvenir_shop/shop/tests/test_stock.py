@@ -0,0 +1,83 @@
+import datetime
+import importlib
+from collections import Counter
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.db import connection
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from shop import ledger, stock
+from shop.models import Product, PurchaseItem, SaleItem, StockMovement
+
+from .base import ShopTestCase
+
+
+class StockTests(ShopTestCase):
+    def stock_at_end_of(self, day):
+        """
+        Today's stock minus what was bought and plus what was sold after ``day``.
+        """
+        after = ledger.day_start(day + datetime.timedelta(days=1))
+        stocks = Counter(dict(Product.objects.values_list('pk', 'stock_quantity')))
+        for product_id, quantity in PurchaseItem.objects.filter(purchase__purchase_date__gte=after).values_list('product_id', 'quantity'):
+            stocks[product_id] -= quantity
+        for product_id, quantity in SaleItem.objects.filter(sale__sale_date__gte=after).values_list('product_id', 'quantity'):
+            stocks[product_id] += quantity
+        return stocks
+
+    def seed_like_migration(self):
+        """
+        Rebuilds the movements the way migration 0011 seeds them.
+        """
+        migration = importlib.import_module('shop.migrations.0011_stock_movement')
+        StockMovement.objects.all().delete()
+        with connection.cursor() as cursor:
+            for sql in migration.SEED_MOVEMENTS:
+                cursor.execute(sql)
+        migration.seed_opening_balances(apps, SimpleNamespace(connection=connection))
+
+    def test_movements_add_up_to_the_stock(self):
+        self.write_through_views()
+        for row in stock.expected_stock():
+            self.assertEqual(row['stock_quantity'], row['expected'], row['name'])
+
+    def test_seeded_opening_balance_predates_the_first_movement(self):
+        # Stock from before the shop recorded anything, explained by no item.
+        product, = self.products(1)
+        Product.objects.filter(pk=product.pk).update(stock_quantity=F('stock_quantity') + 7)
+        self.seed_like_migration()
+        self.assertTrue(StockMovement.objects.filter(kind='ADJUSTMENT', product=product).exists())
+        for row in stock.expected_stock():
+            self.assertEqual(row['stock_quantity'], row['expected'], row['name'])
+        for adjustment in StockMovement.objects.filter(kind='ADJUSTMENT'):
+            first = StockMovement.objects.filter(product=adjustment.product_id).exclude(pk=adjustment.pk).order_by('moved_at').first()
+            if first is not None:
+                self.assertLess(adjustment.moved_at, first.moved_at)
+
+        day = timezone.localdate() - datetime.timedelta(days=30)
+        expected = self.stock_at_end_of(day)
+        as_of = stock.stock_as_of(day)
+        self.assertTrue(as_of)
+        for product_id, quantity in as_of.items():
+            self.assertEqual(quantity, expected[product_id], product_id)
+
+    def test_stock_as_of_view(self):
+        product, = self.products(1)
+        day = timezone.localdate() - datetime.timedelta(days=10)
+        response = self.client.get(reverse('shop:stock_as_of'), {'date': day.isoformat(), 'product': product.pk})
+        self.assertEqual(response.json(), {'date': day.isoformat(), 'stock': {str(product.pk): stock.stock_as_of(day)[product.pk]}})
+        self.assertEqual(self.client.get(reverse('shop:stock_as_of'), {'date': day.isoformat(), 'product': 'x'}).status_code, 400)
+
+    def test_redating_of_opening_balances_seeded_on_migration_day(self):
+        product, = self.products(1)
+        Product.objects.filter(pk=product.pk).update(stock_quantity=F('stock_quantity') + 7)
+        self.seed_like_migration()
+        seeded = dict(StockMovement.objects.filter(kind='ADJUSTMENT').values_list('pk', 'moved_at'))
+        StockMovement.objects.filter(kind='ADJUSTMENT').update(moved_at=timezone.now())
+
+        migration = importlib.import_module('shop.migrations.0015_redate_opening_balances')
+        migration.redate_opening_balances(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(dict(StockMovement.objects.filter(kind='ADJUSTMENT').values_list('pk', 'moved_at')), seeded)
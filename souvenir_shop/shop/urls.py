@@ -11,6 +11,8 @@ urlpatterns = [
 
     # Product URLs
     path('products/', views.product_list, name='product_list'),
+    path('products/search/', views.product_search, name='product_search'),
+    path('products/stock/as-of/', views.stock_as_of, name='stock_as_of'),
     path('products/add/', views.product_create, name='product_create'),
     path('products/<int:pk>/edit/', views.product_update, name='product_update'),
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
@@ -37,7 +39,36 @@ urlpatterns = [
 
     # Balance URLs
     path('balances/', views.balance_list, name='balance_list'),
+    path('balances/as-of/', views.balance_as_of, name='balance_as_of'),
+    path('balances/chart/', views.balance_chart, name='balance_chart'),
+
+    # Settlement URLs
+    path('settlements/', views.settlement_report, name='settlement_report'),
+
+    # Reorder URLs
+    path('purchasing/reorder/', views.reorder_list, name='reorder_list'),
+
+    # Archive URLs
+    path('archive/', views.archive_index, name='archive_index'),
+    path('archive/sales/<int:pk>/', views.archived_sale_detail, name='archived_sale_detail'),
+    path('archive/purchases/<int:pk>/', views.archived_purchase_detail, name='archived_purchase_detail'),
+    path('archive/<int:year>/<int:month>/<str:dataset>/', views.archive_period, name='archive_period'),
+
+    # Export URLs
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
+
+    # POS API URLs
+    path('api/checkout/', views.api_checkout, name='api_checkout'),
 
     # Dashboard URL
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/cache-stats/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
+
+    # Background job URLs
+    path('jobs/stats/', views.job_stats, name='job_stats'),
+
+    # Profiling URLs
+    path('profiling/sql/', views.sql_profile, name='sql_profile'),
+    path('profiling/profiles/', views.profile_list, name='profile_list'),
+    path('profiling/profiles/<str:name>/', views.profile_download, name='profile_download'),
 ]
\ No newline at end of file
@@ -1,16 +1,40 @@
+import hmac
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.forms import inlineformset_factory
-from django.db import transaction
-from django.db.models import Sum, F
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, F
 from django.utils import timezone
-from .models import Artist, Product, Purchase, PurchaseItem, Sale, SaleItem, Transaction, Balance
-from .forms import ArtistForm, ProductForm, PurchaseForm, PurchaseItemForm, SaleForm, SaleItemForm, TransactionForm
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from .models import Artist, Product, Purchase, PurchaseItem, Sale, SaleItem, Transaction, Balance, StockMovement
+from .models import ArchivePeriod, ArchivedPurchase, ArchivedSale, ArchivedTransaction, ReorderForecast
+from .forms import ArtistForm, ProductForm, PurchaseForm, PurchaseItemForm, SaleForm, SaleItemForm, TransactionForm, ItemFormSet
+from .pagination import keyset_paginate
+from . import aio, conditional, exports, jobs, kpis, ledger, profiling, reorder, sampling, search, settlements, stock
+from .checkout import CheckoutError, checkout_batch
+from .ledger import get_current_balance, update_or_create_balance
+from .conditional import conditional_view
+from .rollups import apply_rollup_deltas, purchase_deltas, sale_deltas
+from .routers import replica_reads
+from .stock import adjust_stock, merge_deltas, stock_deltas, stock_movements
+from .writequeue import serialized_writes
 
 # Artist Views
+@replica_reads
+@conditional_view(conditional.artist_list_validator)
 def artist_list(request):
     artists = Artist.objects.all()
     return render(request, 'shop/artist_list.html', {'artists': artists})
 
+@serialized_writes
 def artist_create(request):
     if request.method == 'POST':
         form = ArtistForm(request.POST)
@@ -21,6 +45,7 @@ def artist_create(request):
         form = ArtistForm()
     return render(request, 'shop/artist_form.html', {'form': form, 'title': 'Add Artist'})
 
+@serialized_writes
 def artist_update(request, pk):
     artist = get_object_or_404(Artist, pk=pk)
     if request.method == 'POST':
@@ -32,6 +57,7 @@ def artist_update(request, pk):
         form = ArtistForm(instance=artist)
     return render(request, 'shop/artist_form.html', {'form': form, 'title': 'Edit Artist'})
 
+@serialized_writes
 def artist_delete(request, pk):
     artist = get_object_or_404(Artist, pk=pk)
     if request.method == 'POST':
@@ -40,31 +66,46 @@ def artist_delete(request, pk):
     return render(request, 'shop/artist_delete.html', {'artist': artist})
 
 # Product Views
+@replica_reads
+@conditional_view(conditional.product_list_validator)
 def product_list(request):
-    products = Product.objects.all()
+    products = keyset_paginate(request, Product.objects.select_related('artist'), ['pk'])
     return render(request, 'shop/product_list.html', {'products': products})
 
+@serialized_writes
 def product_create(request):
     if request.method == 'POST':
         form = ProductForm(request.POST)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                # The opening stock goes through the stock ledger like any other change.
+                product = form.save(commit=False)
+                opening, product.stock_quantity = product.stock_quantity, 0
+                product.save()
+                adjust_stock(stock_movements({product.pk: opening}, StockMovement.ADJUSTMENT, note='Opening stock'))
             return redirect('shop:product_list')
     else:
         form = ProductForm()
     return render(request, 'shop/product_form.html', {'form': form, 'title': 'Add Product'})
 
+@serialized_writes
 def product_update(request, pk):
     product = get_object_or_404(Product, pk=pk)
     if request.method == 'POST':
         form = ProductForm(request.POST, instance=product)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                # A changed stock count is recorded as an adjustment and added
+                # as a difference, so sales made meanwhile are not overwritten.
+                product = form.save(commit=False)
+                product.save(update_fields=[name for name in form.fields if name != 'stock_quantity'] + ['updated_at'])
+                adjust_stock(stock_movements({product.pk: form.stock_change()}, StockMovement.ADJUSTMENT, note='Stock count edited'))
             return redirect('shop:product_list')
     else:
         form = ProductForm(instance=product)
     return render(request, 'shop/product_form.html', {'form': form, 'title': 'Edit Product'})
 
+@serialized_writes
 def product_delete(request, pk):
     product = get_object_or_404(Product, pk=pk)
     if request.method == 'POST':
@@ -72,120 +113,211 @@ def product_delete(request, pk):
         return redirect('shop:product_list')
     return render(request, 'shop/product_delete.html', {'product': product})
 
+PRODUCT_SEARCH_MAX_RESULTS = 50
+
+@replica_reads
+def stock_as_of(request):
+    """
+    Stock per product at the end of ``date`` (default today) as JSON, from the
+    stock movements; ``product`` may be given several times to narrow it down.
+    """
+    value = request.GET.get('date')
+    try:
+        day = parse_date(value) if value else timezone.localdate()
+    except ValueError:
+        day = None
+    if day is None:
+        return JsonResponse({'error': 'Invalid date.'}, status=400)
+    product_ids = request.GET.getlist('product')
+    if not all(pk.isdigit() for pk in product_ids):
+        return JsonResponse({'error': 'Invalid product.'}, status=400)
+    quantities = stock.stock_as_of(day, [int(pk) for pk in product_ids] or None)
+    return JsonResponse({'date': day.isoformat(), 'stock': {str(pk): quantity for pk, quantity in sorted(quantities.items())}})
+
+@replica_reads
+def product_search(request):
+    """
+    Autocomplete for the sale and purchase item forms: products matching ``q``
+    (optionally only those of ``artist``), as JSON.
+    """
+    try:
+        limit = min(int(request.GET.get('limit', 20)), PRODUCT_SEARCH_MAX_RESULTS)
+        artist = int(request.GET['artist']) if request.GET.get('artist') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or artist.'}, status=400)
+    products = search.search_products(request.GET.get('q', ''), limit=max(limit, 1), artist=artist)
+    return JsonResponse({'results': [
+        {
+            'id': product.pk,
+            'name': product.name,
+            'artist': product.artist.name,
+            'purchase_price': str(product.purchase_price),
+            'selling_price': str(product.selling_price),
+            'stock_quantity': product.stock_quantity,
+        }
+        for product in products
+    ]})
+
 # Purchase Views
+@replica_reads
+@conditional_view(conditional.purchase_list_validator)
 def purchase_list(request):
-    purchases = Purchase.objects.all().order_by('-purchase_date')
+    purchases = keyset_paginate(request, Purchase.objects.select_related('artist'), ['-purchase_date', '-pk'])
     return render(request, 'shop/purchase_list.html', {'purchases': purchases})
 
-PurchaseItemFormSet = inlineformset_factory(Purchase, PurchaseItem, form=PurchaseItemForm, extra=1, can_delete=False)
+PurchaseItemFormSet = inlineformset_factory(Purchase, PurchaseItem, form=PurchaseItemForm, formset=ItemFormSet, extra=1, can_delete=False)
+
+def formset_lines(formset):
+    """
+    Returns ``(product, quantity)`` for every filled-in, non-deleted form of an item formset.
+    """
+    return [
+        (form.cleaned_data['product'], form.cleaned_data['quantity'])
+        for form in formset
+        if form.cleaned_data and not form.cleaned_data.get('DELETE', False)
+    ]
+
+def saved_item_lines(formset):
+    """
+    Splits the saved items of the formset's sale or purchase into those the formset
+    edits and those it leaves alone, as ``(product_id, quantity, unit_price)`` lines.
+    Returns ``(edited_pks, edited_lines, kept_lines)``.
+    """
+    edited_pks = {form.instance.pk for form in formset.initial_forms}
+    edited_lines, kept_lines = [], []
+    for pk, *line in formset.get_queryset().values_list('pk', 'product_id', 'quantity', 'unit_price'):
+        (edited_lines if pk in edited_pks else kept_lines).append(tuple(line))
+    return edited_pks, edited_lines, kept_lines
+
+def replace_items(model, edited_pks, items):
+    """
+    Swaps the edited line items for ``items`` with one DELETE and one bulk INSERT.
+    """
+    model.objects.filter(pk__in=edited_pks).delete()
+    model.objects.bulk_create(items)
 
+@serialized_writes  # Queue before BEGIN IMMEDIATE takes the write lock
 @transaction.atomic
 def purchase_create(request):
     if request.method == 'POST':
         purchase_form = PurchaseForm(request.POST)
         formset = PurchaseItemFormSet(request.POST)
         if purchase_form.is_valid() and formset.is_valid():
-            purchase = purchase_form.save()
-            total_amount = 0
-            for form in formset:
-                if form.cleaned_data:  # Make sure the form isn't empty
-                    purchase_item = form.save(commit=False)
-                    purchase_item.purchase = purchase
-                    purchase_item.unit_price = purchase_item.product.purchase_price  # Set unit price
-                    purchase_item.save()
-                    total_amount += purchase_item.quantity * purchase_item.unit_price
-                    # Update product stock
-                    purchase_item.product.stock_quantity += purchase_item.quantity
-                    purchase_item.product.save()
-
-            purchase.total_amount = total_amount
+            purchase = purchase_form.save(commit=False)
+            items = [
+                PurchaseItem(product=product, quantity=quantity, unit_price=product.purchase_price)  # Set unit price
+                for product, quantity in formset_lines(formset)
+            ]
+            purchase.total_amount = sum((item.quantity * item.unit_price for item in items), Decimal('0'))
             purchase.save()
+            for item in items:
+                item.purchase = purchase
+            PurchaseItem.objects.bulk_create(items)
+
+            # Update product stock
+            lines = [(item.product_id, item.quantity, item.unit_price) for item in items]
+            adjust_stock(stock_movements(stock_deltas(lines), StockMovement.PURCHASE, purchase.purchase_date, purchase=purchase))
 
             # Create Transaction
             Transaction.objects.create(
                 transaction_type='PURCHASE',
                 description=f'Purchase from {purchase.artist.name} on {purchase.purchase_date.strftime("%Y-%m-%d")}',
-                amount=-total_amount,  # Negative for purchase
+                amount=-purchase.total_amount,  # Negative for purchase
                 related_purchase=purchase,
                 transaction_date=purchase.purchase_date
             )
+            apply_rollup_deltas(purchase_deltas(timezone.localdate(purchase.purchase_date), lines))
             update_or_create_balance()
             return redirect('shop:purchase_list')
         else:
             print(purchase_form.errors) #For Debugging
             print(formset.errors)
+    elif request.GET.get('artist', '').isdigit():
+        purchase_form, formset = reorder_draft(int(request.GET['artist']))
     else:
         purchase_form = PurchaseForm()
         formset = PurchaseItemFormSet()
     return render(request, 'shop/purchase_form.html', {'purchase_form': purchase_form, 'formset': formset, 'title': 'Add Purchase'})
 
-
+def reorder_draft(artist_id):
+    """
+    An unsaved purchase from ``artist_id`` filled in with the suggested
+    quantities of the artist's products that are due for reorder.
+    """
+    lines = list(reorder.due_for_reorder().filter(product__artist_id=artist_id, suggested_quantity__gt=0)
+                 .select_related('product').order_by('product__name'))
+    DraftFormSet = inlineformset_factory(Purchase, PurchaseItem, form=PurchaseItemForm, formset=ItemFormSet, extra=len(lines) + 1, can_delete=False)
+    formset = DraftFormSet(initial=[
+        {'product': line.product_id, 'quantity': line.suggested_quantity, 'unit_price': line.product.purchase_price}
+        for line in lines
+    ])
+    formset.product_choices.prefetch(line.product_id for line in lines)
+    return PurchaseForm(initial={'artist': artist_id, 'notes': 'Reorder'}), formset
+
+
+@conditional_view(conditional.purchase_detail_validator)
 def purchase_detail(request, pk):
-    purchase = get_object_or_404(Purchase, pk=pk)
+    purchase = (Purchase.objects.select_related('artist')
+                .prefetch_related(Prefetch('items', queryset=PurchaseItem.objects.select_related('product')))
+                .filter(pk=pk).first())
+    if purchase is None:
+        # Old links keep working once the purchase has been archived.
+        get_object_or_404(ArchivedPurchase.objects.only('pk'), pk=pk)
+        return redirect('shop:archived_purchase_detail', pk=pk)
     return render(request, 'shop/purchase_detail.html', {'purchase': purchase})
 
+@serialized_writes
 def purchase_update(request, pk):
     purchase = get_object_or_404(Purchase, pk=pk)
-    PurchaseItemFormSet = inlineformset_factory(Purchase, PurchaseItem, form=PurchaseItemForm, extra=1, can_delete=True)
+    PurchaseItemFormSet = inlineformset_factory(Purchase, PurchaseItem, form=PurchaseItemForm, formset=ItemFormSet, extra=1, can_delete=True)
 
     if request.method == 'POST':
-        purchase_form = PurchaseForm(request.POST, instance=purchase)
-        formset = PurchaseItemFormSet(request.POST, instance=purchase)
-
         with transaction.atomic():
+            # Lock the purchase so two concurrent edits cannot both apply their stock changes.
+            purchase = get_object_or_404(Purchase.objects.select_for_update(), pk=pk)
+            purchase_form = PurchaseForm(request.POST, instance=purchase)
+            formset = PurchaseItemFormSet(request.POST, instance=purchase)
+
             if purchase_form.is_valid() and formset.is_valid():
-                purchase = purchase_form.save()
-
-                # Calculate the new total amount
-                total_amount = 0
-                for form in formset:
-                    if form.cleaned_data:
-                        purchase_item = form.save(commit=False)
-                        purchase_item.purchase = purchase
-                        purchase_item.unit_price = purchase_item.product.purchase_price
-                        purchase_item.save()
-                        total_amount += purchase_item.quantity * purchase_item.unit_price
-                    elif form.instance.pk: #Check if the instance has a primary key
-                         form.instance.delete()
-
-                purchase.total_amount = total_amount
+                edited_pks, previous_lines, kept_lines = saved_item_lines(formset)
+                purchase = purchase_form.save(commit=False)
+                items = [
+                    PurchaseItem(purchase=purchase, product=product, quantity=quantity, unit_price=product.purchase_price)
+                    for product, quantity in formset_lines(formset)
+                ]
+                purchase.total_amount = sum((item.quantity * item.unit_price for item in items), Decimal('0'))
+                purchase.total_amount += sum((quantity * unit_price for _, quantity, unit_price in kept_lines), Decimal('0'))
                 purchase.save()
+                replace_items(PurchaseItem, edited_pks, items)
 
-                # Update stock quantities.  This is complex, need to find changes.
-                original_items = {item.product.id: item.quantity for item in purchase.items.all()}
-                new_items = {}
-                for form in formset:
-                    if form.cleaned_data and not form.cleaned_data.get('DELETE', False):
-                        product_id = form.cleaned_data['product'].id
-                        quantity = form.cleaned_data['quantity']
-                        new_items[product_id] = quantity
-
-                for product_id, new_quantity in new_items.items():
-                    original_quantity = original_items.get(product_id, 0)
-                    product = Product.objects.get(pk=product_id)
-                    product.stock_quantity += (new_quantity - original_quantity)
-                    product.save()
-                for product_id, original_quantity in original_items.items():
-                    if product_id not in new_items: #Item was deleted
-                         product = Product.objects.get(pk=product_id)
-                         product.stock_quantity -= original_quantity
-                         product.save()
+                # Update stock quantities by the difference between the old and new items.
+                lines = [(item.product_id, item.quantity, item.unit_price) for item in items]
+                adjust_stock(stock_movements(
+                    merge_deltas(stock_deltas(previous_lines, sign=-1), stock_deltas(lines)),
+                    StockMovement.PURCHASE, purchase.purchase_date, purchase=purchase, note='Purchase edited',
+                ))
 
                 # Update Transaction
                 # Get the existing transaction, or create a new one if it doesn't exist
-                transaction, created = Transaction.objects.get_or_create(
+                description = f'Purchase from {purchase.artist.name} on {purchase.purchase_date.strftime("%Y-%m-%d")}'
+                transaction_obj, created = Transaction.objects.get_or_create(
                     related_purchase=purchase,
                     defaults={
                         'transaction_type': 'PURCHASE',
-                        'description': f'Purchase from {purchase.artist.name} on {purchase.purchase_date.strftime("%Y-%m-%d")}',
-                        'amount': -total_amount,
+                        'description': description,
+                        'amount': -purchase.total_amount,
                         'transaction_date': purchase.purchase_date,
                     }
                 )
                 if not created:
-                    transaction.amount = -total_amount
-                    transaction.description = f'Purchase from {purchase.artist.name} on {purchase.purchase_date.strftime("%Y-%m-%d")}'
-                    transaction.save()
+                    transaction_obj.amount = -purchase.total_amount
+                    transaction_obj.description = description
+                    transaction_obj.save()
+                purchase_day = timezone.localdate(purchase.purchase_date)
+                apply_rollup_deltas(
+                    purchase_deltas(purchase_day, previous_lines, sign=-1),
+                    purchase_deltas(purchase_day, lines),
+                )
                 update_or_create_balance()
                 return redirect('shop:purchase_list')
             else:
@@ -197,14 +329,16 @@ def purchase_update(request, pk):
 
     return render(request, 'shop/purchase_form.html', {'purchase_form': purchase_form, 'formset': formset, 'title': 'Edit Purchase'})
 
+@serialized_writes
 def purchase_delete(request, pk):
     purchase = get_object_or_404(Purchase, pk=pk)
     if request.method == 'POST':
         with transaction.atomic():
+            purchase = get_object_or_404(Purchase.objects.select_for_update(), pk=pk)
+            lines = list(purchase.items.values_list('product_id', 'quantity', 'unit_price'))
             # Reverse stock changes
-            for item in purchase.items.all():
-                item.product.stock_quantity -= item.quantity
-                item.product.save()
+            adjust_stock(stock_movements(stock_deltas(lines, sign=-1), StockMovement.PURCHASE, purchase.purchase_date, purchase=purchase, note='Purchase deleted'))
+            apply_rollup_deltas(purchase_deltas(timezone.localdate(purchase.purchase_date), lines, sign=-1))
             # Delete related transaction
             Transaction.objects.filter(related_purchase=purchase).delete()
             purchase.delete()
@@ -213,41 +347,46 @@ def purchase_delete(request, pk):
     return render(request, 'shop/purchase_delete.html', {'purchase': purchase})
 
 # Sale Views
+@replica_reads
+@conditional_view(conditional.sale_list_validator)
 def sale_list(request):
-    sales = Sale.objects.all().order_by('-sale_date')
+    sales = keyset_paginate(request, Sale.objects.all(), ['-sale_date', '-pk'])
     return render(request, 'shop/sale_list.html', {'sales': sales})
 
-SaleItemFormSet = inlineformset_factory(Sale, SaleItem, form=SaleItemForm, extra=1, can_delete=False)
+SaleItemFormSet = inlineformset_factory(Sale, SaleItem, form=SaleItemForm, formset=ItemFormSet, extra=1, can_delete=False)
 
+@serialized_writes  # Queue before BEGIN IMMEDIATE takes the write lock
 @transaction.atomic
 def sale_create(request):
     if request.method == 'POST':
         sale_form = SaleForm(request.POST)
         formset = SaleItemFormSet(request.POST)
         if sale_form.is_valid() and formset.is_valid():
-            sale = sale_form.save()
-            total_amount = 0
-            for form in formset:
-                if form.cleaned_data:
-                    sale_item = form.save(commit=False)
-                    sale_item.sale = sale
-                    sale_item.unit_price = sale_item.product.selling_price  # Set unit price
-                    sale_item.save()
-                    total_amount += sale_item.quantity * sale_item.unit_price
-                    # Update product stock
-                    sale_item.product.stock_quantity -= sale_item.quantity
-                    sale_item.product.save()
-
-            sale.total_amount = total_amount
+            sale = sale_form.save(commit=False)
+            items = [
+                SaleItem(product=product, quantity=quantity, unit_price=product.selling_price, unit_cost=product.purchase_price)  # Set unit price
+                for product, quantity in formset_lines(formset)
+            ]
+            sale.total_amount = sum((item.quantity * item.unit_price for item in items), Decimal('0'))
             sale.save()
+            for item in items:
+                item.sale = sale
+            SaleItem.objects.bulk_create(items)
+
+            # Update product stock
+            lines = [(item.product_id, item.quantity, item.unit_price) for item in items]
+            adjust_stock(stock_movements(stock_deltas(lines, sign=-1), StockMovement.SALE, sale.sale_date, sale=sale))
+
              # Create Transaction
             Transaction.objects.create(
                 transaction_type='SALE',
                 description=f'Sale on {sale.sale_date.strftime("%Y-%m-%d")}',
-                amount=total_amount,  # Positive for sale
+                amount=sale.total_amount,  # Positive for sale
                 related_sale=sale,
                 transaction_date=sale.sale_date
             )
+            costs = {item.product_id: item.unit_cost for item in items}
+            apply_rollup_deltas(sale_deltas(timezone.localdate(sale.sale_date), lines, costs))
             update_or_create_balance()
             return redirect('shop:sale_list')
         else:
@@ -258,68 +397,67 @@ def sale_create(request):
         formset = SaleItemFormSet()
     return render(request, 'shop/sale_form.html', {'sale_form': sale_form, 'formset': formset, 'title': 'Add Sale'})
 
+@conditional_view(conditional.sale_detail_validator)
 def sale_detail(request, pk):
-    sale = get_object_or_404(Sale, pk=pk)
+    sale = Sale.objects.prefetch_related(Prefetch('items', queryset=SaleItem.objects.select_related('product'))).filter(pk=pk).first()
+    if sale is None:
+        # Old links keep working once the sale has been archived.
+        get_object_or_404(ArchivedSale.objects.only('pk'), pk=pk)
+        return redirect('shop:archived_sale_detail', pk=pk)
     return render(request, 'shop/sale_detail.html', {'sale': sale})
 
+@serialized_writes
 def sale_update(request, pk):
     sale = get_object_or_404(Sale, pk=pk)
-    SaleItemFormSet = inlineformset_factory(Sale, SaleItem, form=SaleItemForm, extra=1, can_delete=True)
+    SaleItemFormSet = inlineformset_factory(Sale, SaleItem, form=SaleItemForm, formset=ItemFormSet, extra=1, can_delete=True)
 
     if request.method == 'POST':
-        sale_form = SaleForm(request.POST, instance=sale)
-        formset = SaleItemFormSet(request.POST, instance=sale)
-
         with transaction.atomic():
+            # Lock the sale so two concurrent edits cannot both apply their stock changes.
+            sale = get_object_or_404(Sale.objects.select_for_update(), pk=pk)
+            sale_form = SaleForm(request.POST, instance=sale)
+            formset = SaleItemFormSet(request.POST, instance=sale)
+
             if sale_form.is_valid() and formset.is_valid():
-                sale = sale_form.save()
-                total_amount = 0
-                for form in formset:
-                    if form.cleaned_data:
-                        sale_item = form.save(commit=False)
-                        sale_item.sale = sale
-                        sale_item.unit_price = sale_item.product.selling_price
-                        sale_item.save()
-                        total_amount += sale_item.quantity * sale_item.unit_price
-                    elif form.instance.pk:
-                         form.instance.delete()
-
-                sale.total_amount = total_amount
+                edited_pks, previous_lines, kept_lines = saved_item_lines(formset)
+                previous_costs = dict(formset.get_queryset().values_list('product_id', 'unit_cost'))
+                sale = sale_form.save(commit=False)
+                items = [
+                    SaleItem(sale=sale, product=product, quantity=quantity, unit_price=product.selling_price, unit_cost=product.purchase_price)
+                    for product, quantity in formset_lines(formset)
+                ]
+                sale.total_amount = sum((item.quantity * item.unit_price for item in items), Decimal('0'))
+                sale.total_amount += sum((quantity * unit_price for _, quantity, unit_price in kept_lines), Decimal('0'))
                 sale.save()
+                replace_items(SaleItem, edited_pks, items)
+
+                # Update stock quantities by the difference between the old and new items.
+                lines = [(item.product_id, item.quantity, item.unit_price) for item in items]
+                adjust_stock(stock_movements(
+                    merge_deltas(stock_deltas(previous_lines), stock_deltas(lines, sign=-1)),
+                    StockMovement.SALE, sale.sale_date, sale=sale, note='Sale edited',
+                ))
 
-                # Update stock quantities.
-                original_items = {item.product.id: item.quantity for item in sale.items.all()}
-                new_items = {}
-                for form in formset:
-                    if form.cleaned_data and not form.cleaned_data.get('DELETE', False):
-                        product_id = form.cleaned_data['product'].id
-                        quantity = form.cleaned_data['quantity']
-                        new_items[product_id] = quantity
-
-                for product_id, new_quantity in new_items.items():
-                    original_quantity = original_items.get(product_id, 0)
-                    product = Product.objects.get(pk=product_id)
-                    product.stock_quantity += (original_quantity - new_quantity)
-                    product.save()
-                for product_id, original_quantity in original_items.items():
-                    if product_id not in new_items:
-                         product = Product.objects.get(pk=product_id)
-                         product.stock_quantity += original_quantity
-                         product.save()
                 # Update Transaction
-                transaction, created = Transaction.objects.get_or_create(
+                description = f'Sale on {sale.sale_date.strftime("%Y-%m-%d")}'
+                transaction_obj, created = Transaction.objects.get_or_create(
                     related_sale=sale,
                     defaults={
                         'transaction_type': 'SALE',
-                        'description': f'Sale on {sale.sale_date.strftime("%Y-%m-%d")}',
-                        'amount': total_amount,
+                        'description': description,
+                        'amount': sale.total_amount,
                         'transaction_date': sale.sale_date,
                     }
                 )
                 if not created:
-                    transaction.amount = total_amount
-                    transaction.description = f'Sale on {sale.sale_date.strftime("%Y-%m-%d")}'
-                    transaction.save()
+                    transaction_obj.amount = sale.total_amount
+                    transaction_obj.description = description
+                    transaction_obj.save()
+                sale_day = timezone.localdate(sale.sale_date)
+                apply_rollup_deltas(
+                    sale_deltas(sale_day, previous_lines, previous_costs, sign=-1),
+                    sale_deltas(sale_day, lines, {item.product_id: item.unit_cost for item in items}),
+                )
                 update_or_create_balance()
                 return redirect('shop:sale_list')
             else:
@@ -330,14 +468,17 @@ def sale_update(request, pk):
         formset = SaleItemFormSet(instance=sale)
     return render(request, 'shop/sale_form.html', {'sale_form': sale_form, 'formset': formset, 'title': 'Edit Sale'})
 
+@serialized_writes
 def sale_delete(request, pk):
     sale = get_object_or_404(Sale, pk=pk)
     if request.method == 'POST':
         with transaction.atomic():
+            sale = get_object_or_404(Sale.objects.select_for_update(), pk=pk)
+            lines = list(sale.items.values_list('product_id', 'quantity', 'unit_price'))
+            costs = dict(sale.items.values_list('product_id', 'unit_cost'))
             # Reverse stock changes
-            for item in sale.items.all():
-                item.product.stock_quantity += item.quantity
-                item.product.save()
+            adjust_stock(stock_movements(stock_deltas(lines), StockMovement.SALE, sale.sale_date, sale=sale, note='Sale deleted'))
+            apply_rollup_deltas(sale_deltas(timezone.localdate(sale.sale_date), lines, costs, sign=-1))
             # Delete related transaction
             Transaction.objects.filter(related_sale=sale).delete()
             sale.delete()
@@ -346,10 +487,16 @@ def sale_delete(request, pk):
     return render(request, 'shop/sale_delete.html', {'sale': sale})
 
 # Transaction Views
+@replica_reads
 def transaction_list(request):
-    transactions = Transaction.objects.all().order_by('-transaction_date')
+    transactions = keyset_paginate(
+        request,
+        Transaction.objects.select_related('related_purchase__artist', 'related_sale'),
+        ['-transaction_date', '-pk'],
+    )
     return render(request, 'shop/transaction_list.html', {'transactions': transactions})
 
+@serialized_writes
 def transaction_create(request):
     if request.method == 'POST':
         form = TransactionForm(request.POST)
@@ -361,6 +508,7 @@ def transaction_create(request):
         form = TransactionForm()
     return render(request, 'shop/transaction_form.html', {'form': form, 'title': 'Add Transaction'})
 
+@serialized_writes
 def transaction_update(request, pk):
     transaction_obj = get_object_or_404(Transaction, pk=pk)
     if request.method == 'POST':
@@ -373,6 +521,7 @@ def transaction_update(request, pk):
         form = TransactionForm(instance=transaction_obj)
     return render(request, 'shop/transaction_form.html', {'form': form, 'title': 'Edit Transaction'})
 
+@serialized_writes
 def transaction_delete(request, pk):
     transaction_obj = get_object_or_404(Transaction, pk=pk)
     if request.method == 'POST':
@@ -382,76 +531,296 @@ def transaction_delete(request, pk):
     return render(request, 'shop/transaction_delete.html', {'transaction': transaction_obj})
 
 # Balance Views
+@replica_reads
 def balance_list(request):
-    balances = Balance.objects.all().order_by('-balance_date')
+    balances = keyset_paginate(request, Balance.objects.all(), ['-balance_date', '-pk'])
     current_balance = get_current_balance()
     return render(request, 'shop/balance_list.html', {'balances': balances, 'current_balance': current_balance})
 
-def get_current_balance():
+@replica_reads
+async def balance_list_async(request):
     """
-    Calculates the current balance by summing all transactions up to today.
+    ASGI version of balance_list: the page and the current balance are queried concurrently.
     """
-    today = timezone.now().date()
-    # Get the latest balance, and use that as a starting point.
-    latest_balance = Balance.objects.order_by('-balance_date').first()
-    if latest_balance:
-        current_balance = latest_balance.amount
-        # Add transactions since the latest balance date
-        transactions = Transaction.objects.filter(transaction_date__date__gt=latest_balance.balance_date, transaction_date__date__lte=today).aggregate(Sum('amount'))['amount__sum'] or 0
-        current_balance += transactions
-    else:
-        # No previous balance, so start from zero.
-        current_balance = Transaction.objects.filter(transaction_date__date__lte=today).aggregate(Sum('amount'))['amount__sum'] or 0
+    balances, current_balance = await aio.gather_in_threads(
+        lambda: keyset_paginate(request, Balance.objects.all(), ['-balance_date', '-pk']),
+        get_current_balance,
+    )
+    return await sync_to_async(render)(request, 'shop/balance_list.html', {'balances': balances, 'current_balance': current_balance})
+
+BALANCE_CHART_MAX_DAYS = 366
 
-    return current_balance
-def update_or_create_balance():
+@replica_reads
+def balance_as_of(request):
     """
-    Updates the current balance or creates a new balance entry for today.
+    The closing balance of ``date`` (default today) as JSON.
     """
-    today = timezone.now().date()
-    current_balance = get_current_balance()
+    value = request.GET.get('date')
+    try:
+        day = parse_date(value) if value else timezone.localdate()
+    except ValueError:
+        day = None
+    if day is None:
+        return JsonResponse({'error': 'Invalid date.'}, status=400)
+    return JsonResponse({'date': day.isoformat(), 'balance': str(ledger.balance_as_of(day))})
+
+@replica_reads
+def balance_chart(request):
+    """
+    Daily closing balances from ``start`` to ``end`` (default the last 30 days)
+    as chart labels and values, one entry per day.
+    """
+    end = start = None
+    try:
+        end = parse_date(request.GET['end']) if request.GET.get('end') else timezone.localdate()
+        start = parse_date(request.GET['start']) if request.GET.get('start') else end - timezone.timedelta(days=29)
+    except ValueError:
+        pass
+    if start is None or end is None or start > end:
+        return JsonResponse({'error': 'Invalid date range.'}, status=400)
+    if (end - start).days >= BALANCE_CHART_MAX_DAYS:
+        return JsonResponse({'error': f'The range is limited to {BALANCE_CHART_MAX_DAYS} days.'}, status=400)
+    series = ledger.balance_series(start, end)
+    return JsonResponse({
+        'dates': [day.isoformat() for day, _ in series],
+        'amounts': [float(amount) for _, amount in series],
+    })
+# Archive Views
+ARCHIVE_DATASETS = {
+    'sales': (ArchivedSale.objects.all(), 'sale_date'),
+    'purchases': (ArchivedPurchase.objects.all(), 'purchase_date'),
+    'transactions': (ArchivedTransaction.objects.all(), 'transaction_date'),
+}
+
+@replica_reads
+def archive_index(request):
+    """
+    The archived months with their counts and totals.
+    """
+    periods = ArchivePeriod.objects.order_by('-month')
+    return render(request, 'shop/archive_index.html', {'periods': periods})
+
+@replica_reads
+def archive_period(request, year, month, dataset):
+    """
+    The archived sales, purchases or transactions of one month, read-only.
+    """
+    if dataset not in ARCHIVE_DATASETS:
+        raise Http404("Unknown dataset.")
+    period = get_object_or_404(ArchivePeriod, month__year=year, month__month=month)
+    queryset, date_field = ARCHIVE_DATASETS[dataset]
+    rows = keyset_paginate(
+        request,
+        queryset.filter(**{f'{date_field}__gte': ledger.day_start(period.month),
+                           f'{date_field}__lt': ledger.day_start((period.month + timezone.timedelta(days=31)).replace(day=1))}),
+        [f'-{date_field}', '-pk'],
+    )
+    return render(request, 'shop/archive_period.html', {'period': period, 'dataset': dataset, 'rows': rows})
+
+@replica_reads
+def archived_sale_detail(request, pk):
+    sale = get_object_or_404(ArchivedSale.objects.prefetch_related('items'), pk=pk)
+    return render(request, 'shop/archived_sale_detail.html', {'sale': sale})
+
+@replica_reads
+def archived_purchase_detail(request, pk):
+    purchase = get_object_or_404(ArchivedPurchase.objects.prefetch_related('items'), pk=pk)
+    return render(request, 'shop/archived_purchase_detail.html', {'purchase': purchase})
+
+# Reorder Views
+@replica_reads
+def reorder_list(request):
+    """
+    Products due for reorder grouped by artist, with the suggested quantities
+    and what they cost, so a purchase can be drafted per artist.
+    """
+    lines = (reorder.due_for_reorder().select_related('product__artist')
+             .order_by('product__artist__name', 'product__artist_id', 'days_of_cover', 'product_id'))
+    artists = []
+    for line in lines:
+        if not artists or artists[-1]['artist'].pk != line.product.artist_id:
+            artists.append({'artist': line.product.artist, 'lines': [], 'total_cost': Decimal('0')})
+        line.line_cost = max(line.suggested_quantity, 0) * line.product.purchase_price
+        artists[-1]['lines'].append(line)
+        artists[-1]['total_cost'] += line.line_cost
+    computed_at = ReorderForecast.objects.values_list('computed_at', flat=True).first()
+    return render(request, 'shop/reorder_list.html', {'artists': artists, 'computed_at': computed_at})
+
+# Settlement Views
+@replica_reads
+def settlement_report(request):
+    """
+    Units sold, revenue, cost and margin per artist and product for a
+    ``month`` (YYYY-MM, default last month) or a ``start``/``end`` date range.
+    """
+    start = end = None
+    try:
+        if request.GET.get('start') or request.GET.get('end'):
+            start, end = parse_date(request.GET.get('start', '')), parse_date(request.GET.get('end', ''))
+        else:
+            month = request.GET.get('month')
+            first = parse_date(f'{month}-01') if month else (timezone.localdate().replace(day=1) - timezone.timedelta(days=1))
+            if first is not None:
+                start, end = settlements.month_bounds(first)
+    except ValueError:
+        pass
+    if start is None or end is None or start > end:
+        return HttpResponseBadRequest("Invalid month or date range.")
+    if (start, end) == settlements.month_bounds(start):
+        report = settlements.month_settlement(start)
+    else:
+        report = settlements.settlement(start, end)
+    return render(request, 'shop/settlement_report.html', {'report': report})
 
-    # Check if a balance entry for today already exists
-    balance, created = Balance.objects.get_or_create(balance_date=today, defaults={'amount': current_balance})
-    if not created:
-        # Update the existing balance entry
-        balance.amount = current_balance
-        balance.save()
 # KPI Dashboard View
+DASHBOARD_WIDGETS = ('sales_totals', 'balance_history', 'top_sellers', 'low_stock', 'profit')
+
+def dashboard_context(widgets):
+    sales_totals = widgets['sales_totals']
+    balance_history = widgets['balance_history']
+    return {
+        'sales_last_7_days': sales_totals['last_7_days'],
+        'sales_last_30_days': sales_totals['last_30_days'],
+        'top_selling_products': widgets['top_sellers'],
+        'low_stock_products': widgets['low_stock'],
+        'overall_profit_margin': widgets['profit'],
+        'balance_dates': balance_history['dates'],
+        'balance_amounts': balance_history['amounts'],
+    }
+
+@conditional_view(conditional.dashboard_validator)
 def dashboard(request):
     """
     View for the KPI dashboard.
     """
-    # Total Sales Revenue (last 7 days)
-    sales_last_7_days = Sale.objects.filter(sale_date__gte=timezone.now() - timezone.timedelta(days=7)).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+    widgets = {name: kpis.get_widget(name) for name in DASHBOARD_WIDGETS}
+    return render(request, 'shop/dashboard.html', dashboard_context(widgets))
 
-    # Total Sales Revenue (last 30 days)
-    sales_last_30_days = Sale.objects.filter(sale_date__gte=timezone.now() - timezone.timedelta(days=30)).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-    # Top Selling Products (last 30 days)
-    top_selling_products = SaleItem.objects.filter(sale__sale_date__gte=timezone.now() - timezone.timedelta(days=30)).values('product__name').annotate(total_sold=Sum('quantity')).order_by('-total_sold')[:5]
+@conditional_view(conditional.dashboard_validator)
+async def dashboard_async(request):
+    """
+    ASGI version of the dashboard: the widgets are computed concurrently, so a
+    cold page takes as long as the slowest widget instead of all of them.
+    """
+    values = await aio.gather_in_threads(*[lambda name=name: kpis.get_widget(name) for name in DASHBOARD_WIDGETS])
+    context = dashboard_context(dict(zip(DASHBOARD_WIDGETS, values)))
+    return await sync_to_async(render)(request, 'shop/dashboard.html', context)
 
-    # Low Stock Items (items with stock less than 5)
-    low_stock_products = Product.objects.filter(stock_quantity__lt=5)
+@staff_member_required
+def dashboard_cache_stats(request):
+    """
+    Hit/miss counters of the dashboard widget cache, as JSON.
+    """
+    return JsonResponse(kpis.cache_stats())
 
-    # Profit Margin (Overall)
-    total_sales = Sale.objects.all().aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    total_purchases = Purchase.objects.all().aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-    overall_profit_margin = total_sales - total_purchases
+# Background Job Views
+@staff_member_required
+def job_stats(request):
+    """
+    Background job queue depth and worker counters, as JSON.
+    """
+    return JsonResponse(jobs.stats())
 
-    # Balance History (last 30 days)
-    balance_history = Balance.objects.filter(balance_date__gte=timezone.now().date() - timezone.timedelta(days=30)).order_by('balance_date')
-    balance_dates = [b.balance_date.strftime('%Y-%m-%d') for b in balance_history]
-    balance_amounts = [float(b.amount) for b in balance_history]
+# Export Views
+@replica_reads
+def export_data(request, dataset):
+    """
+    Streams a full export of transactions, sale lines or purchase lines as CSV
+    or JSON lines, optionally limited to a ``start``/``end`` date range.
+    """
+    if dataset not in exports.EXPORTS:
+        raise Http404("Unknown export.")
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in exports.FORMATS:
+        return HttpResponseBadRequest("Unknown format.")
+    dates = {}
+    for name in ('start', 'end'):
+        value = request.GET.get(name)
+        try:
+            dates[name] = parse_date(value) if value else None
+        except ValueError:
+            dates[name] = None
+        if value and dates[name] is None:
+            return HttpResponseBadRequest(f"Invalid {name} date.")
+
+    stream, content_type = exports.FORMATS[export_format]
+    rows = exports.EXPORTS[dataset](dates['start'], dates['end'])
+    rows = rows.using(rows.db)  # Rows are read after the view returns; keep the database chosen now
+    response = StreamingHttpResponse(stream(rows), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{export_format}"'
+    return response
+
+# POS API Views
+@csrf_exempt
+@require_POST
+@serialized_writes
+def api_checkout(request):
+    """
+    Accepts a JSON batch of queued sales from a POS terminal:
+    ``{"sales": [{"key": ..., "sale_date": ..., "notes": ..., "items": [{"product": id, "quantity": n}]}]}``.
+    The whole batch is recorded in one transaction; sales with a key that was
+    already recorded come back as duplicates.
 
+    The API is off unless ``SHOP_API_TOKEN`` is set. Only ``application/json``
+    bodies are read, so a cross-site form or ``text/plain`` POST never gets this far.
+    """
+    token = getattr(settings, 'SHOP_API_TOKEN', None)
+    if not token:
+        raise Http404("The checkout API is disabled.")
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return JsonResponse({'error': 'Invalid API token.'}, status=401)
+    if request.content_type != 'application/json':
+        return JsonResponse({'error': 'Content-Type must be application/json.'}, status=415)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Request body must be JSON.'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object.'}, status=400)
+    try:
+        results = checkout_batch(payload.get('sales'))
+    except CheckoutError as exc:
+        return JsonResponse({'errors': exc.errors}, status=400)
+    except IntegrityError:
+        # Another terminal recorded one of these keys concurrently; a retry will report it as a duplicate.
+        return JsonResponse({'error': 'Conflicting batch, please retry.'}, status=409)
+    return JsonResponse({'results': results})
+
+# Profiling Views
+@staff_member_required
+def sql_profile(request):
+    """
+    Per-view SQL totals collected by the profiling middleware; POST resets them.
+    """
+    if not getattr(settings, 'SHOP_SQL_PROFILING', False):
+        raise Http404("SQL profiling is disabled.")
+    if request.method == 'POST':
+        profiling.reset_summary()
+        return redirect('shop:sql_profile')
+    return render(request, 'shop/sql_profile.html', {'views': profiling.view_summary()})
 
+@staff_member_required
+def profile_list(request):
+    """
+    Call-stack profiles captured by the sampling profiler, newest first.
+    """
+    if not getattr(settings, 'SHOP_PROFILER', False):
+        raise Http404("The sampling profiler is disabled.")
     context = {
-        'sales_last_7_days': sales_last_7_days,
-        'sales_last_30_days': sales_last_30_days,
-        'top_selling_products': top_selling_products,
-        'low_stock_products': low_stock_products,
-        'overall_profit_margin': overall_profit_margin,
-        'balance_dates': balance_dates,
-        'balance_amounts': balance_amounts,
+        'profiles': sampling.list_profiles(),
+        'token': sampling.make_token(),
+        'token_param': sampling.TOKEN_PARAM,
     }
-    return render(request, 'shop/dashboard.html', context)
+    return render(request, 'shop/profile_list.html', context)
+
+@staff_member_required
+def profile_download(request, name):
+    """
+    A captured profile in collapsed-stack format, for flamegraph.pl or speedscope.
+    """
+    if not getattr(settings, 'SHOP_PROFILER', False):
+        raise Http404("The sampling profiler is disabled.")
+    path = sampling.profile_path(name)
+    if path is None:
+        raise Http404("Unknown profile.")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name, content_type='text/plain')
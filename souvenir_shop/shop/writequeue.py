@@ -0,0 +1,53 @@
+import threading
+from functools import wraps
+
+from django.conf import settings
+
+
+class FifoLock:
+    """
+    A lock granted in arrival order, so a steady stream of writers cannot starve
+    one that has been waiting (``threading.Lock`` makes no ordering promise).
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    def __enter__(self):
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._condition.wait_for(lambda: self._serving == ticket)
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self._serving += 1
+            self._condition.notify_all()
+
+
+_write_lock = FifoLock()
+
+
+def write_queue_enabled():
+    return getattr(settings, 'SHOP_SQLITE_WRITE_QUEUE', False)
+
+
+def serialized_writes(view):
+    """
+    When ``SHOP_SQLITE_WRITE_QUEUE`` is on, runs the POST requests of ``view``
+    one at a time, in arrival order, within this process. SQLite allows one
+    writer at a time anyway; queueing writers here means they wait in line
+    instead of retrying against the busy timeout. GET requests are never queued,
+    and with WAL journaling readers are never blocked by the writer.
+
+    Apply it outside ``transaction.atomic``: a transaction started with
+    ``BEGIN IMMEDIATE`` already holds the write lock and must not wait in the queue.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST' or not write_queue_enabled():
+            return view(request, *args, **kwargs)
+        with _write_lock:
+            return view(request, *args, **kwargs)
+    return wrapper
@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'souvenir_shop.settings')
+os.environ.setdefault('SHOP_ROOT_URLCONF', 'souvenir_shop.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,10 @@
+from django.urls import path, include
+from shop import views
+from django.contrib import admin
+
+# Root URLconf of the ASGI application (see asgi.py), routing to the async shop views.
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('shop/', include('shop.async_urls')),
+    path('', views.dashboard_async, name='home'),
+]